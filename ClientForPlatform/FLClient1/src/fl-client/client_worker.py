@@ -0,0 +1,168 @@
+import asyncio
+import gc
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+import uuid
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+FL_CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Messages exchanged between the main process and the worker through the event queue.
+WORKER_READY = "WorkerReady"
+JOB_FINISHED = "JobFinished"
+JOB_FAILED = "JobFailed"
+
+
+def _worker_main(job_queue, event_queue, run_job: Optional[Callable] = None):
+    """
+    Entry point of the worker. The heavy imports (TensorFlow, Keras, Flower) happen once here, then the worker
+    runs one Flower client per job until it receives None. Client.py keeps the training data it read.
+
+    :param run_job: Function called with the arguments of every job, Client.run_client by default.
+    """
+    if run_job is None:
+        # Client.py and its imports expect the fl-client directory to be the root of the imports.
+        if FL_CLIENT_DIR not in sys.path:
+            sys.path.insert(0, FL_CLIENT_DIR)
+        import Client
+        run_job = Client.run_client
+
+    event_queue.put((WORKER_READY, None, None))
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, client_arguments = job
+        try:
+            run_job(**client_arguments)
+            event_queue.put((JOB_FINISHED, job_id, None))
+        except BaseException:
+            event_queue.put((JOB_FAILED, job_id, traceback.format_exc()))
+        finally:
+            # Models of former trials must not pile up in the Keras graph of a long-lived worker.
+            if "keras" in sys.modules:
+                sys.modules["keras"].backend.clear_session()
+            gc.collect()
+
+
+class FlowerClientWorker:
+    """
+    Long-lived process that runs the Flower clients of this participant.
+
+    The worker imports the client code once and keeps the preprocessed training data in memory, so every
+    hyperparameter trial and the final training only connect a new Flower client to the server of the run.
+    The end of a run is reported through the event queue as soon as the Flower client returns.
+    """
+
+    def __init__(self, run_job: Optional[Callable] = None):
+        """
+        :param run_job: Function run by the worker for every job, Client.run_client by default. It must be
+                        importable by the spawned worker.
+        """
+        self._run_job = run_job
+        # Spawn instead of fork: the main process runs an event loop that must not be copied.
+        self._context = multiprocessing.get_context("spawn")
+        self._job_queue = None
+        self._event_queue = None
+        self._worker = None
+        self._finished_jobs: Dict[str, asyncio.Future] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self._jobs_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._job_queue = self._context.Queue()
+        self._event_queue = self._context.Queue()
+        self._running = True
+        self._spawn_worker()
+        self._listener = threading.Thread(target=self._listen_events, name="flower-client-worker", daemon=True)
+        self._listener.start()
+
+    def _spawn_worker(self):
+        self._worker = self._context.Process(target=_worker_main,
+                                             args=(self._job_queue, self._event_queue, self._run_job),
+                                             name="flower-client-worker",
+                                             daemon=True)
+        self._worker.start()
+        logger.info(f"Flower client worker spawned with pid {self._worker.pid}")
+
+    def _listen_events(self):
+        while self._running:
+            try:
+                event, job_id, details = self._event_queue.get(timeout=1)
+            except queue.Empty:
+                self._respawn_dead_worker()
+                continue
+            except (EOFError, OSError):
+                break
+
+            if event == WORKER_READY:
+                logger.info("Flower client worker is ready")
+            elif event == JOB_FINISHED:
+                self._resolve(job_id, None)
+            elif event == JOB_FAILED:
+                logger.error(f"Flower client job {job_id} failed:\n{details}")
+                self._resolve(job_id, RuntimeError(f"Flower client job {job_id} failed"))
+
+    def _respawn_dead_worker(self):
+        if self._worker is not None and not self._worker.is_alive() and self._running:
+            logger.warning(f"Flower client worker exited with code {self._worker.exitcode}. Respawning.")
+            # The job it was running is lost with it.
+            with self._jobs_lock:
+                job_ids = list(self._finished_jobs)
+            for job_id in job_ids:
+                self._resolve(job_id, RuntimeError(f"Flower client worker died during job {job_id}"))
+            self._spawn_worker()
+
+    def _resolve(self, job_id: str, result):
+        with self._jobs_lock:
+            future = self._finished_jobs.pop(job_id, None)
+            loop = self._loops.pop(job_id, None)
+        if future is None or loop is None:
+            return
+
+        def set_result():
+            if future.done():
+                return
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        loop.call_soon_threadsafe(set_result)
+
+    async def run_client(self, client_arguments: Dict[str, Any]):
+        """
+        Runs a Flower client in the worker and returns once it finished.
+
+        :param client_arguments: Keyword arguments of Client.run_client.
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+        with self._jobs_lock:
+            self._finished_jobs[job_id] = finished
+            self._loops[job_id] = loop
+        self._job_queue.put((job_id, client_arguments))
+        await finished
+
+    def shutdown(self):
+        if not self._running:
+            return
+        self._running = False
+        self._job_queue.put(None)
+        self._worker.join(timeout=5)
+        if self._worker.is_alive():
+            self._worker.terminate()
+        self._worker = None
@@ -0,0 +1,69 @@
+"""
+Binary storage of the preprocessed training splits (X_train, X_test, y_train and y_test).
+
+Every split is stored as three files in the directory of its dataset:
+    - <split>.npy: the values, a 2D array of a single dtype (the common dtype of the columns).
+    - <split>_index.npy: the index of the rows.
+    - <split>.json: the names and the original dtypes of the columns.
+The values are loaded memory-mapped, so a split is not parsed nor copied when a client starts, only the pages
+that the training reads are loaded from the disk. The files are written under a temporary name and renamed into
+place, so a process that still maps the former split (the FlowerClientWorker caches it) keeps valid pages.
+"""
+import json
+import os
+from typing import Callable, IO, List
+
+import numpy as np
+import pandas as pd
+
+SPLIT_NAMES = ["X_train", "X_test", "y_train", "y_test"]
+TEMPORARY_PREFIX = "tmp-"
+
+
+def split_files(directory: str, split_name: str) -> List[str]:
+    return [directory + os.sep + split_name + ".npy",
+            directory + os.sep + split_name + "_index.npy",
+            directory + os.sep + split_name + ".json"]
+
+
+def _write_and_replace(path: str, write: Callable[[IO], None]):
+    temporary_path = os.path.join(os.path.dirname(path), TEMPORARY_PREFIX + os.path.basename(path))
+    with open(temporary_path, "wb") as f:
+        write(f)
+    os.replace(temporary_path, path)
+
+
+def save_split(directory: str, split_name: str, split: pd.DataFrame):
+    values_path, index_path, metadata_path = split_files(directory, split_name)
+    values = split.to_numpy(dtype=np.result_type(*split.dtypes) if len(split.columns) else float)
+    _write_and_replace(values_path, lambda f: np.save(f, values))
+    index = split.index.to_numpy()
+    if index.dtype == object:
+        # Object arrays would need pickle to be loaded.
+        index = index.astype(str)
+    _write_and_replace(index_path, lambda f: np.save(f, index))
+    metadata = {"columns": [str(column) for column in split.columns],
+                "dtypes": [str(dtype) for dtype in split.dtypes]}
+    _write_and_replace(metadata_path, lambda f: f.write(json.dumps(metadata).encode("utf-8")))
+
+
+def load_split(directory: str, split_name: str) -> pd.DataFrame:
+    """
+    Returns the split as a DataFrame backed by the read-only memory map of its values. Only the columns whose
+    dtype is not the common dtype of the split (e.g. the integers of a split with floats) are copied.
+    """
+    values_path, index_path, metadata_path = split_files(directory, split_name)
+    with open(metadata_path, "r") as f:
+        metadata = json.load(f)
+    values = np.load(values_path, mmap_mode="r")
+    index = np.load(index_path)
+    split = pd.DataFrame(values, index=index, columns=metadata["columns"], copy=False)
+    converted_columns = {column: dtype for column, dtype in zip(metadata["columns"], metadata["dtypes"])
+                         if dtype != str(values.dtype)}
+    if converted_columns:
+        split = split.astype(converted_columns)
+    return split
+
+
+def has_splits(directory: str) -> bool:
+    return all(os.path.isfile(path) for split_name in SPLIT_NAMES for path in split_files(directory, split_name))
@@ -1,6 +1,5 @@
 import ast
 import os
-import pickle
 from logging import INFO
 from typing import Tuple, Any, List
 
@@ -8,6 +7,7 @@ import flwr as fl
 # Define Flower client
 import keras
 import numpy as np
+from flwr.common import bytes_to_ndarray, ndarrays_to_parameters
 from flwr.common.logger import log
 from numpy import ndarray
 from pandas import DataFrame
@@ -16,9 +16,13 @@ from Definitions import ROOT_DIR
 from experiment_parameters.model_builder.Model import KerasModel
 from experiment_parameters.model_builder.ModelBuilder import Director
 from metrics.Evaluator import evaluator
+from metrics.MetricCodec import encode_metric_vector
 from metrics.Metrics import return_default_dict_of_metrics, DictOfMetrics
-from metrics.Shapley_Values import ShapleyValuesNN
+from metrics.ShapleyGTG import create_shapley_values
+from metrics.Shapley_Values import ShapleyValues
+from util.TransportCodec import TransportCodec, decode_parameters
 from util.Util import save_data_on_pickle, load_data_from_pickle_file, retrieve_gradient_from_dataset
+from util.WeightStore import WeightCache, HELD_WEIGHTS_KEY
 
 
 class FedAvgClient(fl.client.NumPyClient):
@@ -30,10 +34,11 @@ class FedAvgClient(fl.client.NumPyClient):
     _y_test: DataFrame
     _batch_size: int
     # _shapley_values: ShapleyGTG
-    _shapley_values: ShapleyValuesNN
+    _shapley_values: ShapleyValues
     _client_number: str
     _metric_list: list
     _last_round_result = DictOfMetrics
+    _transport_codec: TransportCodec
 
     # Keep initial parameters to initialize SV.
     initial_parameters: List[ndarray] = None
@@ -47,6 +52,8 @@ class FedAvgClient(fl.client.NumPyClient):
         # self._batch_size = batch_size
         self._client_number = client_number
         self._metric_list = metrics
+        # Updates of the clients received for the Shapley values, and the own update of the last fit.
+        self._weight_cache = WeightCache()
 
     def get_parameters(self, config):
         return self._model.get_model().get_weights()
@@ -54,6 +61,7 @@ class FedAvgClient(fl.client.NumPyClient):
     # Here, the function belongs to the Tensorflow function fit. So, if implemented for tensorflow, just copy
     # and paste it here.
     def fit(self, parameters, config, global_logits=None) -> Tuple[Any, int, dict]:
+        parameters = decode_parameters(parameters)
         if config["server_round"] == 1:
             log(INFO, "Config: {}".format(config))
             log(INFO, f"Metric list: {self._metric_list}")
@@ -67,6 +75,8 @@ class FedAvgClient(fl.client.NumPyClient):
             # self._model.fit(self._x_train[:2], self._y_train[:2], epochs=1,
             #                 batch_size=1, verbose=0)
             self._batch_size = config["batch_size"]
+            # Created once, it keeps the error feedback of the updates between the rounds.
+            self._transport_codec = TransportCodec.from_fit_config(config)
 
         if self.initial_parameters is not None:
             self.initial_parameters = parameters
@@ -106,24 +116,32 @@ class FedAvgClient(fl.client.NumPyClient):
                                            self._model,
                                            self._metric_list)
         log(INFO, f"Evaluated model after: {results_after_training.get_value_of_metric('CrossEntropyLoss')}")
-        return self._model.get_model().get_weights(), len(self._x_train), metrics
+        weights = self._model.get_model().get_weights()
+        if self._transport_codec.enabled:
+            # Only the difference with the global model of the round is sent. The server forwards the update it
+            # reconstructs from it for the Shapley values, including to this client.
+            return self._transport_codec.encode(weights, parameters), len(self._x_train), metrics
+        # The server does not send the own update back for the Shapley values.
+        self._weight_cache.put_own(ndarrays_to_parameters(weights).tensors)
+        return weights, len(self._x_train), metrics
 
     def evaluate(self, parameters, config):
-        self._model.set_model(parameters)
+        self._model.set_model(decode_parameters(parameters))
         round_result = evaluator(self._x_test, self._y_test, self._model, self._metric_list)
         metric_results = round_result.return_flower_dict_as_str()
         flower_metrics = evaluator(self._x_test, self._y_test, self._model, self._metric_list)
 
         if config["compute_shapley_values"] == 1:
-            client_weights = pickle.loads(config["pickled_client_weights"])
+            client_weights = {cid: ([bytes_to_ndarray(tensor) for tensor in tensors], num_examples)
+                              for cid, (tensors, num_examples) in self._weight_cache.resolve(config).items()}
             # client_weights = ast.literal_eval(config["all_models_from_clients"])
             if config["server_round"] == 1:
                 number_of_clients = len(client_weights)
                 # self._shapley_values = ShapleyGTG(number_of_clients)
-                self._shapley_values = ShapleyValuesNN(self._x_test,
-                                                       self._y_test,
-                                                       config["num_rounds"],
-                                                       self._metric_list)
+                self._shapley_values = create_shapley_values(config,
+                                                             self._x_test,
+                                                             self._y_test,
+                                                             self._metric_list)
                 list_of_initial_metrics = self._last_round_result
                 self._shapley_values.set_last_round_results(list_of_initial_metrics)
                 # for client_name
@@ -147,9 +165,10 @@ class FedAvgClient(fl.client.NumPyClient):
                                                             config["server_round"])
             self._shapley_values.set_last_round_results(round_result)
             round_sv = self._shapley_values.get_round_shapley_values(config["server_round"])
-            sv_round_result = {"SV_" + client_id: str(round_sv[client_id])
+            sv_round_result = {"SV_" + client_id: encode_metric_vector(round_sv[client_id])
                                for client_id, _ in self._shapley_values.get_client_index_dictionary().items()}
             metric_results = metric_results | sv_round_result
+            metric_results[HELD_WEIGHTS_KEY] = self._weight_cache.held_weights()
 
             if config["last_round"] == 1:
                 log(INFO, "Columns sorted: {}".format(list(self._y_test.columns)))
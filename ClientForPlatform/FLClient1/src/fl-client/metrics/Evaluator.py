@@ -5,10 +5,11 @@ from sklearn.metrics import log_loss, accuracy_score, matthews_corrcoef, f1_scor
 from xgboost import DMatrix
 
 from experiment_parameters import TrainerFactory
-from experiment_parameters.model_builder.Model import Model, XGBoostModel
+from experiment_parameters.model_builder.Model import Model, XGBoostModel, MLPModel
 from experiment_parameters.model_builder.ModelBuilder import Director
 from metrics.Metrics import DictOfMetrics, Accuracy, CrossEntropyLoss, SVCompatibleF1Score, \
-    SVCompatibleMatthewsCorrelationCoefficient, return_default_dict_of_metrics, F1ScoreMacro, F1ScoreMicro
+    SVCompatibleMatthewsCorrelationCoefficient, return_default_dict_of_metrics, F1ScoreMacro, F1ScoreMicro, \
+    MetricVector, metric_schema
 
 
 def return_labels(y_true_argmaxed, labels):
@@ -71,20 +72,119 @@ metric_function_dict = {
 }
 
 
+class ConfusionMatrixScores:
+    """
+    Scores of one set of predictions derived from a single confusion matrix.
+
+    The argmaxes and the confusion matrix are computed once per evaluation, and Accuracy, F1 and MCC are derived
+    from it with NumPy. The results match the sklearn functions of metric_function_dict, which recompute the
+    argmaxes and map the classes to their labels for every metric.
+    """
+    y_true: np.ndarray
+    y_pred_proba: np.ndarray
+    confusion_matrix: np.ndarray
+
+    def __init__(self, y_true: np.ndarray, y_pred_proba, num_classes: int):
+        """
+        :param y_true: Index of the true class of every sample, i.e. the argmax of the one-hot encoded y_test.
+        """
+        self.y_true = y_true
+        self.y_pred_proba = np.asarray(y_pred_proba)
+        y_pred = np.argmax(self.y_pred_proba, axis=1)
+        self.confusion_matrix = np.bincount(num_classes * y_true + y_pred,
+                                            minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+    def cross_entropy_loss(self) -> float:
+        probabilities = self.y_pred_proba
+        if not np.issubdtype(probabilities.dtype, np.floating):
+            probabilities = probabilities.astype(np.float64)
+        # Same clipping as sklearn's log_loss.
+        eps = np.finfo(probabilities.dtype).eps
+        true_class_probabilities = np.clip(probabilities[np.arange(len(self.y_true)), self.y_true], eps, 1 - eps)
+        return float(-np.mean(np.log(true_class_probabilities)))
+
+    def accuracy(self) -> float:
+        return float(np.trace(self.confusion_matrix) / self.confusion_matrix.sum())
+
+    def f1_score_per_class(self) -> np.ndarray:
+        true_positives = np.diag(self.confusion_matrix).astype(np.float64)
+        # 2TP + FP + FN is the number of samples of the class plus the number of predictions of the class.
+        denominators = self.confusion_matrix.sum(axis=0) + self.confusion_matrix.sum(axis=1)
+        return np.divide(2 * true_positives, denominators,
+                         out=np.zeros_like(true_positives), where=denominators > 0)
+
+    def f1_score_macro(self) -> float:
+        return float(np.mean(self.f1_score_per_class()))
+
+    def f1_score_micro(self) -> float:
+        # Every sample has exactly one true and one predicted class, so the micro F1 is the accuracy.
+        return self.accuracy()
+
+    def mcc(self) -> float:
+        true_sums = self.confusion_matrix.sum(axis=1).astype(np.float64)
+        predicted_sums = self.confusion_matrix.sum(axis=0).astype(np.float64)
+        number_of_samples = true_sums.sum()
+        covariance_true_predicted = np.trace(self.confusion_matrix) * number_of_samples - true_sums @ predicted_sums
+        covariance_predicted = number_of_samples ** 2 - predicted_sums @ predicted_sums
+        covariance_true = number_of_samples ** 2 - true_sums @ true_sums
+        if covariance_predicted * covariance_true == 0:
+            return 0.0
+        return float(covariance_true_predicted / np.sqrt(covariance_true * covariance_predicted))
+
+
+confusion_matrix_metric_dict = {
+    "CrossEntropyLoss": ConfusionMatrixScores.cross_entropy_loss,
+    "Accuracy": ConfusionMatrixScores.accuracy,
+    "F1Score": ConfusionMatrixScores.f1_score_per_class,
+    "F1ScoreMacro": ConfusionMatrixScores.f1_score_macro,
+    "F1ScoreMicro": ConfusionMatrixScores.f1_score_micro,
+    "MCC": ConfusionMatrixScores.mcc
+}
+
+
 def evaluator(x_test: Union[DataFrame, DMatrix], y_test, model: Model, metric_list: List[str]):
     # log(INFO, "Evaluating")
-    metric_dict = DictOfMetrics()
     # model.set_model(weights)
     # y_pred_proba = model.predict_proba(x_test)
+    y_pred_proba = None
     if type(model) is XGBoostModel:
         # x_test_matrix = DMatrix(x_test)
         y_pred_proba = model.predict_proba(x_test)
-    else:
+    elif isinstance(model, MLPModel):
+        y_pred_proba = model.predict_proba_numpy(x_test)
+    if y_pred_proba is None:
         y_pred_proba = model.predict_proba(x_test)
 
-    for metric in metric_list:
-        # TODO: Replace in the dockerize version with the input parameters
-        metric_dict.add_metric(metric_function_dict[metric](y_test, y_pred_proba, labels=list(y_test.columns)))
+    return metrics_from_predictions(y_test, y_pred_proba, metric_list)
+
 
-    return metric_dict
+def metrics_from_predictions(y_test, y_pred_proba, metric_list: List[str], y_true=None) -> MetricVector:
+    """
+    :param y_true: Argmax of y_test, to avoid recomputing it when the same test set is evaluated several times.
+    """
+    if y_true is None:
+        y_true = np.argmax(np.asarray(y_test), axis=1)
+    scores = ConfusionMatrixScores(y_true, y_pred_proba, y_test.shape[1])
+    metric_vector = MetricVector(metric_schema(metric_list, y_test.shape[1]))
+    for metric in metric_list:
+        metric_vector.set_value_of_metric(metric, confusion_matrix_metric_dict[metric](scores))
+
+    return metric_vector
+
+
+def evaluator_many(x_test, y_test, model: Model, list_of_weights, metric_list: List[str]) -> List[MetricVector]:
+    """
+    Evaluates the model with every set of weights. MLPs compute all the forward passes in one batched call, other
+    models are evaluated one set of weights after the other.
+    """
+    if isinstance(model, MLPModel):
+        predictions = model.predict_proba_many(list_of_weights, x_test)
+        y_true = np.argmax(np.asarray(y_test), axis=1)
+        return [metrics_from_predictions(y_test, y_pred_proba, metric_list, y_true) for y_pred_proba in predictions]
+
+    results = []
+    for weights in list_of_weights:
+        model.set_model(weights)
+        results.append(evaluator(x_test, y_test, model, metric_list))
+    return results
 
@@ -1,13 +1,18 @@
+import itertools
 import math
 from logging import INFO
+from typing import Dict, FrozenSet
 
 import pandas as pd
 from flwr.common.logger import log
 
 from experiment_parameters.aggregation_processes.aggregate import aggregate_nn, aggregate_xgboost
 from experiment_parameters.model_builder.Model import Model
-from metrics.Evaluator import evaluator
-from metrics.Metrics import DictOfMetrics, return_default_dict_of_metrics
+from metrics.Evaluator import evaluator, evaluator_many
+from metrics.Metrics import MetricVector, return_default_metric_vector
+
+# Number of coalitions aggregated and evaluated together. Bounds the memory of the batched forward passes.
+COALITION_BATCH_SIZE = 32
 
 
 class ShapleyValues:
@@ -15,7 +20,7 @@ class ShapleyValues:
     _x_test: pd.DataFrame
     _y_test: pd.DataFrame
     _metric_list: list
-    _last_round_result: DictOfMetrics
+    _last_round_result: MetricVector
 
     def __init__(self, x_test, y_test, rounds, metric_list):
         self._x_test = x_test
@@ -39,8 +44,8 @@ class ShapleyValues:
 
     def update_shapley_value(self, local_round, client_cid, dict_of_values):
         if client_cid not in self._shapley_values[local_round].keys():
-            self._shapley_values[local_round][client_cid] = return_default_dict_of_metrics(self._metric_list,
-                                                                                           self._y_test.shape[1])
+            self._shapley_values[local_round][client_cid] = return_default_metric_vector(self._metric_list,
+                                                                                         self._y_test.shape[1])
 
         self._shapley_values[local_round][client_cid] += dict_of_values
 
@@ -49,6 +54,39 @@ class ShapleyValues:
         for client in self._shapley_values[local_round].keys():
             self._shapley_values[local_round][client] /= math.factorial(num_participants)
 
+    def _exact_shapley_values_calculation(self, clients_list, evaluate_coalitions, local_round):
+        """
+        Exact Shapley values computed over coalitions instead of permutations. Each of the 2^n coalitions is
+        aggregated and evaluated once, its metrics are cached by the frozenset of its clients, and the marginal
+        contributions are weighted with |S|! (n - |S| - 1)!. The division by n! happens in last_division.
+
+        :param evaluate_coalitions: Function that receives a list of non-empty coalitions, each one a list of
+        clients in the order of clients_list, and returns the MetricVector of their aggregated models.
+        """
+        coalition_results: Dict[FrozenSet, MetricVector] = {frozenset(): self._last_round_result}
+        coalitions = [list(coalition)
+                      for coalition_size in range(1, len(clients_list) + 1)
+                      for coalition in itertools.combinations(clients_list, coalition_size)]
+        for batch_start in range(0, len(coalitions), COALITION_BATCH_SIZE):
+            batch = coalitions[batch_start:batch_start + COALITION_BATCH_SIZE]
+            for coalition, result in zip(batch, evaluate_coalitions(batch)):
+                coalition_results[frozenset(coalition)] = result
+
+        def coalition_result(coalition: FrozenSet) -> MetricVector:
+            return coalition_results[coalition]
+
+        number_of_clients = len(clients_list)
+        for client in clients_list:
+            other_clients = [other_client for other_client in clients_list if other_client != client]
+            for coalition_size in range(number_of_clients):
+                weight = math.factorial(coalition_size) * math.factorial(number_of_clients - coalition_size - 1)
+                for coalition in itertools.combinations(other_clients, coalition_size):
+                    coalition = frozenset(coalition)
+                    self.update_shapley_value(local_round,
+                                              client,
+                                              (coalition_result(coalition | {client}) -
+                                               coalition_result(coalition)) * weight)
+
     def get_client_index_dictionary(self):
         return self._client_index_dictionary
 
@@ -68,58 +106,24 @@ class ShapleyValuesNN(ShapleyValues):
     def __init__(self, x_test, y_test, rounds, metric_list):
         super().__init__(x_test, y_test, rounds, metric_list)
 
-    def _rec_shapley_values_calculation(self,
-                                        model,
-                                        clients_selected,
-                                        clients_remaining,
-                                        client_weights,
-                                        last_result,
-                                        local_round):
-        for client in clients_remaining:
-            new_client_selection = clients_selected.copy()
-            new_remaining_clients = clients_remaining.copy()
-            new_client_selection.add(client)
-            new_remaining_clients.remove(client)
-            # log(INFO, 50 * "=")
-            # log(INFO, 50 * "=")
-            # log(INFO, "New Calculation")
-            # log(INFO, 50 * "=")
-            # log(INFO, "Calculation for clients {}".format([client.cid for client in new_client_selection]))
-
-            model.set_model(aggregate_nn([client_weights[client] for client in new_client_selection]))
-            participant_subset_dict_metrics = evaluator(self._x_test,
-                                                        self._y_test,
-                                                        model,
-                                                        self._metric_list)
-            # log(INFO, "Accuracy adding client {}: {}".format(client.cid, accuracy))
-            # log(INFO, "Former Accuracy: {}".format(former_accuracy))
-            self.update_shapley_value(local_round,
-                                      client,
-                                      (participant_subset_dict_metrics - last_result) *
-                                      math.factorial(len(new_remaining_clients)))
-
-            # log(INFO, "Difference on accuracy for client {}: {}".format(client.cid,
-            #                                                             (accuracy - former_accuracy) *
-            #                                                             math.factorial(len(new_remaining_clients))))
-            if len(clients_remaining) > 1:
-                self._rec_shapley_values_calculation(model,
-                                                     new_client_selection,
-                                                     new_remaining_clients,
-                                                     client_weights,
-                                                     participant_subset_dict_metrics,
-                                                     local_round)
+    def _evaluate_coalitions(self, model, client_weights, coalitions):
+        return evaluator_many(self._x_test,
+                              self._y_test,
+                              model,
+                              [aggregate_nn([client_weights[client] for client in coalition])
+                               for coalition in coalitions],
+                              self._metric_list)
 
     def shapley_values_calculation(self,
                                    model: Model,
                                    clients_list,
                                    client_weights,
                                    local_round):
-        self._rec_shapley_values_calculation(model,
-                                             set(),
-                                             clients_list,
-                                             client_weights,
-                                             self._last_round_result,
-                                             local_round)
+        self._exact_shapley_values_calculation(
+            list(clients_list),
+            lambda coalitions: self._evaluate_coalitions(model, client_weights, coalitions),
+            local_round
+        )
         self.last_division(local_round)
         result_dictionary = {client: str(shapley_values_client)
                              for client, shapley_values_client
@@ -133,50 +137,12 @@ class ShapleyValuesDT(ShapleyValues):
     def __init__(self, x_test, y_test, rounds, metric_list):
         super().__init__(x_test, y_test, rounds, metric_list)
 
-    def _rec_shapley_values_calculation(self,
-                                        model,
-                                        clients_selected,
-                                        clients_remaining,
-                                        client_trees,
-                                        last_result,
-                                        local_round,
-                                        global_model):
-        for client in clients_remaining:
-            new_client_selection = clients_selected.copy()
-            new_remaining_clients = clients_remaining.copy()
-            new_client_selection.add(client)
-            new_remaining_clients.remove(client)
-            # log(INFO, 50 * "=")
-            # log(INFO, 50 * "=")
-            # log(INFO, "New Calculation")
-            # log(INFO, 50 * "=")
-            # log(INFO, "Calculation for clients {}".format([client.cid for client in new_client_selection]))
-
-            model.set_model(aggregate_xgboost(
-                [client_trees[client] for client in new_client_selection], global_model
-            ))
-            participant_subset_dict_metrics = evaluator(self._x_test,
-                                                        self._y_test,
-                                                        model,
-                                                        self._metric_list)
-            # log(INFO, "Accuracy adding client {}: {}".format(client.cid, accuracy))
-            # log(INFO, "Former Accuracy: {}".format(former_accuracy))
-            self.update_shapley_value(local_round,
-                                      client,
-                                      (participant_subset_dict_metrics - last_result) *
-                                      math.factorial(len(new_remaining_clients)))
-
-            # log(INFO, "Difference on accuracy for client {}: {}".format(client.cid,
-            #                                                             (accuracy - former_accuracy) *
-            #                                                             math.factorial(len(new_remaining_clients))))
-            if len(clients_remaining) > 1:
-                self._rec_shapley_values_calculation(model,
-                                                     new_client_selection,
-                                                     new_remaining_clients,
-                                                     client_trees,
-                                                     participant_subset_dict_metrics,
-                                                     local_round,
-                                                     global_model)
+    def _evaluate_coalitions(self, model, client_trees, global_model, coalitions):
+        results = []
+        for coalition in coalitions:
+            model.set_model(aggregate_xgboost([client_trees[client] for client in coalition], global_model))
+            results.append(evaluator(self._x_test, self._y_test, model, self._metric_list))
+        return results
 
     def shapley_values_calculation(self,
                                    model: Model,
@@ -184,13 +150,11 @@ class ShapleyValuesDT(ShapleyValues):
                                    client_weights,
                                    local_round,
                                    global_model):
-        self._rec_shapley_values_calculation(model,
-                                             set(),
-                                             clients_list,
-                                             client_weights,
-                                             self._last_round_result,
-                                             local_round,
-                                             global_model)
+        self._exact_shapley_values_calculation(
+            list(clients_list),
+            lambda coalitions: self._evaluate_coalitions(model, client_weights, global_model, coalitions),
+            local_round
+        )
         self.last_division(local_round)
         result_dictionary = {client: str(shapley_values_client)
                              for client, shapley_values_client
@@ -0,0 +1,86 @@
+"""
+Fingerprints of the datasets of the client, the hash under which a dataset is registered.
+
+A dataset is hashed by chunks of rows: every chunk gives the SHA-256 of its pandas row hashes (hash_pandas_object
+with the index), and the digests of the chunks are combined as the leaves of a Merkle tree. The fingerprint is the
+root as a decimal string, the format of the registered dataset names.
+
+The fingerprints are kept in a small JSON index by path, size and modification time, so a dataset that did not
+change since it was hashed is not read again to register it for another training session.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import List, Optional
+
+import pandas as pd
+
+# Part of the definition of the fingerprint: the same dataset hashed by chunks of another size has another one.
+FINGERPRINT_CHUNK_ROWS = 100000
+INDEX_NAME = "fingerprints.json"
+
+
+class DatasetFingerprint:
+    """Incremental fingerprint, the chunks are added in the order of the rows."""
+    _leaves: List[bytes]
+
+    def __init__(self):
+        self._leaves = []
+
+    def add_chunk(self, chunk: pd.DataFrame):
+        self._leaves.append(hashlib.sha256(pd.util.hash_pandas_object(chunk, index=True).values.tobytes()).digest())
+
+    def hexdigest(self) -> str:
+        level = self._leaves or [hashlib.sha256(b"").digest()]
+        while len(level) > 1:
+            if len(level) % 2 == 1:
+                level = level + [level[-1]]
+            level = [hashlib.sha256(left + right).digest() for left, right in zip(level[::2], level[1::2])]
+        return level[0].hex()
+
+    def fingerprint(self) -> str:
+        return str(int(self.hexdigest(), 16))
+
+
+class FingerprintCache:
+    """Index of the fingerprints of the datasets, stored as JSON. Key: absolute path of the dataset."""
+
+    def __init__(self, index_path: str):
+        self._index_path = index_path
+        self._index = {}
+        if os.path.isfile(index_path):
+            with open(index_path, "r") as f:
+                self._index = json.load(f)
+
+    @staticmethod
+    def signature(dataset_path: str) -> dict:
+        status = os.stat(dataset_path)
+        return {"size": status.st_size, "mtime_ns": status.st_mtime_ns, "chunk_rows": FINGERPRINT_CHUNK_ROWS}
+
+    def get(self, dataset_path: str) -> Optional[str]:
+        """Fingerprint of the dataset, None if it was not hashed or changed since."""
+        entry = self._index.get(os.path.abspath(dataset_path))
+        if entry is None or entry["signature"] != self.signature(dataset_path):
+            return None
+        return entry["fingerprint"]
+
+    def put(self, dataset_path: str, fingerprint: str, signature: Optional[dict] = None):
+        """
+        :param signature: Signature of the file when it started to be read, so a dataset modified while it was
+                          hashed is hashed again.
+        """
+        self._index[os.path.abspath(dataset_path)] = {
+            "signature": signature if signature is not None else self.signature(dataset_path),
+            "fingerprint": fingerprint
+        }
+        # Unique, so concurrent registrations do not write to the same temporary index.
+        temporary_file, temporary_path = tempfile.mkstemp(suffix=".json", prefix=INDEX_NAME + "-",
+                                                          dir=os.path.dirname(os.path.abspath(self._index_path)))
+        try:
+            with os.fdopen(temporary_file, "w") as f:
+                json.dump(self._index, f)
+            os.replace(temporary_path, self._index_path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
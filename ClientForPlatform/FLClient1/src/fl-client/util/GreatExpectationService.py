@@ -25,6 +25,8 @@ class GreatExpectationService:
 
         suite = gx.ExpectationSuite(name="Data Validation Expectations")
         self.suite = self.context.suites.add(suite)
+        # General type expected for every column with a type expectation.
+        self.column_types = {}
 
     def add_expectations_from_configuration(self, validation_configuration):
         dataset_features = validation_configuration.get("dataset_features", [])
@@ -74,6 +76,7 @@ class GreatExpectationService:
         if not pandas_types:
             raise ValueError(
                 f"Unknown general type '{type}'. Supported types are: {list(self.GENERAL_TO_PANDAS.keys())}")
+        self.column_types[name] = type
         self.suite.add_expectation(
             gx.expectations.ExpectColumnValuesToBeInTypeList(
                 column=name,
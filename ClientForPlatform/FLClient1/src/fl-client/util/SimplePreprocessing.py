@@ -29,3 +29,83 @@ def scale_column(X_column, min_value, max_value):
     X_std = (X_column - min_value) / (max_value - min_value)
     # X_scaled = X_std * (max_value - min_value) + min_value
     return X_std
+
+
+MIN_MAX_ENCODER = "min_max_encoder"
+ONE_HOT_ENCODER = "one_hot_encoder"
+
+
+def _normalize_categories(values):
+    return pd.Series(values, dtype="string").str.strip().str.lower()
+
+
+class _EncodedBlock:
+    """
+    Columns of the output of a PreprocessingPlan: the scaled features (float) and the one-hot encoded features
+    (int). Like the pd.merge of the one-hot columns in the former preprocessing, a category that is already a column
+    renames both columns with the suffixes "_x" (former) and "_y" (new).
+    """
+
+    def __init__(self):
+        self.columns = []
+        # Min-max scaled features: their names, positions in the output, minimums and ranges.
+        self.scaled_names = []
+        self.scaled_positions = []
+        self.minimums = []
+        self.ranges = []
+        # One-hot encoded features: their names, the position of their first column and their categories.
+        self.one_hot_features = []
+
+    def add(self, feature):
+        preprocessing_type = feature["preprocessing"]["type_of_Preprocessing"]
+        if preprocessing_type == MIN_MAX_ENCODER:
+            self.scaled_names.append(feature["name"])
+            self.scaled_positions.append(len(self.columns))
+            self.minimums.append(feature["range"][0])
+            self.ranges.append(feature["range"][1] - feature["range"][0])
+            self.columns.append(feature["name"])
+        elif preprocessing_type == ONE_HOT_ENCODER:
+            # Repeated categories were a single column.
+            categories = list(dict.fromkeys(_normalize_categories(feature["valid_values"])))
+            repeated = set(self.columns).intersection(categories)
+            self.columns = [column + "_x" if column in repeated else column for column in self.columns]
+            self.one_hot_features.append((feature["name"], len(self.columns), pd.CategoricalDtype(categories)))
+            self.columns.extend(category + "_y" if category in repeated else category for category in categories)
+
+    def transform(self, split: pd.DataFrame) -> pd.DataFrame:
+        encoded = np.zeros((len(split), len(self.columns)), dtype=np.int64)
+        rows = np.arange(len(split))
+        for name, offset, categories in self.one_hot_features:
+            # Values that are not among the categories (or missing) have code -1 and no column set.
+            codes = _normalize_categories(split[name]).astype(categories).cat.codes.to_numpy()
+            known = codes >= 0
+            encoded[rows[known], offset + codes[known]] = 1
+        encoded = pd.DataFrame(encoded, index=split.index, columns=self.columns, copy=False)
+        if self.scaled_names:
+            encoded = encoded.astype({self.columns[position]: np.float64 for position in self.scaled_positions})
+            encoded.iloc[:, self.scaled_positions] = \
+                (split[self.scaled_names].to_numpy(dtype=np.float64) - self.minimums) / self.ranges
+        return encoded
+
+
+class PreprocessingPlan:
+    """
+    Preprocessing of a dataset compiled once from its feature schema. The last feature of the schema is the label.
+
+    All the min-max scalings of a split are applied as one affine transform of its numeric columns, and every
+    one-hot encoded feature sets its columns through its categorical codes, in a single matrix allocated once.
+    """
+
+    def __init__(self, features_information):
+        self._label = _EncodedBlock()
+        self._features = _EncodedBlock()
+        label_column_name = features_information[-1]["name"]
+        for feature in features_information:
+            if feature["name"] == label_column_name:
+                self._label.add(feature)
+            else:
+                self._features.add(feature)
+
+    def transform(self, split: pd.DataFrame):
+        """Returns the preprocessed features and labels of the split, which holds both."""
+        return self._features.transform(split), self._label.transform(split)
@@ -0,0 +1,227 @@
+"""
+Compressed transport of the model weights between the Flower server and the FedAvg clients.
+
+The server sends the global model quantized, except in the last round, and the clients send their update as the
+difference with the global model they received, quantized and optionally sparsified to its top-k entries. What the quantization and the
+sparsification drop from an update is kept by the client and added to its next update (error feedback). The whole
+payload may be compressed with zstd.
+
+An encoded model travels as a single uint8 array, so Flower serializes it like any other list of NDArrays and
+decode_parameters recognizes it by its magic. Models that are not encoded pass through unchanged.
+
+Layout (little endian):
+    - Header: magic b"FLTC", version (uint8), compression (uint8), length of the tensor table (uint32).
+    - Tensor table: JSON list, for every tensor its dtype, shape, encoding, scale and number of entries sent.
+    - Body: for every tensor the indices of the entries sent (uint32, only when sparsified) and their values.
+"""
+import json
+import math
+import struct
+from typing import Dict, List, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+MAGIC = b"FLTC"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBI")
+
+QUANTIZATION_NONE = "none"
+QUANTIZATION_FLOAT16 = "float16"
+QUANTIZATION_INT8 = "int8"
+COMPRESSION_NONE = "none"
+COMPRESSION_ZSTD = "zstd"
+_COMPRESSIONS = [COMPRESSION_NONE, COMPRESSION_ZSTD]
+
+# Prefix of the keys of the codec in the fit config of the clients.
+FIT_CONFIG_PREFIX = "transport_"
+
+
+def is_encoded(arrays: List[NDArray]) -> bool:
+    return (len(arrays) == 1 and arrays[0].dtype == np.uint8 and arrays[0].ndim == 1
+            and arrays[0][:len(MAGIC)].tobytes() == MAGIC)
+
+
+def decode_parameters(arrays: List[NDArray], reference: Optional[List[NDArray]] = None) -> List[NDArray]:
+    """
+    Decodes the arrays received from Flower. A difference is added to the reference, the model it was computed
+    against.
+    """
+    if not is_encoded(arrays):
+        return arrays
+    payload = arrays[0].tobytes()
+    magic, version, compression, table_length = _HEADER.unpack_from(payload)
+    if version != VERSION:
+        raise ValueError(f"Unknown transport encoding version {version}")
+    offset = _HEADER.size
+    table = json.loads(payload[offset:offset + table_length])
+    body = payload[offset + table_length:]
+    if _COMPRESSIONS[compression] == COMPRESSION_ZSTD:
+        # zstandard is only imported by the configurations that compress.
+        import zstandard
+        body = zstandard.ZstdDecompressor().decompress(body)
+
+    if table["delta"] and reference is None:
+        raise ValueError("The payload is a difference, but there is no reference to add it to")
+    tensors = []
+    offset = 0
+    for position, entry in enumerate(table["tensors"]):
+        dtype = np.dtype(entry["dtype"])
+        size = math.prod(entry["shape"])
+        indices = None
+        if entry["entries"] < size:
+            indices = np.frombuffer(body, dtype="<u4", count=entry["entries"], offset=offset)
+            offset += indices.nbytes
+        encoded_dtype = np.dtype(_encoded_dtype(entry["encoding"], dtype))
+        values = np.frombuffer(body, dtype=encoded_dtype, count=entry["entries"], offset=offset)
+        offset += values.nbytes
+        values = values.astype(dtype)
+        if entry["encoding"] == QUANTIZATION_INT8:
+            values *= dtype.type(entry["scale"])
+
+        if table["delta"]:
+            tensor = np.array(reference[position], dtype=dtype).reshape(-1)
+            if indices is None:
+                tensor += values
+            else:
+                tensor[indices] += values
+        elif indices is None:
+            tensor = values
+        else:
+            tensor = np.zeros(size, dtype=dtype)
+            tensor[indices] = values
+        tensors.append(tensor.reshape(entry["shape"]))
+    return tensors
+
+
+def _encoded_dtype(encoding: str, dtype: np.dtype) -> str:
+    if encoding == QUANTIZATION_FLOAT16:
+        return "<f2"
+    if encoding == QUANTIZATION_INT8:
+        return "i1"
+    return dtype.newbyteorder("<").str
+
+
+class TransportCodec:
+    """
+    Encoder of one side of the transport. It keeps the residuals of the error feedback between the rounds, so the
+    clients create it once per training.
+    """
+    _residuals: Optional[List[NDArray]]
+
+    def __init__(self,
+                 quantization: str = QUANTIZATION_NONE,
+                 top_k: float = 1.0,
+                 compression: str = COMPRESSION_NONE,
+                 compression_level: int = 3):
+        """
+        :param quantization: "none", "float16" or "int8" (one scale per tensor).
+        :param top_k: Fraction of the entries of every tensor of a difference that are sent, the largest ones.
+        :param compression: "none" or "zstd".
+        """
+        if quantization not in (QUANTIZATION_NONE, QUANTIZATION_FLOAT16, QUANTIZATION_INT8):
+            raise ValueError(f"Unknown quantization {quantization}")
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}")
+        if not 0 < top_k <= 1:
+            raise ValueError(f"top_k must be in (0, 1], got {top_k}")
+        self.quantization = quantization
+        self.top_k = top_k
+        self.compression = compression
+        self.compression_level = compression_level
+        self._residuals = None
+
+    @classmethod
+    def from_configuration(cls, configuration: Optional[Dict]) -> "TransportCodec":
+        """Codec of the "transport_configuration" of a training configuration."""
+        if configuration is None:
+            configuration = {}
+        return cls(quantization=configuration.get("quantization", QUANTIZATION_NONE),
+                   top_k=float(configuration.get("top_k", 1.0)),
+                   compression=configuration.get("compression", COMPRESSION_NONE),
+                   compression_level=int(configuration.get("compression_level", 3)))
+
+    @classmethod
+    def from_fit_config(cls, config: Dict) -> "TransportCodec":
+        return cls.from_configuration({key[len(FIT_CONFIG_PREFIX):]: value for key, value in config.items()
+                                       if key.startswith(FIT_CONFIG_PREFIX)})
+
+    def fit_config(self) -> Dict:
+        return {FIT_CONFIG_PREFIX + "quantization": self.quantization,
+                FIT_CONFIG_PREFIX + "top_k": self.top_k,
+                FIT_CONFIG_PREFIX + "compression": self.compression,
+                FIT_CONFIG_PREFIX + "compression_level": self.compression_level}
+
+    def lossless(self) -> "TransportCodec":
+        """Codec with the compression of this one but without quantization."""
+        return TransportCodec(compression=self.compression, compression_level=self.compression_level)
+
+    @property
+    def enabled(self) -> bool:
+        return (self.quantization != QUANTIZATION_NONE or self.top_k < 1
+                or self.compression != COMPRESSION_NONE)
+
+    def encode(self, weights: List[NDArray], reference: Optional[List[NDArray]] = None) -> List[NDArray]:
+        """
+        Encodes the weights, or their difference with the reference if there is one. Only the differences are
+        sparsified and corrected with the error feedback.
+        """
+        delta = reference is not None
+        if delta:
+            values = [np.asarray(tensor) - np.asarray(base) for tensor, base in zip(weights, reference)]
+            if self._residuals is not None and [r.shape for r in self._residuals] == [v.shape for v in values]:
+                values = [value + residual for value, residual in zip(values, self._residuals)]
+        else:
+            values = [np.asarray(tensor) for tensor in weights]
+
+        table = []
+        body = []
+        residuals = []
+        for value in values:
+            flat = value.reshape(-1)
+            entry = {"dtype": flat.dtype.str, "shape": list(value.shape), "encoding": QUANTIZATION_NONE,
+                     "scale": 1.0, "entries": flat.size}
+            indices = None
+            if delta and self.top_k < 1 and flat.size > 0:
+                entries = max(1, math.ceil(self.top_k * flat.size))
+                if entries < flat.size:
+                    indices = np.sort(np.argpartition(np.abs(flat), flat.size - entries)[flat.size - entries:])
+                    flat = flat[indices]
+                    entry["entries"] = entries
+                    body.append(indices.astype("<u4").tobytes())
+
+            sent = flat
+            if np.issubdtype(flat.dtype, np.floating) and self.quantization == QUANTIZATION_FLOAT16:
+                entry["encoding"] = QUANTIZATION_FLOAT16
+                encoded = flat.astype("<f2")
+                sent = encoded.astype(flat.dtype)
+            elif np.issubdtype(flat.dtype, np.floating) and self.quantization == QUANTIZATION_INT8:
+                entry["encoding"] = QUANTIZATION_INT8
+                maximum = float(np.max(np.abs(flat))) if flat.size else 0.0
+                scale = maximum / 127 if maximum > 0 else 1.0
+                encoded = np.clip(np.rint(flat / scale), -127, 127).astype("i1")
+                entry["scale"] = scale
+                sent = encoded.astype(flat.dtype) * flat.dtype.type(scale)
+            else:
+                encoded = flat.astype(flat.dtype.newbyteorder("<"))
+            body.append(encoded.tobytes())
+            table.append(entry)
+
+            if delta:
+                residual = value.reshape(-1).copy()
+                if indices is None:
+                    residual -= sent
+                else:
+                    residual[indices] -= sent
+                residuals.append(residual.reshape(value.shape))
+        if delta:
+            self._residuals = residuals
+
+        body = b"".join(body)
+        if self.compression == COMPRESSION_ZSTD:
+            import zstandard
+            body = zstandard.ZstdCompressor(level=self.compression_level).compress(body)
+        encoded_table = json.dumps({"delta": delta, "tensors": table}).encode()
+        payload = (_HEADER.pack(MAGIC, VERSION, _COMPRESSIONS.index(self.compression), len(encoded_table))
+                   + encoded_table + body)
+        return [np.frombuffer(payload, dtype=np.uint8)]
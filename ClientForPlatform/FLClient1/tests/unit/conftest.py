@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The client code imports its modules from the fl-client directory.
+FL_CLIENT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "src", "fl-client")
+if FL_CLIENT_DIR not in sys.path:
+    sys.path.insert(0, os.path.abspath(FL_CLIENT_DIR))
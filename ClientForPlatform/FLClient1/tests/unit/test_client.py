@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Client
+from experiment_parameters.data_loader.TrainingSplits import SPLIT_NAMES, save_split
+
+
+@pytest.fixture
+def training_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(Client, "directory_for_training_data", str(tmp_path))
+    monkeypatch.setattr(Client, "_training_data", {})
+    os.makedirs(tmp_path / "dataset")
+    return tmp_path / "dataset"
+
+
+def write_splits(directory, value, binary):
+    for split_name in SPLIT_NAMES:
+        split = pd.DataFrame({"a": np.full(4, value), "b": np.arange(4)})
+        if binary:
+            save_split(str(directory), split_name, split)
+        else:
+            split.to_csv(directory / (split_name + ".csv"))
+
+
+def touch_later(directory):
+    # Some file systems only keep the modification time to the second.
+    for name in os.listdir(directory):
+        path = directory / name
+        status = os.stat(path)
+        os.utime(path, ns=(status.st_atime_ns, status.st_mtime_ns + 2 * 10 ** 9))
+
+
+@pytest.mark.parametrize("binary", [True, False])
+def test_training_data_is_read_again_once_its_files_change(training_data, binary):
+    write_splits(training_data, 1.5, binary)
+    first = Client.load_training_data("dataset")
+    assert first[0]["a"].tolist() == [1.5] * 4
+
+    # Unchanged files are not read again.
+    assert Client.load_training_data("dataset") is first
+
+    write_splits(training_data, 2.5, binary)
+    touch_later(training_data)
+    second = Client.load_training_data("dataset")
+    assert second is not first
+    for split in second:
+        assert split["a"].tolist() == [2.5] * 4
@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+import pytest
+
+from client_worker import FlowerClientWorker
+
+
+# Job of the worker, in place of Client.run_client.
+def train(outcome="finish"):
+    if outcome == "fail":
+        raise ValueError("The Flower client failed")
+    if outcome == "die":
+        os._exit(1)
+
+
+def test_jobs_finish_fail_and_survive_the_death_of_the_worker():
+    async def scenario():
+        worker = FlowerClientWorker(run_job=train)
+        try:
+            await asyncio.wait_for(worker.run_client({}), timeout=60)
+
+            with pytest.raises(RuntimeError, match="failed"):
+                await asyncio.wait_for(worker.run_client({"outcome": "fail"}), timeout=60)
+
+            with pytest.raises(RuntimeError, match="died"):
+                await asyncio.wait_for(worker.run_client({"outcome": "die"}), timeout=60)
+
+            # The worker was respawned and takes the next jobs.
+            await asyncio.wait_for(worker.run_client({}), timeout=60)
+        finally:
+            worker.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from util.DatasetFingerprint import DatasetFingerprint, FingerprintCache
+
+FL_CLIENT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "src", "fl-client")
+
+
+def chunks():
+    return [pd.DataFrame({"amount": [1.5, 2.5], "code": ["a", "b"]}, index=[2 * i, 2 * i + 1]) for i in range(3)]
+
+
+def fingerprint_of(dataframes):
+    fingerprint = DatasetFingerprint()
+    for chunk in dataframes:
+        fingerprint.add_chunk(chunk)
+    return fingerprint
+
+
+def test_fingerprint_is_the_root_of_the_merkle_tree_of_the_chunks():
+    leaves = [hashlib.sha256(pd.util.hash_pandas_object(chunk, index=True).values.tobytes()).digest()
+              for chunk in chunks()]
+    # The last leaf of an odd level is paired with itself.
+    left = hashlib.sha256(leaves[0] + leaves[1]).digest()
+    right = hashlib.sha256(leaves[2] + leaves[2]).digest()
+
+    fingerprint = fingerprint_of(chunks())
+
+    assert fingerprint.hexdigest() == hashlib.sha256(left + right).hexdigest()
+    assert fingerprint.fingerprint() == str(int(fingerprint.hexdigest(), 16))
+    assert fingerprint_of(chunks()[::-1]).hexdigest() != fingerprint.hexdigest()
+
+
+def test_fingerprint_is_the_same_in_every_process():
+    script = ("import pandas as pd\n"
+              "from util.DatasetFingerprint import DatasetFingerprint\n"
+              "fingerprint = DatasetFingerprint()\n"
+              "for i in range(3):\n"
+              "    fingerprint.add_chunk(pd.DataFrame({'amount': [1.5, 2.5], 'code': ['a', 'b']},"
+              " index=[2 * i, 2 * i + 1]))\n"
+              "print(fingerprint.fingerprint())\n")
+    expected = fingerprint_of(chunks()).fingerprint()
+    for hash_seed in ["1", "2"]:
+        environment = dict(os.environ, PYTHONHASHSEED=hash_seed)
+        output = subprocess.run([sys.executable, "-c", script], cwd=FL_CLIENT_DIR, env=environment,
+                                capture_output=True, text=True, check=True).stdout
+        assert output.strip() == expected
+
+
+def test_cached_fingerprints_are_invalidated_by_a_new_size_or_modification_time(tmp_path):
+    dataset_path = tmp_path / "dataset.csv"
+    pd.DataFrame({"amount": np.arange(4)}).to_csv(dataset_path)
+    index_path = str(tmp_path / "fingerprints.json")
+    FingerprintCache(index_path).put(str(dataset_path), "123")
+
+    assert FingerprintCache(index_path).get(str(dataset_path)) == "123"
+    assert [name for name in os.listdir(tmp_path) if name.startswith("fingerprints.json-")] == []
+
+    status = os.stat(dataset_path)
+    os.utime(dataset_path, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9))
+    assert FingerprintCache(index_path).get(str(dataset_path)) is None
+
+    # Only the size changes.
+    FingerprintCache(index_path).put(str(dataset_path), "456")
+    modification_time = os.stat(dataset_path).st_mtime_ns
+    with open(dataset_path, "a") as f:
+        f.write("4,4\n")
+    os.utime(dataset_path, ns=(status.st_atime_ns, modification_time))
+    assert FingerprintCache(index_path).get(str(dataset_path)) is None
@@ -0,0 +1,106 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import util.DatasetRegistration as DatasetRegistration
+from util.DatasetRegistration import register_dataset_file, _validation_frame
+from util.GreatExpectationService import GreatExpectationService
+
+COLUMN_TYPES = {"amount": "float", "code": "string", "count": "integer"}
+
+
+class TypeExpectations:
+    """Checks the dtypes of the columns like the type expectations of GreatExpectationService."""
+
+    def __init__(self, column_types):
+        self.column_types = column_types
+
+    def run_validation_on_pandas(self, dataframe):
+        success = all(str(dataframe[column].dtype) in GreatExpectationService.GENERAL_TO_PANDAS[general_type]
+                      for column, general_type in self.column_types.items())
+        return SimpleNamespace(success=success)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(DatasetRegistration, "FINGERPRINT_CHUNK_ROWS", 3)
+
+
+def write_dataset(path, amount, code):
+    dataset = pd.DataFrame({"amount": amount, "code": code, "count": np.arange(len(amount))})
+    dataset.to_csv(path)
+    return dataset
+
+
+def test_chunks_are_validated_with_the_dtypes_of_the_whole_file(tmp_path):
+    # The first chunk holds only whole amounts and numeric codes, pandas infers int64 for both.
+    dataset_path = tmp_path / "dataset.csv"
+    write_dataset(dataset_path, [1, 2, 3, 4.5, 5, 6.25], ["1", "2", "3", "a", "b", "c"])
+    expectations = TypeExpectations(COLUMN_TYPES)
+    whole_file = pd.read_csv(dataset_path, index_col=0)
+    assert expectations.run_validation_on_pandas(_validation_frame(whole_file, COLUMN_TYPES, ["code"])).success
+
+    validation_result, fingerprint = register_dataset_file(str(dataset_path), str(tmp_path / "registered"),
+                                                           expectations)
+
+    assert validation_result.success
+    registered = pd.read_csv(tmp_path / "registered" / (fingerprint + ".csv"), index_col=0)
+    pd.testing.assert_frame_equal(registered, whole_file)
+
+
+def test_invalid_and_empty_datasets_leave_no_copy(tmp_path):
+    registered_directory = tmp_path / "registered"
+    dataset_path = tmp_path / "dataset.csv"
+    # The last chunk holds a count that is not an integer.
+    pd.DataFrame({"amount": [1.5] * 6, "code": ["a"] * 6, "count": [1, 2, 3, 4, 5, 6.5]}).to_csv(dataset_path)
+    validation_result, fingerprint = register_dataset_file(str(dataset_path), str(registered_directory),
+                                                           TypeExpectations(COLUMN_TYPES))
+    assert not validation_result.success and fingerprint is None
+
+    empty_path = tmp_path / "empty.csv"
+    pd.DataFrame(columns=["amount", "code", "count"]).to_csv(empty_path)
+    with pytest.raises(ValueError):
+        register_dataset_file(str(empty_path), str(registered_directory), TypeExpectations(COLUMN_TYPES))
+    assert os.listdir(registered_directory) == []
+
+
+def test_string_columns_that_hold_only_numbers_are_not_valid(tmp_path):
+    registered_directory = tmp_path / "registered"
+    dataset_path = tmp_path / "dataset.csv"
+    write_dataset(dataset_path, [1.5] * 6, [1, 2, 3, 4, 5, 6])
+
+    validation_result, fingerprint = register_dataset_file(str(dataset_path), str(registered_directory),
+                                                           TypeExpectations(COLUMN_TYPES))
+
+    assert not validation_result.success and fingerprint is None
+    assert os.listdir(registered_directory) == []
+
+
+def test_concurrent_registrations_use_their_own_copy(tmp_path, monkeypatch):
+    registered_directory = tmp_path / "registered"
+    first_path = tmp_path / "first.csv"
+    second_path = tmp_path / "second.csv"
+    first = write_dataset(first_path, [1.5] * 4, ["a"] * 4)
+    second = write_dataset(second_path, [2.5] * 5, ["b"] * 5)
+    expectations = TypeExpectations(COLUMN_TYPES)
+    fingerprints = {}
+
+    validated_chunks = []
+
+    # The second dataset is registered after the first chunk of the first one was copied.
+    def validate_and_register_second(dataframe):
+        validated_chunks.append(dataframe)
+        if len(validated_chunks) == 2:
+            fingerprints["second"] = register_dataset_file(str(second_path), str(registered_directory),
+                                                           TypeExpectations(COLUMN_TYPES))[1]
+        return TypeExpectations.run_validation_on_pandas(expectations, dataframe)
+
+    monkeypatch.setattr(expectations, "run_validation_on_pandas", validate_and_register_second)
+    fingerprints["first"] = register_dataset_file(str(first_path), str(registered_directory), expectations)[1]
+
+    for name, dataset in [("first", first), ("second", second)]:
+        registered = pd.read_csv(registered_directory / (fingerprints[name] + ".csv"), index_col=0)
+        pd.testing.assert_frame_equal(registered, dataset)
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from util.SimplePreprocessing import PreprocessingPlan, scale_column, one_hot_encode_column
+
+FEATURES = [
+    {"name": "age", "range": [0, 100], "preprocessing": {"type_of_Preprocessing": "min_max_encoder"}},
+    {"name": "smoker", "valid_values": ["Yes", "No"], "preprocessing": {"type_of_Preprocessing": "one_hot_encoder"}},
+    {"name": "weight", "range": [40, 140], "preprocessing": {"type_of_Preprocessing": "min_max_encoder"}},
+    {"name": "diabetic", "valid_values": ["yes", "no "], "preprocessing": {"type_of_Preprocessing": "one_hot_encoder"}},
+    {"name": "sport", "valid_values": ["none", "weekly", "daily"],
+     "preprocessing": {"type_of_Preprocessing": "one_hot_encoder"}},
+    {"name": "risk", "valid_values": ["low", "high"], "preprocessing": {"type_of_Preprocessing": "one_hot_encoder"}},
+]
+
+DATASET = pd.DataFrame({"age": [30, 45, 60, 75],
+                        "smoker": ["yes", " No", "YES", "no"],
+                        "weight": [60.5, 80, 95.25, 70],
+                        "diabetic": ["no", "yes", "no", "unknown"],
+                        "sport": ["daily", "none", "weekly", "none"],
+                        "risk": ["low", "high", "high", "low"]},
+                       index=[12, 4, 7, 30])
+
+
+def former_preprocessing(split, features_information):
+    """The loop of main.preprocessing before the PreprocessingPlan, for one split."""
+    y = split.iloc[:, -1:]
+    preprocessed_X = pd.DataFrame()
+    preprocessed_y = pd.DataFrame()
+    label_column_name = features_information[-1]["name"]
+    for feature in features_information:
+        if feature["preprocessing"]["type_of_Preprocessing"] == "min_max_encoder":
+            if feature["name"] == label_column_name:
+                preprocessed_y = scale_column(y, feature["range"][0], feature["range"][1])
+            else:
+                preprocessed_X[feature["name"]] = scale_column(split[feature["name"]], feature["range"][0],
+                                                               feature["range"][1])
+        if feature["preprocessing"]["type_of_Preprocessing"] == "one_hot_encoder":
+            if feature["name"] == label_column_name:
+                preprocessed_y = one_hot_encode_column(y[feature["name"]], feature["valid_values"])
+            else:
+                transformed_columns = one_hot_encode_column(split[feature["name"]], feature["valid_values"])
+                preprocessed_X = pd.merge(left=preprocessed_X, right=transformed_columns,
+                                          left_index=True, right_index=True)
+    return preprocessed_X, preprocessed_y
+
+
+def test_the_plan_gives_the_output_of_the_former_preprocessing():
+    X, y = PreprocessingPlan(FEATURES).transform(DATASET)
+    former_X, former_y = former_preprocessing(DATASET, FEATURES)
+
+    # The features that share their categories are told apart by the suffixes of pd.merge.
+    assert list(X.columns) == ["age", "yes_x", "no_x", "weight", "yes_y", "no_y", "none", "weekly", "daily"]
+    pd.testing.assert_frame_equal(X, former_X)
+    pd.testing.assert_frame_equal(y, former_y)
+
+
+def test_a_scaled_label_gives_the_output_of_the_former_preprocessing():
+    features = FEATURES[:-1] + [{"name": "cost", "range": [0, 1000],
+                                 "preprocessing": {"type_of_Preprocessing": "min_max_encoder"}}]
+    dataset = DATASET.drop(columns="risk").assign(cost=[100, 250.5, 900, 0])
+
+    X, y = PreprocessingPlan(features).transform(dataset)
+    former_X, former_y = former_preprocessing(dataset, features)
+
+    pd.testing.assert_frame_equal(X, former_X)
+    pd.testing.assert_frame_equal(y, former_y)
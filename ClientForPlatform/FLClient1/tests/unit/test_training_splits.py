@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from experiment_parameters.data_loader.TrainingSplits import save_split, load_split, has_splits, SPLIT_NAMES
+
+
+def test_splits_round_trip_with_their_dtypes_index_and_columns(tmp_path):
+    directory = str(tmp_path)
+    splits = {
+        "X_train": pd.DataFrame({"age": np.array([0.25, 0.5, 1.0], dtype=np.float32),
+                                 "smoker_yes": np.array([1, 0, 1], dtype=np.float32)}, index=[7, 3, 11]),
+        "X_test": pd.DataFrame({"age": [0.75], "visits": np.array([4], dtype=np.int64)}, index=["patient-2"]),
+        "y_train": pd.DataFrame({"yes": [1, 0, 1], "no": [0, 1, 0]}, index=[7, 3, 11]),
+        "y_test": pd.DataFrame({"yes": [0], "no": [1]}, index=["patient-2"]),
+    }
+    for split_name, split in splits.items():
+        save_split(directory, split_name, split)
+
+    assert has_splits(directory)
+    for split_name in SPLIT_NAMES:
+        pd.testing.assert_frame_equal(load_split(directory, split_name), splits[split_name], check_index_type=True)
+    assert not load_split(directory, "X_train")["age"].values.flags.writeable
+
+
+def test_a_split_saved_again_leaves_the_mapped_one_intact(tmp_path):
+    directory = str(tmp_path)
+    save_split(directory, "X_train", pd.DataFrame({"age": np.arange(1000, dtype=np.float64)}))
+    mapped = load_split(directory, "X_train")
+
+    save_split(directory, "X_train", pd.DataFrame({"age": -np.arange(500, dtype=np.float64)}))
+
+    assert mapped["age"].sum() == np.arange(1000).sum()
+    assert load_split(directory, "X_train")["age"].sum() == -np.arange(500).sum()
+    assert sorted(os.listdir(directory)) == ["X_train.json", "X_train.npy", "X_train_index.npy"]
@@ -1,4 +1,5 @@
 from logging import INFO
+from typing import Dict, Tuple
 
 import flwr
 from sys import argv
@@ -18,68 +19,108 @@ from flwr.common.logger import log
 
 # from SyntheticDataGenerator import sample_synthetic_unlabeled_data
 from experiment_parameters.TrainerFactory import strategies_dictionary
+from experiment_parameters.data_loader.TrainingSplits import SPLIT_NAMES, has_splits, load_split, split_files
 
 """
 Look for similar comments on the Server.py file.
 """
 
-strategy_selected = argv[1]
-name_dataset = argv[2]
-model_selected = argv[3]
-client_id = argv[4]
-connection_ip = argv[5]
-metric_list = argv[6].split("-")
-
 os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
 # TODO: If logits are true, than crash
 # Function call stack:
 # train_function -> assert_greater_equal_Assert_AssertGuard_false_811
 # -> train_function -> assert_greater_equal_Assert_AssertGuard_false_811
 
-logits = False
-if strategy_selected in ["FedKD", "FedDKD"]:
-    logits = True
-
-# model = factory_return_model(dataset_factory, model_selected, logits)
-
-# dataset_name = "\\dataset_" + dataset_selected
-# alpha_directory = "\\alpha_" + route_to_dataset
-
 # The training data is retrieved by using the name of the dataset.
 working_directory = os.getcwd() + os.sep + "src" + os.sep + "fl-client"
 directory_for_training_data = working_directory + os.sep + "data" + os.sep + "training_data_preprocessed"
 # directory_for_training_data = working_directory + os.sep + "data" + os.sep + "training_data"
 # directory_for_training_data_no_preprocessed = working_directory + os.sep + "data" + os.sep + "training_data"
-path_to_train_datasets = directory_for_training_data + os.sep + name_dataset
 # path_to_train_datasets_no_pro = directory_for_training_data_no_preprocessed + os.sep + name_dataset
 
 # directory_for_synthetic_data = working_directory + "\\data\\synthetic_data\\dirichlet"
 # path_to_synthetic_datasets = directory_for_synthetic_data + dataset_name + alpha_directory
 # os.makedirs(path_to_synthetic_datasets, exist_ok=True)
 
-X_train = pd.read_csv(path_to_train_datasets + os.sep + "X_train.csv", index_col=0)
-y_train = pd.read_csv(path_to_train_datasets + os.sep + "y_train.csv", index_col=0)
-X_test = pd.read_csv(path_to_train_datasets + os.sep + "X_test.csv", index_col=0)
-y_test = pd.read_csv(path_to_train_datasets + os.sep + "y_test.csv", index_col=0)
-# full_dataframe = X.join(y)
-
-
-# if "CrossEntropyLoss" not in metric_list:
-#     metric_list.append("CrossEntropyLoss")
-# if "Accuracy" not in metric_list:
-#     metric_list.append("Accuracy")
-
-client_strategy_type = strategies_dictionary[strategy_selected].create_client()
-client_strategy = client_strategy_type(model_selected,
-                                       X_train,
-                                       X_test,
-                                       y_train,
-                                       y_test,
-                                       client_id,
-                                       metric_list)
-
-if model_selected == "mlp":
-    client_strategy = client_strategy.to_client()
-
-# Start Flower client
-flwr.client.start_client(server_address=connection_ip, client=client_strategy)
+# Training data read by this process. Key: name of the dataset, Value: modification times of its files and the
+# dataframes. The data is read again when the preprocessing rewrites the files.
+_training_data: Dict[str, Tuple[tuple, Tuple[pd.DataFrame, ...]]] = {}
+
+
+def load_training_data(name_dataset: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Returns X_train, X_test, y_train and y_test of the preprocessed dataset, memory-mapped from their binary
+    splits. Datasets preprocessed before the splits were binary are read from their CSVs.
+    """
+    path_to_train_datasets = directory_for_training_data + os.sep + name_dataset
+    binary = has_splits(path_to_train_datasets)
+    if binary:
+        files = [path for split_name in SPLIT_NAMES for path in split_files(path_to_train_datasets, split_name)]
+    else:
+        files = [path_to_train_datasets + os.sep + split_name + ".csv" for split_name in SPLIT_NAMES]
+    modification_times = tuple(os.path.getmtime(path) for path in files)
+    cached = _training_data.get(name_dataset)
+    if cached is None or cached[0] != modification_times:
+        if binary:
+            splits = tuple(load_split(path_to_train_datasets, split_name) for split_name in SPLIT_NAMES)
+        else:
+            splits = tuple(pd.read_csv(path_to_train_datasets + os.sep + split_name + ".csv", index_col=0)
+                           for split_name in SPLIT_NAMES)
+        cached = (modification_times, splits)
+        _training_data[name_dataset] = cached
+    return cached[1]
+
+
+def run_client(strategy_selected: str,
+               name_dataset: str,
+               model_selected: str,
+               client_id: str,
+               connection_ip: str,
+               metric_list: list):
+    """
+    Trains with the Flower server at connection_ip and blocks until the server ends the run.
+
+    It is called once per process when Client.py is started as a script, and once per run by the
+    FlowerClientWorker, which keeps the imports and the training data of this module loaded between runs.
+    """
+    logits = False
+    if strategy_selected in ["FedKD", "FedDKD"]:
+        logits = True
+
+    # model = factory_return_model(dataset_factory, model_selected, logits)
+
+    # dataset_name = "\\dataset_" + dataset_selected
+    # alpha_directory = "\\alpha_" + route_to_dataset
+
+    X_train, X_test, y_train, y_test = load_training_data(name_dataset)
+    # full_dataframe = X.join(y)
+
+    # if "CrossEntropyLoss" not in metric_list:
+    #     metric_list.append("CrossEntropyLoss")
+    # if "Accuracy" not in metric_list:
+    #     metric_list.append("Accuracy")
+
+    client_strategy_type = strategies_dictionary[strategy_selected].create_client()
+    client_strategy = client_strategy_type(model_selected,
+                                           X_train,
+                                           X_test,
+                                           y_train,
+                                           y_test,
+                                           client_id,
+                                           metric_list)
+
+    if model_selected == "mlp":
+        client_strategy = client_strategy.to_client()
+
+    # Start Flower client
+    log(INFO, f"Client {client_id} connecting to {connection_ip}")
+    flwr.client.start_client(server_address=connection_ip, client=client_strategy)
+
+
+if __name__ == "__main__":
+    run_client(strategy_selected=argv[1],
+               name_dataset=argv[2],
+               model_selected=argv[3],
+               client_id=argv[4],
+               connection_ip=argv[5],
+               metric_list=argv[6].split("-"))
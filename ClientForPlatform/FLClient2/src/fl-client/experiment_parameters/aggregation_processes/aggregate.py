@@ -1,8 +1,8 @@
 import json
 from typing import Optional, Tuple, List, Union, Dict
 
+import numpy as np
 from flwr.common import NDArrays
-from flwr.server.strategy.aggregate import aggregate as aggregate_nn_flwr
 
 
 def get_tree_nums(xgb_model_org: bytes) -> Tuple[int, int]:
@@ -22,48 +22,127 @@ def get_tree_nums(xgb_model_org: bytes) -> Tuple[int, int]:
     return tree_num, paral_tree_num
 
 
+class XGBoostBaggingAggregator:
+    """
+    Bagging aggregation of XGBoost models that keeps the global model parsed between rounds.
+
+    Every client model is parsed once and its trees are appended to the parsed global model. The JSON is only
+    serialized again when the bytes of the model are requested, so the cost of a round grows with the new trees
+    instead of the whole ensemble times the number of clients.
+    """
+    _model: Optional[dict]
+    _serialized_model: Optional[bytes]
+
+    def __init__(self, global_model: Optional[bytes] = None):
+        self._model = json.loads(bytearray(global_model)) if global_model else None
+        self._serialized_model = global_model if global_model else None
+
+    def add(self, bst_curr_org: bytes):
+        """Conduct bagging aggregation for the trees of the given client model."""
+        bst_curr = json.loads(bytearray(bst_curr_org))
+        if self._model is None:
+            self._model = bst_curr
+            self._serialized_model = bst_curr_org
+            return
+
+        model_prev = self._model["learner"]["gradient_booster"]["model"]
+        model_curr = bst_curr["learner"]["gradient_booster"]["model"]
+        tree_num_prev = int(model_prev["gbtree_model_param"]["num_trees"])
+        paral_tree_num_curr = int(model_curr["gbtree_model_param"]["num_parallel_tree"])
+
+        model_prev["gbtree_model_param"]["num_trees"] = str(tree_num_prev + paral_tree_num_curr)
+        model_prev["iteration_indptr"].append(model_prev["iteration_indptr"][-1] + paral_tree_num_curr)
+
+        # Aggregate new trees
+        trees_curr = model_curr["trees"]
+        for tree_count in range(paral_tree_num_curr):
+            trees_curr[tree_count]["id"] = tree_num_prev + tree_count
+            model_prev["trees"].append(trees_curr[tree_count])
+            model_prev["tree_info"].append(0)
+        self._serialized_model = None
+
+    def add_all(self, local_models: list[list[bytes]]):
+        for model in local_models:
+            for bst in model:
+                self.add(bst)
+
+    def to_bytes(self) -> Optional[bytes]:
+        if self._serialized_model is None and self._model is not None:
+            self._serialized_model = bytes(json.dumps(self._model), "utf-8")
+        return self._serialized_model
+
+
 def aggregate_trees(bst_prev_org: Optional[bytes], bst_curr_org: bytes) -> bytes:
     """Conduct bagging aggregation for given trees."""
-    if not bst_prev_org:
-        return bst_curr_org
-
-    # Get the tree numbers
-    tree_num_prev, _ = get_tree_nums(bst_prev_org)
-    _, paral_tree_num_curr = get_tree_nums(bst_curr_org)
-
-    bst_prev = json.loads(bytearray(bst_prev_org))
-    bst_curr = json.loads(bytearray(bst_curr_org))
-
-    bst_prev["learner"]["gradient_booster"]["model"]["gbtree_model_param"][
-        "num_trees"
-    ] = str(tree_num_prev + paral_tree_num_curr)
-    iteration_indptr = bst_prev["learner"]["gradient_booster"]["model"][
-        "iteration_indptr"
-    ]
-    bst_prev["learner"]["gradient_booster"]["model"]["iteration_indptr"].append(
-        iteration_indptr[-1] + paral_tree_num_curr
-    )
+    return aggregate_xgboost([[bst_curr_org]], bst_prev_org)
 
-    # Aggregate new trees
-    trees_curr = bst_curr["learner"]["gradient_booster"]["model"]["trees"]
-    for tree_count in range(paral_tree_num_curr):
-        trees_curr[tree_count]["id"] = tree_num_prev + tree_count
-        bst_prev["learner"]["gradient_booster"]["model"]["trees"].append(
-            trees_curr[tree_count]
-        )
-        bst_prev["learner"]["gradient_booster"]["model"]["tree_info"].append(0)
 
-    bst_prev_bytes = bytes(json.dumps(bst_prev), "utf-8")
+def aggregate_xgboost(local_models: list[list[bytes]], global_model: Optional[bytes]):
+    aggregator = XGBoostBaggingAggregator(global_model)
+    aggregator.add_all(local_models)
+    return aggregator.to_bytes()
 
-    return bst_prev_bytes
 
+class WeightedAverageAggregator:
+    """
+    Weighted average of model weights computed in place.
 
-def aggregate_xgboost(local_models: list[list[bytes]], global_model: Optional[bytes]):
-    for model in local_models:
-        for bst in model:
-            global_model = aggregate_trees(global_model, bst)
-    return global_model
+    One float64 accumulator is preallocated per layer and every client update is folded into it with
+    np.multiply(..., out=)/np.add(..., out=), so the memory used is O(model) whatever the number of clients.
+    """
+    accumulators: Optional[NDArrays]
+    total_examples: int
+
+    def __init__(self, dtype: Optional[np.dtype] = None):
+        """
+        :param dtype: Type of the aggregated layers. By default, the type of the layers of the first update.
+        """
+        self.dtype = dtype
+        self.accumulators = None
+        self.total_examples = 0
+        self._scratch: Optional[np.ndarray] = None
+        self._layer_dtypes: List[np.dtype] = []
+
+    def reset(self):
+        """Clears the running sum but keeps the buffers, so the next round does not allocate them again."""
+        if self.accumulators is not None:
+            for accumulator in self.accumulators:
+                accumulator.fill(0)
+        self.total_examples = 0
+
+    def add(self, weights: NDArrays, num_examples: int):
+        if self.accumulators is None or not self._fits(weights):
+            self._allocate(weights)
+        for layer, accumulator in zip(weights, self.accumulators):
+            scratch = self._scratch[:accumulator.size].reshape(accumulator.shape)
+            np.multiply(layer, num_examples, out=scratch)
+            np.add(accumulator, scratch, out=accumulator)
+        self.total_examples += num_examples
+
+    def result(self, dtype: Optional[np.dtype] = None) -> NDArrays:
+        if self.accumulators is None or self.total_examples == 0:
+            raise ValueError("No weights were added to the aggregator")
+        output_dtype = dtype if dtype is not None else self.dtype
+        return [np.divide(accumulator, self.total_examples,
+                          dtype=output_dtype if output_dtype is not None else layer_dtype)
+                for accumulator, layer_dtype in zip(self.accumulators, self._layer_dtypes)]
+
+    def _fits(self, weights: NDArrays) -> bool:
+        return len(weights) == len(self.accumulators) and \
+            all(layer.shape == accumulator.shape for layer, accumulator in zip(weights, self.accumulators))
+
+    def _allocate(self, weights: NDArrays):
+        if self.total_examples > 0:
+            raise ValueError("The shapes of the weights do not match the ones already aggregated")
+        self.accumulators = [np.zeros(np.shape(layer), dtype=np.float64) for layer in weights]
+        self._layer_dtypes = [np.asarray(layer).dtype for layer in weights]
+        # A single buffer, as big as the biggest layer, holds the product of the current layer and its weight.
+        self._scratch = np.empty(max((accumulator.size for accumulator in self.accumulators), default=0),
+                                 dtype=np.float64)
 
 
-def aggregate_nn(results: List[Tuple[NDArrays, int]]):
-    return aggregate_nn_flwr(results)
+def aggregate_nn(results: List[Tuple[NDArrays, int]], dtype: Optional[np.dtype] = None) -> NDArrays:
+    aggregator = WeightedAverageAggregator(dtype)
+    for weights, num_examples in results:
+        aggregator.add(weights, num_examples)
+    return aggregator.result()
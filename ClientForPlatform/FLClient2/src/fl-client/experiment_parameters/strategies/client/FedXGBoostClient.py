@@ -1,6 +1,5 @@
 import ast
 import os
-import pickle
 from logging import INFO
 from typing import Any, List
 
@@ -18,9 +17,12 @@ from Definitions import ROOT_DIR
 from experiment_parameters.model_builder.Model import XGBoostModel
 from experiment_parameters.model_builder.ModelBuilder import Director
 from metrics.Evaluator import evaluator
+from metrics.MetricCodec import encode_metric_vector
 from metrics.Metrics import DictOfMetrics, return_default_dict_of_metrics
-from metrics.Shapley_Values import ShapleyValuesDT
+from metrics.ShapleyGTG import create_shapley_values
+from metrics.Shapley_Values import ShapleyValues
 from util.Util import load_data_from_pickle_file
+from util.WeightStore import WeightCache, HELD_WEIGHTS_KEY
 
 
 # TODO:
@@ -34,7 +36,7 @@ class FedXGBoostClient(fl.client.Client):
     _y_train: DataFrame
     _y_test: DataFrame
     _batch_size: int
-    _shapley_values: ShapleyValuesDT
+    _shapley_values: ShapleyValues
     _client_number: int
     _metric_list: list
     _early_stopping_rounds: int
@@ -55,6 +57,8 @@ class FedXGBoostClient(fl.client.Client):
         self._y_train = y_train
         self._x_test = x_test
         self._y_test = y_test
+        # Trees of the clients received for the Shapley values, and the own trees of the last fit.
+        self._weight_cache = WeightCache()
         # self.train_dmatrix = xgb.DMatrix(x_train, label=np.argmax(y_train, axis=1))
         self.train_len = len(x_train)
         self.train_label_len = len(y_train)
@@ -143,6 +147,8 @@ class FedXGBoostClient(fl.client.Client):
         # Send the information in the dict for metrics
         # Should be changed in a newer version of flower
         log(INFO, "Send local model to server")
+        # The server does not send the own trees back for the Shapley values.
+        self._weight_cache.put_own([local_model_bytes])
         # return [], self.train_len, {"local_model": local_model_bytes}
         return FitRes(
             status=Status(
@@ -186,15 +192,16 @@ class FedXGBoostClient(fl.client.Client):
         metric_results = round_result.return_flower_dict_as_str()
 
         if ins.config["compute_shapley_values"] == 1:
-            client_weights = pickle.loads(ins.config["pickled_client_weights"])
+            client_weights = {cid: tensors for cid, (tensors, _) in self._weight_cache.resolve(ins.config).items()}
 
             if ins.config["server_round"] == 1:
                 number_of_clients = len(client_weights)
                 # self._shapley_values = ShapleyGTG(number_of_clients)
-                self._shapley_values = ShapleyValuesDT(self._x_test,
-                                                       self._y_test,
-                                                       ins.config["num_rounds"],
-                                                       self._metric_list)
+                self._shapley_values = create_shapley_values(ins.config,
+                                                             self._x_test,
+                                                             self._y_test,
+                                                             self._metric_list,
+                                                             decision_tree=True)
                 list_of_initial_metrics = self._last_round_result
                 self._shapley_values.set_last_round_results(list_of_initial_metrics)
                 # for client_name
@@ -209,9 +216,10 @@ class FedXGBoostClient(fl.client.Client):
                                                             bytes(self.bst.get_model().save_raw("json")))
             self._shapley_values.set_last_round_results(round_result)
             round_sv = self._shapley_values.get_round_shapley_values(ins.config["server_round"])
-            sv_round_result = {"SV_" + client_id: str(round_sv[client_id])
+            sv_round_result = {"SV_" + client_id: encode_metric_vector(round_sv[client_id])
                                for client_id, _ in self._shapley_values.get_client_index_dictionary().items()}
             metric_results = metric_results | sv_round_result
+            metric_results[HELD_WEIGHTS_KEY] = self._weight_cache.held_weights()
 
             if ins.config["last_round"] == 1:
                 log(INFO, "Columns sorted: {}".format(list(self._y_test.columns)))
@@ -1,11 +1,7 @@
 import asyncio
-import hashlib
 import json
 import os
-import subprocess
-import sys
 import datetime
-from functools import reduce
 
 import pandas as pd
 
@@ -13,10 +9,19 @@ import requests
 from requests import Response
 from sklearn.model_selection import train_test_split
 from websockets import connect
-from util.SimplePreprocessing import scale_column, one_hot_encode_column
+from client_worker import FlowerClientWorker
+from experiment_parameters.data_loader.TrainingSplits import save_split
+from util.DatasetRegistration import register_dataset_file
+from util.SimplePreprocessing import PreprocessingPlan
 from util.GreatExpectationService import GreatExpectationService
 from util.GEHtmlService import GEHtmlService
 
+# Seconds between the messages that tell the platform that the training is still running.
+HEARTBEAT_SECONDS = 10
+
+# Runs the Flower clients of every training. It is started with the first one and kept for the next ones.
+client_worker = FlowerClientWorker()
+
 
 async def register_dataset(access_token, session_to_participate, selected_dataset):
     async with connect(f"ws://localhost/api2/register_dataset/{session_to_participate}",
@@ -31,21 +36,20 @@ async def register_dataset(access_token, session_to_participate, selected_datase
         expectationService.add_expectations_from_configuration(expectations)
 
 
-        pandas_dataset = pd.read_csv("src/fl-client/data/datasets_to_register/" + selected_dataset, index_col=0)
-        groups_of_columns = list(pandas_dataset.select_dtypes(include=['str']).columns)
-        for column in groups_of_columns:
-            pandas_dataset[column] = pandas_dataset[column].astype("string")
-
-
-        # Run validation on specified dataset
-        validation_result = expectationService.run_validation_on_pandas(pandas_dataset)
+        # The dataset is validated, hashed and copied in one pass over its chunks.
+        try:
+            validation_result, dataset_hash = register_dataset_file(
+                "src/fl-client/data/datasets_to_register/" + selected_dataset,
+                "src/fl-client/data/registered_datasets",
+                expectationService)
+        except ValueError as error:
+            # Empty or unreadable datasets are not valid.
+            print(f"The dataset {selected_dataset} could not be registered: {error}")
+            await websocket.send(str(False))
+            return
         await websocket.send(str(validation_result.success))
         if validation_result.success:
-            os.makedirs("src/fl-client/data/registered_datasets", exist_ok=True)
-            df = pd.read_csv("src/fl-client/data/datasets_to_register/" + selected_dataset, index_col=0)
-            dataset_hash = str(int(hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values).hexdigest(), 16))
             await websocket.send(dataset_hash)
-            df.to_csv("src/fl-client/data/registered_datasets/" + dataset_hash + ".csv")
         else:
             # Create HTML and JSON results
             filename = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_validation_results.json"
@@ -60,54 +64,19 @@ async def register_dataset(access_token, session_to_participate, selected_datase
 
 async def preprocessing(hash_dataset, features_information):
     valid_dataset = pd.read_csv("src/fl-client/data/registered_datasets/" + hash_dataset + ".csv", index_col=0)
-    y = valid_dataset.iloc[:,-1:]
-    X = valid_dataset
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, random_state=1, test_size=0.3)
-
-    preprocessed_X_train = pd.DataFrame()
-    preprocessed_X_test = pd.DataFrame()
-    preprocessed_y_train = pd.DataFrame()
-    preprocessed_y_test = pd.DataFrame()
-
-    label_column_name = features_information[-1]["name"]
-
-    for feature in features_information:
-        # if feature["type"] == "integer" or feature["type"] == "float":
-        if feature["preprocessing"]["type_of_Preprocessing"] == "min_max_encoder":
-            if feature["name"] == label_column_name:
-                scaled_column_train = scale_column(y_train, feature["range"][0],
-                                                   feature["range"][1])
-                scaled_column_test = scale_column(y_test, feature["range"][0], feature["range"][1])
-                preprocessed_y_train = scaled_column_train
-                preprocessed_y_test = scaled_column_test
-            else:
-                scaled_column_train = scale_column(X_train[feature["name"]], feature["range"][0], feature["range"][1])
-                scaled_column_test = scale_column(X_test[feature["name"]], feature["range"][0], feature["range"][1])
-                preprocessed_X_train[feature["name"]] = scaled_column_train
-                preprocessed_X_test[feature["name"]] = scaled_column_test
-
-        # if feature["type"] == "string":
-        if feature["preprocessing"]["type_of_Preprocessing"] == "one_hot_encoder":
-            # transformed_columns = one_hot_encode_column(feature["name"], feature["valid_values"])
-            if feature["name"] == label_column_name:
-                transformed_columns_train = one_hot_encode_column(y_train[feature["name"]], feature["valid_values"])
-                transformed_columns_test = one_hot_encode_column(y_test[feature["name"]], feature["valid_values"])
-                preprocessed_y_train = transformed_columns_train
-                preprocessed_y_test = transformed_columns_test
-            else:
-                transformed_columns_train = one_hot_encode_column(X_train[feature["name"]], feature["valid_values"])
-                transformed_columns_test = one_hot_encode_column(X_test[feature["name"]], feature["valid_values"])
-                preprocessed_X_train = pd.merge(left=preprocessed_X_train, right=transformed_columns_train,
-                                                 left_index=True, right_index=True)
-                preprocessed_X_test = pd.merge(left=preprocessed_X_test, right=transformed_columns_test,
-                                                left_index=True, right_index=True)
 
-    os.makedirs("src/fl-client/data/training_data_preprocessed/" + hash_dataset, exist_ok=True)
-    preprocessed_X_train.to_csv("src/fl-client/data/training_data_preprocessed/" + hash_dataset + os.sep + "X_train.csv")
-    preprocessed_X_test.to_csv("src/fl-client/data/training_data_preprocessed/" + hash_dataset + os.sep + "X_test.csv")
-    preprocessed_y_train.to_csv("src/fl-client/data/training_data_preprocessed/" + hash_dataset + os.sep + "y_train.csv")
-    preprocessed_y_test.to_csv("src/fl-client/data/training_data_preprocessed/" + hash_dataset + os.sep + "y_test.csv")
+    train, test = train_test_split(valid_dataset, random_state=1, test_size=0.3)
+
+    preprocessing_plan = PreprocessingPlan(features_information)
+    preprocessed_X_train, preprocessed_y_train = preprocessing_plan.transform(train)
+    preprocessed_X_test, preprocessed_y_test = preprocessing_plan.transform(test)
+
+    preprocessed_directory = "src/fl-client/data/training_data_preprocessed/" + hash_dataset
+    os.makedirs(preprocessed_directory, exist_ok=True)
+    save_split(preprocessed_directory, "X_train", preprocessed_X_train)
+    save_split(preprocessed_directory, "X_test", preprocessed_X_test)
+    save_split(preprocessed_directory, "y_train", preprocessed_y_train)
+    save_split(preprocessed_directory, "y_test", preprocessed_y_test)
 
 
 async def join_training(access_token, session_to_participate):
@@ -138,29 +107,26 @@ async def join_training(access_token, session_to_participate):
                 client_number = username
                 connection_ip = training_parameters["connection_ip"]
                 metric_list = training_parameters["metric_name"]
-                metrics_string = reduce(lambda metric1, metric2: metric1 + "-" + metric2, metric_list)
 
                 print("ParametersReceived")
                 await websocket.send("ParametersReceived")
 
             elif message == "StartClient":
                 print("Starting Training")
-                training_process = subprocess.Popen(['python',
-                                                     'src/fl-client/Client.py',
-                                                     strategy,
-                                                     name_dataset,
-                                                     model_selected,
-                                                     str(client_number),
-                                                     connection_ip,
-                                                     metrics_string],
-                                                    stdout=sys.stdout)  # If linux, remove creationflags
-                await asyncio.sleep(3)
-                while training_process.poll() is None:
-                    await websocket.send("Unfinished")
-                    await asyncio.sleep(10)
-                # training_process.wait()
-                print("Waiting for training")
-                await asyncio.sleep(3)
+                training = asyncio.ensure_future(client_worker.run_client({
+                    "strategy_selected": strategy,
+                    "name_dataset": name_dataset,
+                    "model_selected": model_selected,
+                    "client_id": str(client_number),
+                    "connection_ip": connection_ip,
+                    "metric_list": metric_list
+                }))
+                while not training.done():
+                    done, _ = await asyncio.wait({training}, timeout=HEARTBEAT_SECONDS)
+                    if not done:
+                        await websocket.send("Unfinished")
+                if training.exception() is not None:
+                    print(f"Training failed: {training.exception()}")
                 await websocket.send("TrainingFinished")
                 print("TrainingFinished")
                 await websocket.send("NextRound?")
@@ -213,6 +179,7 @@ if __name__ == "__main__":
             asyncio.run(join_training(token, session_selected))
         elif option_selected == "4":
             print("Exiting")
+            client_worker.shutdown()
             exit(0)
         else:
             print("Invalid option")
@@ -0,0 +1,64 @@
+"""
+Binary encoding of the MetricVectors that the clients send to the server, e.g. their Shapley values, as Flower
+bytes metrics.
+
+Layout (little endian):
+    - Header: magic b"MV", version (uint8), number of metrics (uint8), number of classes (uint16).
+    - Schema: for every metric, the length of its name (uint8) and its name in ASCII.
+    - Values: the float64 array of the MetricVector.
+"""
+import ast
+import struct
+from typing import Dict, Union, List
+
+import numpy as np
+
+from metrics.Metrics import MetricVector, metric_schema
+from util.Util import from_string_to_dict
+
+MAGIC = b"MV"
+VERSION = 1
+_HEADER = struct.Struct("<2sBBH")
+
+
+def encode_metric_vector(metric_vector: MetricVector) -> bytes:
+    schema = metric_vector.schema
+    encoded = [_HEADER.pack(MAGIC, VERSION, len(schema.metric_names), schema.num_classes)]
+    for metric in schema.metric_names:
+        name = metric.encode("ascii")
+        encoded.append(struct.pack("<B", len(name)) + name)
+    encoded.append(np.ascontiguousarray(metric_vector.values, dtype="<f8").tobytes())
+    return b"".join(encoded)
+
+
+def decode_metric_vector(data: bytes) -> MetricVector:
+    magic, version, number_of_metrics, num_classes = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unknown metric encoding {magic!r} version {version}")
+    offset = _HEADER.size
+    metric_names = []
+    for _ in range(number_of_metrics):
+        length = data[offset]
+        metric_names.append(data[offset + 1:offset + 1 + length].decode("ascii"))
+        offset += 1 + length
+    schema = metric_schema(metric_names, num_classes)
+    if schema.metric_names != tuple(metric_names):
+        raise ValueError(f"Metrics {metric_names} are not in the order of their schema")
+    values = np.frombuffer(data, dtype="<f8", count=schema.size, offset=offset).astype(np.float64)
+    return MetricVector(schema, values)
+
+
+def decode_metric_values(value: Union[bytes, str]) -> Dict[str, Union[float, List[float]]]:
+    """
+    Metric values sent by a client, per-class metrics as lists. Strings are parsed as str(DictOfMetrics), the
+    format sent by the clients before the binary encoding.
+    """
+    if isinstance(value, bytes):
+        return decode_metric_vector(value).return_flower_dict()
+    metric_values = {}
+    for metric, metric_value in from_string_to_dict(value).items():
+        if '[' in metric_value:
+            metric_values[metric] = [float(evaluated_value) for evaluated_value in ast.literal_eval(metric_value)]
+        else:
+            metric_values[metric] = float(metric_value)
+    return metric_values
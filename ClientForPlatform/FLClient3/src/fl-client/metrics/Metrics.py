@@ -578,6 +578,171 @@ class DictOfMetrics:
 #     return DictOfMetrics(aux_dict)
 
 
+# Canonical order of the metrics in a MetricVector, the same as in return_default_dict_of_metrics.
+METRIC_ORDER = ["CrossEntropyLoss", "Accuracy", "F1Score", "WeightedF1Score", "MCC", "F1ScoreMacro", "F1ScoreMicro",
+                "AggregatedF1Score"]
+# Metrics with one value per class.
+PER_CLASS_METRICS = {"F1Score", "WeightedF1Score"}
+# Metrics whose difference is computed the other way around, see CrossEntropyLoss.__sub__.
+REVERSED_SUBTRACTION_METRICS = {"CrossEntropyLoss"}
+
+metric_class_dict = {
+    "CrossEntropyLoss": CrossEntropyLoss,
+    "Accuracy": Accuracy,
+    "F1Score": SVCompatibleF1Score,
+    "WeightedF1Score": SVCompatibleWeightedF1Score,
+    "MCC": SVCompatibleMatthewsCorrelationCoefficient,
+    "F1ScoreMacro": F1ScoreMacro,
+    "F1ScoreMicro": F1ScoreMicro,
+    "AggregatedF1Score": AggregatedF1Score
+}
+
+
+class MetricSchema:
+    """
+    Layout of the metrics of a MetricVector: the position of every metric in the array of values. Per-class metrics
+    take num_classes positions, the rest one.
+    """
+    __slots__ = ("metric_names", "num_classes", "slices", "size", "subtraction_signs")
+
+    def __init__(self, metric_names, num_classes: int):
+        self.metric_names = tuple(metric_names)
+        self.num_classes = num_classes
+        self.slices = {}
+        position = 0
+        for metric in self.metric_names:
+            length = num_classes if metric in PER_CLASS_METRICS else 1
+            self.slices[metric] = slice(position, position + length)
+            position += length
+        self.size = position
+        self.subtraction_signs = np.ones(self.size)
+        for metric in REVERSED_SUBTRACTION_METRICS.intersection(self.metric_names):
+            self.subtraction_signs[self.slices[metric]] = -1
+
+    def __eq__(self, other):
+        return isinstance(other, MetricSchema) and \
+            self.metric_names == other.metric_names and self.num_classes == other.num_classes
+
+    def __hash__(self):
+        return hash((self.metric_names, self.num_classes))
+
+    def __reduce__(self):
+        return MetricSchema, (self.metric_names, self.num_classes)
+
+
+_metric_schemas: Dict = {}
+
+
+def metric_schema(metrics, num_classes: int) -> MetricSchema:
+    """Returns the shared schema of the given metrics, sorted in METRIC_ORDER."""
+    metric_names = tuple(sorted(set(metrics),
+                                key=lambda metric: METRIC_ORDER.index(metric) if metric in METRIC_ORDER
+                                else len(METRIC_ORDER)))
+    key = (metric_names, num_classes)
+    if key not in _metric_schemas:
+        _metric_schemas[key] = MetricSchema(metric_names, num_classes)
+    return _metric_schemas[key]
+
+
+class MetricVector:
+    """
+    All the metrics of an evaluation stored in a single float64 array with a fixed schema.
+
+    Same interface as DictOfMetrics, but the arithmetic works on the whole array at once instead of building a
+    new dictionary and a new Metric per metric, which matters in the accumulation of the Shapley values.
+    get_value and the return_flower_dict methods keep the format of DictOfMetrics for the existing call sites.
+    """
+    __slots__ = ("schema", "values")
+
+    def __init__(self, schema: MetricSchema, values: np.ndarray = None):
+        self.schema = schema
+        self.values = np.zeros(schema.size) if values is None else values
+
+    @staticmethod
+    def from_dict_of_metrics(dict_of_metrics: DictOfMetrics, schema: MetricSchema = None) -> "MetricVector":
+        metrics = dict_of_metrics.get_value()
+        if schema is None:
+            num_classes = max((len(metric.get_value()) for name, metric in metrics.items()
+                               if name in PER_CLASS_METRICS), default=0)
+            schema = metric_schema(metrics.keys(), num_classes)
+        vector = MetricVector(schema)
+        for metric in schema.metric_names:
+            vector.set_value_of_metric(metric, metrics[metric].get_value())
+        return vector
+
+    def to_dict_of_metrics(self) -> DictOfMetrics:
+        dict_of_metrics = DictOfMetrics()
+        for metric in self.schema.metric_names:
+            dict_of_metrics.get_value()[metric] = metric_class_dict[metric](self.get_value_of_metric(metric))
+        return dict_of_metrics
+
+    def get_value(self):
+        return self.to_dict_of_metrics().get_value()
+
+    def get_value_of_metric(self, metric_name):
+        if metric_name in PER_CLASS_METRICS:
+            return self.values[self.schema.slices[metric_name]].copy()
+        return float(self.values[self.schema.slices[metric_name].start])
+
+    def set_value_of_metric(self, metric_name, value):
+        self.values[self.schema.slices[metric_name]] = value
+
+    def _values_of(self, other) -> np.ndarray:
+        """Values of other in the schema of this vector, as DictOfMetrics only looks at the keys of self."""
+        if isinstance(other, MetricVector):
+            if other.schema is self.schema or other.schema == self.schema:
+                return other.values
+            return np.concatenate([np.atleast_1d(other.values[other.schema.slices[metric]])
+                                   for metric in self.schema.metric_names])
+        return MetricVector.from_dict_of_metrics(other, self.schema).values
+
+    def _operand(self, other):
+        if isinstance(other, (int, float, np.number)):
+            return other
+        return self._values_of(other)
+
+    def __add__(self, other):
+        return MetricVector(self.schema, self.values + self._values_of(other))
+
+    def __iadd__(self, other):
+        np.add(self.values, self._values_of(other), out=self.values)
+        return self
+
+    def __sub__(self, other):
+        return MetricVector(self.schema, (self.values - self._values_of(other)) * self.schema.subtraction_signs)
+
+    def __mul__(self, other):
+        return MetricVector(self.schema, self.values * self._operand(other))
+
+    def __truediv__(self, other):
+        return MetricVector(self.schema, self.values / self._operand(other))
+
+    def __itruediv__(self, other):
+        np.divide(self.values, self._operand(other), out=self.values)
+        return self
+
+    def __abs__(self):
+        return MetricVector(self.schema, np.abs(self.values))
+
+    def __lt__(self, other):
+        return self.get_value_of_metric("Accuracy") < other.get_value_of_metric("Accuracy")
+
+    def __str__(self):
+        return ",".join(f"{metric}:{string_cast(self.get_value_of_metric(metric))}"
+                        for metric in self.schema.metric_names)
+
+    def __repr__(self):
+        return str(self)
+
+    def return_flower_dict(self):
+        return {metric: value.tolist() if type(value) is np.ndarray else value
+                for metric, value in ((metric, self.get_value_of_metric(metric))
+                                      for metric in self.schema.metric_names)}
+
+    def return_flower_dict_as_str(self):
+        return {metric: string_cast(self.get_value_of_metric(metric)) for metric in self.schema.metric_names}
+
+
 def return_default_dict_of_metrics(metrics, num_classes):
     metric_dict = DictOfMetrics()
     metric_dict.add_metric(CrossEntropyLoss())
@@ -595,3 +760,8 @@ def return_default_dict_of_metrics(metrics, num_classes):
     return metric_dict
 
 
+def return_default_metric_vector(metrics, num_classes) -> MetricVector:
+    """MetricVector with the metrics of return_default_dict_of_metrics set to zero."""
+    return MetricVector(metric_schema(["CrossEntropyLoss", "Accuracy"] + list(metrics), num_classes))
+
+
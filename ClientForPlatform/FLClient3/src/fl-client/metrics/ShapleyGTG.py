@@ -1,412 +1,211 @@
-# import copy
-# import math
-# import random
-# from logging import INFO
-#
-# import numpy as np
-# from flwr.common.logger import log
-# from flwr.server.strategy.aggregate import aggregate
-#
-# from metrics.Metrics import DictOfMetrics, CrossEntropyLoss, Accuracy, SVCompatibleF1Score, \
-#     return_default_dict_of_metrics  # , min_out_two_metrics, max_out_two_metrics
-# from util.Util import evaluate_nn_model
-#
-#
-# # def get_min_value_metric(shapley_values, default_value, metric):
-# #     min_value_metric = None
-# #     for shapley_value_list_of_metrics in shapley_values.values():
-# #         if min_value_metric is None:
-# #             dict_of_min_values = shapley_value_list_of_metrics.get_value()[metric]
-# #         dict_of_min_values = min_out_two_metrics(dict_of_min_values, shapley_value_list_of_metrics)
-# #
-# #     return dict_of_min_values
-# #
-# #
-# # def get_all_max_values(shapley_values, default_value, metric):
-# #     dict_of_max_values = None
-# #     for shapley_value_list_of_metrics in shapley_values.values():
-# #         if dict_of_max_values is None:
-# #             dict_of_max_values = DictOfMetrics(shapley_value_list_of_metrics.get_value())
-# #         dict_of_max_values = max_out_two_metrics(dict_of_max_values, shapley_value_list_of_metrics)
-# #
-# #     return dict_of_max_values
-#
-#
-# def return_min_for_positive_max_for_negative(value):
-#     return min if value > 0 else max
-#
-#
-# def return_sub_for_positive_add_for_negative(value):
-#     return "sub" if value > 0 else "add"
-#
-#
-# def normalize_shapley_values(shapley_values: dict, marginal_gain: DictOfMetrics, default_dict):
-#     dict_of_scaling_values = default_dict
-#     dict_of_min_max_functions = {}
-#     dict_of_add_sub_functions = {}
-#
-#     for metric in marginal_gain.get_value().keys():
-#         if metric == "F1Score":
-#             dict_of_min_max_functions[metric] = [return_min_for_positive_max_for_negative(value)
-#                                                  for value in marginal_gain.get_value_of_metric(metric)]
-#             dict_of_add_sub_functions[metric] = [return_sub_for_positive_add_for_negative(value)
-#                                                  for value in marginal_gain.get_value_of_metric(metric)]
-#         else:
-#             dict_of_min_max_functions[metric] = return_min_for_positive_max_for_negative(marginal_gain.get_value_of_metric(metric))
-#             dict_of_add_sub_functions[metric] = return_sub_for_positive_add_for_negative(marginal_gain.get_value_of_metric(metric))
-#
-#     for shapley_value_list_of_metrics in shapley_values.values():
-#         dict_of_scaling_values = dict_of_scaling_values.obtain_min_or_max(shapley_value_list_of_metrics,
-#                                                                           dict_of_min_max_functions)
-#
-#     for client in shapley_values.keys():
-#         shapley_values[client] = \
-#             shapley_values[client].addition_or_substraction(dict_of_scaling_values,
-#                                                             dict_of_add_sub_functions)
-#
-#     sum_value = None
-#     for client, shapley_value_list_of_metrics in shapley_values.items():
-#         if sum_value is None:
-#             log(INFO, "Shapley Value metrics for client {}: {}".format(str(client), str(shapley_value_list_of_metrics)))
-#             sum_value = shapley_value_list_of_metrics
-#         else:
-#             log(INFO, "Shapley Value metrics for client {}: {}".format(str(client), str(shapley_value_list_of_metrics)))
-#             sum_value = sum_value + shapley_value_list_of_metrics
-#
-#     # for shapley_value_list_of_metrics in shapley_values.values():
-#     #     # print("Shapley Values: {}".format(shapley_value_list_of_metrics.get_value()[1].get_value()))
-#     #     if sum_value is None:
-#     #         sum_value = shapley_value_list_of_metrics
-#     #     else:
-#     #         sum_value = sum_value + shapley_value_list_of_metrics
-#     #         # print(sum_value.get_value()[1].get_value())
-#     #
-#     #     # log(INFO, "Sum_value: {}".format(str(sum_value)))
-#
-#     for metric in sum_value.get_value().values():
-#         if isinstance(metric.get_value(), list):
-#             list_of_f1_scores = metric.get_value()
-#             # metric.set_value(
-#             #     list(map(lambda x: 1 if math.isclose(x, 0, rel_tol=1e-03, abs_tol=0.0) else x,
-#             #              list_of_f1_scores)))
-#             for iterator in range(len(list_of_f1_scores)):
-#                 if math.isclose(list_of_f1_scores[iterator], 0, rel_tol=1e-9, abs_tol=1e-3):
-#                     log(INFO, "Null value on {}".format(iterator))
-#                     log(INFO, "Division by zero")
-#                     list_of_f1_scores[iterator] = 1e9
-#         else:
-#             if math.isclose(metric.get_value(), 0, rel_tol=1e-9, abs_tol=1e-3):
-#                 log(INFO, "Division by zero")
-#                 metric.set_value(1e9)
-#
-#     log(INFO, "Sum_value: {}".format(str(sum_value)))
-#
-#     return {k: (marginal_gain * v / sum_value) for k, v in shapley_values.items()}
-#
-#
-# """Old function for Normalize Shapley Values
-#
-# def normalize_shapley_values(shapley_values: dict, marginal_gain: float):
-#     sum_value: float = 0
-#     if marginal_gain >= 0:
-#         # log(INFO, "Marginal gain: {}".format(marginal_gain))
-#         # log(INFO, "Shapley_Values Values marginal gain > 0: {}".format(shapley_values.values()))
-#         sum_value = sum([v for v in shapley_values.values() if v) >= 0])
-#         # log(INFO, "Sum_value higher than 0: {}".format(sum_value))
-#         if math.isclose(sum_value, 0):
-#             sum_value = 1e-9
-#     else:
-#         # log(INFO, "Marginal gain: {}".format(marginal_gain))
-#         # log(INFO, "Shapley_Values Values marginal gain < 0: {}".format(shapley_values.values()))
-#         sum_value = sum([v for v in shapley_values.values() if v < 0])
-#         if math.isclose(sum_value, 0):
-#             sum_value = -1e-9
-#
-#     return {k: float(marginal_gain * v / sum_value) for k, v in shapley_values.items()}
-#
-# """
-#
-#
-# class ShapleyGTG:
-#     _worker_number: int
-#     _shapley_values: dict
-#     _shapley_values_S: dict
-#     _converge_min: float
-#     _eps: float
-#     _round_trunc_threshold: float
-#
-#     _last_k: int
-#     _converge_criteria: float
-#     _last_round_result: DictOfMetrics
-#
-#     _client_index_dictionary: dict
-#     _client_index_dictionary_set: bool
-#
-#     def __init__(self, worker_number):
-#         self._worker_number = worker_number
-#         self._shapley_values = dict()
-#         self._shapley_values_S = dict()
-#         self._eps = 0.001
-#         self._round_trunc_threshold = 0.001
-#         self._converge_min = max(30, self._worker_number)
-#         self._last_k = 10
-#
-#         self._converge_criteria = 0.05
-#
-#         self._max_percentage = 0.8
-#         self._max_number = min(
-#             2 ** self._worker_number,
-#             max(
-#                 self._converge_min,
-#                 self._max_percentage * (2 ** self._worker_number)
-#                 + np.random.randint(-5, +5),
-#             ),
-#         )
-#         # self._last_round_result
-#         self._client_index_dictionary = dict()
-#         self._client_index_dictionary_set = False
-#
-#     def set_initial_metrics(self, metrics):
-#         self._last_round_result = metrics
-#
-#     def set_client_index_dictionary(self, client_number_dictionary):
-#         if not self._client_index_dictionary_set:
-#             # for client_id, iterator in zip(clients_ids, range(len(clients_ids))):
-#             #     self._client_index_dictionary[client_id] = iterator
-#             for client_cid, client_id in client_number_dictionary.items():
-#                 self._client_index_dictionary[client_cid] = client_id
-#             log(INFO, "Setting client-ip dictionary")
-#             log(INFO, f"{self._client_index_dictionary}")
-#             self._client_index_dictionary_set = True
-#
-#     def get_shapley_values(self):
-#         return self._shapley_values
-#
-#     def shapley_values_calculation(self,
-#                                    x_test,
-#                                    y_test,
-#                                    model,
-#                                    clients_list,
-#                                    client_weights,
-#                                    this_round_result,
-#                                    local_round,
-#                                    metric_list):
-#         # log(INFO, "Last Round Result: {}".format(self._last_round_result))
-#         # log(INFO, "This Round Result: {}".format(this_round_result))
-#         # Truncation based local_round. It exits early the computation if the difference between rounds is not high.
-#         # Kind of complicated way to get metrics, but it is to allow for operations over multiple types.
-#         accuracy_difference = (this_round_result - self._last_round_result).get_value()["Accuracy"].get_value()
-#         if abs(accuracy_difference) < self._round_trunc_threshold:
-#             self._shapley_values[local_round] = {
-#                 client_id: return_default_dict_of_metrics(metric_list, y_test.shape[1]) for client_id in clients_list
-#             }
-#             for client in self._shapley_values[local_round].keys():
-#                 self._shapley_values[local_round][client].get_value()["CrossEntropyLoss"].set_value(0)
-#                 log(INFO, self._shapley_values[local_round][client])
-#             self._shapley_values_S[local_round] = {
-#                 client_id: return_default_dict_of_metrics(metric_list, y_test.shape[1]) for client_id in clients_list
-#             }
-#             for client in self._shapley_values_S[local_round].keys():
-#                 self._shapley_values_S[local_round][client].get_value()["CrossEntropyLoss"].set_value(0)
-#             log(INFO, "Shapley_value Truncation {}".format(self._shapley_values[local_round]))
-#             log(INFO, "Shapley_value_S Truncation {}".format(self._shapley_values_S[local_round]))
-#             self._last_round_result = this_round_result
-#             return
-#
-#         metrics = dict()
-#         perm_records = dict()
-#         index = 0
-#         contribution_records: list = []
-#         while self.not_convergent(index, contribution_records):
-#             for client_id in clients_list:
-#                 index += 1
-#                 # Be careful, you are modifying here because of the cross entropy loss.
-#                 v: list = [0 for _ in range(self._worker_number + 1)]
-#                 v[0] = self._last_round_result
-#                 marginal_contribution = [return_default_dict_of_metrics(metric_list, num_classes=y_test.shape[1])
-#                                          for _ in range(self._worker_number)]
-#
-#                 # Changing the original code to work with labels, instead of indexes.
-#                 remaining_clients_list = [remaining_client_id for remaining_client_id
-#                                           in clients_list if remaining_client_id != client_id]
-#                 random.shuffle(remaining_clients_list)
-#                 perturbed_client_ids = [client_id] + remaining_clients_list
-#
-#                 # Iteration by every client after the first client selected. This list is generated by a random
-#                 # permutation.
-#                 for j in range(1, len(perturbed_client_ids) + 1):
-#                     subset = tuple(sorted(perturbed_client_ids[:j]))
-#                     # truncation
-#                     if abs((this_round_result - v[j - 1]).get_value()["Accuracy"].get_value()) >= self._eps:
-#                         if subset not in metrics:
-#                             # I guess that an empty tuple is null, therefore false. Only valid for first.
-#                             if not subset:
-#                                 metric = self._last_round_result
-#                             else:
-#                                 dict_of_metrics = evaluate_nn_model(x_test,
-#                                                                     y_test,
-#                                                                     model,
-#                                                                     aggregate(
-#                                                                      [client_weights[client_cid]
-#                                                                       for client_cid
-#                                                                       in subset]),
-#                                                                     metric_list)
-#                                 # log(INFO, "List of metrics: {}".format(dict_of_metrics))
-#                                 metric = dict_of_metrics
-#
-#                             # log(INFO, "Round {} Subset {} Metric {}".format(local_round, subset, metric))
-#                             metrics[subset] = metric
-#                         # log(INFO, "Subset {} in metrics. Value: {}".format(subset, metrics[subset]))
-#                         v[j] = metrics[subset]
-#                     else:
-#                         v[j] = v[j - 1]
-#
-#                     # update SV
-#                     # log(INFO, "With: {} \tWithout {} \tDifference {}".format(v[j], v[j - 1], v[j] - v[j - 1]))
-#                     marginal_contribution[self._client_index_dictionary[perturbed_client_ids[j - 1]]] = v[j] - v[j - 1]
-#
-#                 # This two store an array equivalent to all the marginal contributions of the participants in
-#                 # the permutation.
-#                 contribution_records.append(marginal_contribution)
-#                 perm_records[tuple(perturbed_client_ids)] = marginal_contribution
-#
-#         # For best_S (subset of participants)
-#         # It sorts the subsets of participants. First, it sorts by result with the first element.
-#         # Second, it sorts by lower number of participants. The length is negative, as it is sorted by greater first.
-#         # The lower the absolute value of the number, the bigger it is.
-#         subset_rank = sorted(
-#             metrics.items(), key=lambda x: (x[1], -len(x[0])), reverse=True
-#         )
-#
-#         # I assume that the empty tuple means all the clients, which is not a subset.
-#         # Therefore, if it is empty, it is null, and the second is selected.
-#         best_S: tuple
-#         if subset_rank[0][0]:
-#             best_S = subset_rank[0][0]
-#         else:
-#             best_S = subset_rank[1][0]
-#
-#         # Because the clients are stored as lists, but here the code wants subsets, the function needs to
-#         # transform the code into sets. That is what is done here. K represents the permutation of participants.
-#         # This returns a matrix, for what it seems.
-#         contrib_S = [
-#             v for k, v in perm_records.items() if set(k[: len(best_S)]) == set(best_S)
-#         ]
-#         # SV_calc_temp = np.sum(contrib_S, axis=0) / len(contrib_S)
-#         SV_calc_temp: list = contrib_S[0]
-#         for iterator in range(1, len(contrib_S)):
-#             for client in range(len(SV_calc_temp)):
-#                 SV_calc_temp[client] += contrib_S[iterator][client]
-#         SV_calc_temp = [SV_of_client / len(contrib_S) for SV_of_client in SV_calc_temp]
-#         round_marginal_gain_S = metrics[best_S] - self._last_round_result
-#         round_SV_S = dict()
-#         for client_id in best_S:
-#             round_SV_S[client_id] = SV_calc_temp[self._client_index_dictionary[client_id]]
-#
-#         self._shapley_values_S[local_round] = \
-#             normalize_shapley_values(round_SV_S,
-#                                      round_marginal_gain_S,
-#                                      return_default_dict_of_metrics(metric_list, y_test.shape[1]))
-#
-#         # calculating fullset SV
-#         # shapley value calculation
-#         if set(best_S) == set(range(self._worker_number)):
-#             self._shapley_values[local_round] = copy.deepcopy(
-#                 self._shapley_values_S[local_round]
-#             )
-#         else:
-#             contributions = contribution_records[0]
-#             log(INFO, "Contributions: {}".format(contributions))
-#             for round_to_add in range(1, len(contribution_records)):
-#                 # If not done like this, it just concatenates the list
-#                 for client in range(len(contributions)):
-#                     contributions[client] += contribution_records[round_to_add][client]
-#             log(INFO, "Contribution records: {}".format(contribution_records))
-#             round_shapley_values = [contribution / len(contribution_records) for contribution in contributions]
-#
-#             log(INFO, "Round shapley values: {}".format(round_shapley_values))
-#             assert len(round_shapley_values) == self._worker_number
-#
-#             round_marginal_gain = this_round_result - self._last_round_result
-#             round_shapley_value_dict = dict()
-#             for idx, list_of_metrics in zip(clients_list, round_shapley_values):
-#                 # Value should represent the values for the different metrics
-#                 round_shapley_value_dict[idx] = list_of_metrics
-#
-#             self._shapley_values[local_round] = \
-#                 normalize_shapley_values(round_shapley_value_dict,
-#                                          round_marginal_gain,
-#                                          return_default_dict_of_metrics(metric_list, y_test.shape[1]))
-#
-#         log(INFO, "Shapley_value {}".format(self._shapley_values[local_round]))
-#         log(INFO, "Shapley_value_S {}".format(self._shapley_values_S[local_round]))
-#         self._last_round_result = this_round_result
-#
-#     def not_convergent(self, index, contribution_records):
-#         if index >= self._max_number:
-#             return False
-#         if index <= self._converge_min:
-#             return True
-#         contribution_records_accuracy = copy.deepcopy(contribution_records)
-#         for iterator in range(0, len(contribution_records_accuracy)):
-#             contribution_records_accuracy[iterator] = [record.get_value()["Accuracy"].get_value()
-#                                                        for record in contribution_records_accuracy[iterator]]
-#         all_vals = (
-#                            np.cumsum(contribution_records_accuracy, 0)
-#                            / np.reshape(np.arange(1, len(contribution_records_accuracy) + 1), (-1, 1))
-#                    )[-self._last_k:]
-#         errors = np.mean(
-#             np.abs(all_vals[-self._last_k:] - all_vals[-1:])
-#             / (np.abs(all_vals[-1:]) + 1e-12),
-#             -1,
-#         )
-#         if np.max(errors) > self._converge_criteria:
-#             return True
-#         # get_logger().info(
-#         #     "convergent for index %s and converge_min %s max error %s converge_criteria %s",
-#         #     index,
-#         #     self.converge_min,
-#         #     np.max(errors),
-#         #     self.converge_criteria,
-#         # )
-#         return False
-#
-#
-# if __name__ == "__main__":
-#     original_round = DictOfMetrics({"CrossEntropyLoss": CrossEntropyLoss(0.70),
-#                                     "Accuracy": Accuracy(0.60),
-#                                     "F1Score": SVCompatibleF1Score([0.60, 0.60])
-#                                     })
-#     list_of_metrics1 = DictOfMetrics({"CrossEntropyLoss": CrossEntropyLoss(0.56),
-#                                       "Accuracy": Accuracy(0.75),
-#                                       "F1Score": SVCompatibleF1Score([0.65, 0.70])
-#                                       })
-#     list_of_metrics2 = DictOfMetrics({"CrossEntropyLoss": CrossEntropyLoss(0.56),
-#                                       "Accuracy": Accuracy(0.80),
-#                                       "F1Score": SVCompatibleF1Score([0.65, 0.70])
-#                                       })
-#     list_of_metrics3 = DictOfMetrics({"CrossEntropyLoss": CrossEntropyLoss(0.42),
-#                                       "Accuracy": Accuracy(0.82),
-#                                       "F1Score": SVCompatibleF1Score([0.70, 0.75])
-#                                       })
-#     # for metric in list_of_metrics3.get_value():
-#     #     print(metric.get_value())
-#     #
-#     marginal_contribution1 = (list_of_metrics3 - list_of_metrics2) + (list_of_metrics1 - original_round)
-#     marginal_contribution2 = (list_of_metrics3 - list_of_metrics1) + (list_of_metrics2 - original_round)
-#     difference_on_round = list_of_metrics3 - original_round
-#     #
-#     print(marginal_contribution1.get_value()["Accuracy"].get_value())
-#     print(marginal_contribution2.get_value()["Accuracy"].get_value())
-#     print(difference_on_round.get_value()["Accuracy"].get_value())
-#     print(return_default_dict_of_metrics(["F1Score", "MCC"], 6))
-#
-#     normalized_shapley_values = normalize_shapley_values({"1": marginal_contribution1, "2": marginal_contribution2},
-#                                                          difference_on_round,
-#                                                          return_default_dict_of_metrics(
-#                                                              original_round.get_value().keys(), 2)
-#                                                          )
-#
-#     for key, normalized_shapley_value in normalized_shapley_values.items():
-#         print("Key: {}".format(key))
-#         print("Shapley_values: {}".format(normalized_shapley_value))
+import random
+from logging import INFO
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+from flwr.common.logger import log
+
+from experiment_parameters.aggregation_processes.aggregate import aggregate_nn, aggregate_xgboost
+from experiment_parameters.model_builder.Model import Model
+from metrics.Evaluator import evaluator, evaluator_many
+from metrics.Metrics import MetricVector, return_default_metric_vector
+from metrics.Shapley_Values import ShapleyValues, ShapleyValuesNN, ShapleyValuesDT
+
+SHAPLEY_METHOD_EXACT = "Exact"
+SHAPLEY_METHOD_GTG = "GTG"
+# Default sampling budget of GTG-Shapley, in permutations per client. The convergence usually stops it earlier.
+PERMUTATIONS_PER_CLIENT = 10
+
+
+class ShapleyGTG(ShapleyValues):
+    """
+    Guided Truncation Gradient Shapley (GTG-Shapley). Approximates the Shapley values of a round by sampling
+    permutations of the clients until the running mean of the contributions converges or the sampling budget
+    is used up. Two truncations save evaluations:
+        - Between rounds: if the global model barely changed, every client gets a contribution of 0.
+        - Within a permutation: once a coalition is as good as the global model, the remaining clients of the
+          permutation add nothing and their coalitions are not evaluated.
+    Coalitions are cached by frozenset, so a coalition is evaluated at most once per round.
+    """
+    _max_permutations: Optional[int]
+    _tolerance: float
+    _eps: float
+    _round_trunc_threshold: float
+    _last_k: int
+    _converge_min: Optional[int]
+
+    def __init__(self,
+                 x_test,
+                 y_test,
+                 rounds,
+                 metric_list,
+                 max_permutations: Optional[int] = None,
+                 tolerance: float = 0.05,
+                 seed: Optional[int] = None,
+                 eps: float = 0.001,
+                 round_trunc_threshold: float = 0.001,
+                 last_k: int = 10,
+                 converge_min: Optional[int] = None):
+        """
+        :param max_permutations: Sampling budget, i.e. the maximum number of permutations per round.
+        By default, PERMUTATIONS_PER_CLIENT * n, but at least converge_min and at most 2^n.
+        :param tolerance: Maximum relative change of the mean contributions over the last last_k permutations
+        for the estimation to be considered converged.
+        :param seed: Seed of the permutations, for reproducible estimations.
+        :param eps: Accuracy difference to the global model under which a permutation is truncated.
+        :param round_trunc_threshold: Accuracy difference between rounds under which the round is truncated.
+        :param converge_min: Minimum number of permutations before checking the convergence.
+        By default, max(30, n).
+        """
+        super().__init__(x_test, y_test, rounds, metric_list)
+        if "Accuracy" not in metric_list:
+            raise ValueError("GTG-Shapley needs the Accuracy in the metric list for its truncations")
+        self._max_permutations = max_permutations
+        self._tolerance = tolerance
+        self._eps = eps
+        self._round_trunc_threshold = round_trunc_threshold
+        self._last_k = last_k
+        self._converge_min = converge_min
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def _accuracy_difference(first_result: MetricVector, second_result: MetricVector) -> float:
+        return abs(first_result.get_value_of_metric("Accuracy") - second_result.get_value_of_metric("Accuracy"))
+
+    def _zero_contributions(self) -> MetricVector:
+        return return_default_metric_vector(self._metric_list, self._y_test.shape[1])
+
+    def _gtg_shapley_values_calculation(self, clients_list, evaluate_coalitions, local_round):
+        """
+        :param evaluate_coalitions: Function that receives a list of non-empty coalitions, each one a list of
+        clients in the order of clients_list, and returns the MetricVector of their aggregated models.
+        The truncations decide the next coalition from the former result, so they are evaluated one at a time.
+        """
+        coalition_results: Dict[FrozenSet, MetricVector] = {frozenset(): self._last_round_result}
+
+        def coalition_result(coalition: FrozenSet) -> MetricVector:
+            if coalition not in coalition_results:
+                coalition_results[coalition] = evaluate_coalitions([[client for client in clients_list
+                                                                     if client in coalition]])[0]
+            return coalition_results[coalition]
+
+        number_of_clients = len(clients_list)
+        this_round_result = coalition_result(frozenset(clients_list))
+
+        # Between round truncation.
+        if self._accuracy_difference(this_round_result, self._last_round_result) < self._round_trunc_threshold:
+            self._shapley_values[local_round] = {client: self._zero_contributions() for client in clients_list}
+            log(INFO, f"Round {local_round} truncated, the global model did not change")
+            return
+
+        converge_min = self._converge_min if self._converge_min is not None else max(30, number_of_clients)
+        if self._max_permutations is not None:
+            max_permutations = self._max_permutations
+        else:
+            max_permutations = min(2 ** number_of_clients,
+                                   max(converge_min, PERMUTATIONS_PER_CLIENT * number_of_clients))
+
+        contribution_records: List[Dict] = []
+        while self._not_convergent(contribution_records, clients_list, max_permutations, converge_min):
+            # Every client starts one permutation, the rest of the permutation is random.
+            for first_client in clients_list:
+                if len(contribution_records) >= max_permutations:
+                    break
+                remaining_clients = [client for client in clients_list if client != first_client]
+                self._random.shuffle(remaining_clients)
+                permutation = [first_client] + remaining_clients
+
+                marginal_contributions = {}
+                coalition = frozenset()
+                former_result = self._last_round_result
+                for client in permutation:
+                    coalition = coalition | {client}
+                    # Within round truncation.
+                    if self._accuracy_difference(this_round_result, former_result) >= self._eps:
+                        current_result = coalition_result(coalition)
+                    else:
+                        current_result = former_result
+                    marginal_contributions[client] = current_result - former_result
+                    former_result = current_result
+                contribution_records.append(marginal_contributions)
+
+        self._shapley_values[local_round] = {}
+        for marginal_contributions in contribution_records:
+            for client, marginal_contribution in marginal_contributions.items():
+                self.update_shapley_value(local_round, client, marginal_contribution)
+        for client in self._shapley_values[local_round].keys():
+            self._shapley_values[local_round][client] /= len(contribution_records)
+        log(INFO, f"GTG-Shapley in round {local_round}: {len(contribution_records)} permutations, "
+                  f"{len(coalition_results) - 1} coalitions evaluated")
+
+    def _not_convergent(self, contribution_records, clients_list, max_permutations, converge_min) -> bool:
+        index = len(contribution_records)
+        if index >= max_permutations:
+            return False
+        if index <= converge_min:
+            return True
+        accuracy_records = np.asarray([[record[client].get_value_of_metric("Accuracy") for client in clients_list]
+                                       for record in contribution_records])
+        all_vals = (np.cumsum(accuracy_records, 0) /
+                    np.reshape(np.arange(1, len(accuracy_records) + 1), (-1, 1)))[-self._last_k:]
+        errors = np.mean(np.abs(all_vals - all_vals[-1:]) / (np.abs(all_vals[-1:]) + 1e-12), -1)
+        return bool(np.max(errors) > self._tolerance)
+
+
+class ShapleyGTGNN(ShapleyGTG):
+
+    def shapley_values_calculation(self,
+                                   model: Model,
+                                   clients_list,
+                                   client_weights,
+                                   local_round):
+        def evaluate_coalitions(coalitions):
+            return evaluator_many(self._x_test,
+                                  self._y_test,
+                                  model,
+                                  [aggregate_nn([client_weights[client] for client in coalition])
+                                   for coalition in coalitions],
+                                  self._metric_list)
+
+        self._gtg_shapley_values_calculation(list(clients_list), evaluate_coalitions, local_round)
+
+
+class ShapleyGTGDT(ShapleyGTG):
+
+    def shapley_values_calculation(self,
+                                   model: Model,
+                                   clients_list,
+                                   client_weights,
+                                   local_round,
+                                   global_model):
+        def evaluate_coalitions(coalitions):
+            results = []
+            for coalition in coalitions:
+                model.set_model(aggregate_xgboost([client_weights[client] for client in coalition], global_model))
+                results.append(evaluator(self._x_test, self._y_test, model, self._metric_list))
+            return results
+
+        self._gtg_shapley_values_calculation(list(clients_list), evaluate_coalitions, local_round)
+
+
+def create_shapley_values(config, x_test, y_test, metric_list, decision_tree=False) -> ShapleyValues:
+    """
+    Returns the Shapley value estimator selected in the evaluation config of the server: the exact computation
+    or GTG-Shapley with its sampling budget, tolerance and seed.
+    """
+    method = config.get("shapley_method", SHAPLEY_METHOD_EXACT)
+    if method == SHAPLEY_METHOD_EXACT:
+        exact_class = ShapleyValuesDT if decision_tree else ShapleyValuesNN
+        return exact_class(x_test, y_test, config["num_rounds"], metric_list)
+    elif method == SHAPLEY_METHOD_GTG:
+        gtg_class = ShapleyGTGDT if decision_tree else ShapleyGTGNN
+        max_permutations = config.get("shapley_max_permutations", 0)
+        seed = config.get("shapley_seed", -1)
+        return gtg_class(x_test,
+                         y_test,
+                         config["num_rounds"],
+                         metric_list,
+                         max_permutations=max_permutations if max_permutations > 0 else None,
+                         tolerance=config.get("shapley_tolerance", 0.05),
+                         seed=seed if seed >= 0 else None)
+    raise ValueError(f"Unknown Shapley value method {method}")
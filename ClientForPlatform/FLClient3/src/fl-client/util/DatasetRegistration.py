@@ -0,0 +1,114 @@
+"""
+Registration of a dataset in a single streaming pass over its CSV.
+
+The file is read in chunks of rows. Every chunk is validated against the expectations, added to the fingerprint of
+the dataset and appended to the registered copy, so the memory used does not depend on the size of the dataset.
+The value expectations of the platform are checked row by row, so a dataset is valid when all its chunks are; the
+registration stops at the first chunk that is not. The type expectations check the dtype of a column, which pandas
+infers from the rows of each chunk, so the chunks are validated with the dtype that their columns have in the whole
+file (see _validation_frame).
+
+A dataset that is already registered and did not change since (see FingerprintCache) is only validated against
+the expectations of the new training session: it is neither hashed nor copied again.
+"""
+import os
+import tempfile
+from typing import Collection, Dict, Optional, Tuple
+
+import pandas as pd
+
+from util.DatasetFingerprint import DatasetFingerprint, FingerprintCache, FINGERPRINT_CHUNK_ROWS, INDEX_NAME
+from util.GreatExpectationService import GreatExpectationService
+
+TEMPORARY_PREFIX = "registering-"
+
+
+def _holds_text(column: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column.dtype)
+
+
+def _validation_frame(chunk: pd.DataFrame, column_types: Dict[str, str], text_columns: Collection[str]) -> pd.DataFrame:
+    """
+    The chunk with the dtypes that its columns have in the whole file. A float column whose chunk only holds whole
+    numbers is read as int64, and a string column whose chunk only holds numbers as a number.
+
+    :param text_columns: Columns declared as strings that hold text in the file, so they are strings in the chunks
+                         where pandas inferred a number too. The other ones keep the dtype of the chunk.
+    """
+    conversions = {}
+    for column in chunk.columns:
+        declared_type = column_types.get(column)
+        if _holds_text(chunk[column]) or (declared_type == "string" and column in text_columns):
+            conversions[column] = "string"
+        elif declared_type == "float" and pd.api.types.is_integer_dtype(chunk[column]):
+            conversions[column] = "float64"
+    return chunk.astype(conversions)
+
+
+def register_dataset_file(dataset_path: str,
+                          registered_directory: str,
+                          expectation_service: GreatExpectationService) -> Tuple[object, Optional[str]]:
+    """
+    Validates the dataset and, if it is valid, copies it to registered_directory as "<fingerprint>.csv".
+
+    :return: The validation result (of the first chunk that failed, or of the last chunk) and the fingerprint of
+             the dataset, None if it is not valid.
+    """
+    os.makedirs(registered_directory, exist_ok=True)
+    fingerprint_cache = FingerprintCache(os.path.join(registered_directory, INDEX_NAME))
+    known_fingerprint = fingerprint_cache.get(dataset_path)
+    if known_fingerprint is not None and \
+            not os.path.isfile(os.path.join(registered_directory, known_fingerprint + ".csv")):
+        known_fingerprint = None
+    signature = fingerprint_cache.signature(dataset_path)
+    # Unique, so concurrent registrations do not write to the same copy.
+    temporary_file, temporary_path = tempfile.mkstemp(suffix=".csv", prefix=TEMPORARY_PREFIX, dir=registered_directory)
+    os.close(temporary_file)
+    fingerprint = DatasetFingerprint()
+    validation_result = None
+    last_chunk = None
+    complete = False
+    # Whether the columns declared as strings hold text is only known at the end of the file, so the chunks are
+    # validated as if they did and the ones that only held numbers fail at the end.
+    string_columns = {column for column, declared_type in expectation_service.column_types.items()
+                      if declared_type == "string"}
+    text_columns = set()
+    try:
+        with pd.read_csv(dataset_path, index_col=0, chunksize=FINGERPRINT_CHUNK_ROWS) as chunks:
+            for chunk_number, chunk in enumerate(chunks):
+                if chunk.empty:
+                    # Only the header.
+                    continue
+                text_columns.update(column for column in string_columns
+                                    if column in chunk.columns and _holds_text(chunk[column]))
+                last_chunk = chunk
+                validation_result = expectation_service.run_validation_on_pandas(
+                    _validation_frame(chunk, expectation_service.column_types, string_columns))
+                if not validation_result.success:
+                    print(f"Validation failed in rows {chunk_number * FINGERPRINT_CHUNK_ROWS} to "
+                          f"{chunk_number * FINGERPRINT_CHUNK_ROWS + len(chunk) - 1}")
+                    return validation_result, None
+                if known_fingerprint is not None:
+                    continue
+
+                fingerprint.add_chunk(chunk)
+                chunk.to_csv(temporary_path, mode="w" if chunk_number == 0 else "a", header=chunk_number == 0)
+        if validation_result is None:
+            raise ValueError(f"The dataset {dataset_path} has no rows")
+        if string_columns - text_columns:
+            # Numbers in every chunk: the last one fails the type expectation with the dtype pandas inferred.
+            print(f"The columns {sorted(string_columns - text_columns)} are declared as strings but hold numbers")
+            return expectation_service.run_validation_on_pandas(
+                _validation_frame(last_chunk, expectation_service.column_types, text_columns)), None
+        if known_fingerprint is not None:
+            return validation_result, known_fingerprint
+
+        dataset_fingerprint = fingerprint.fingerprint()
+        os.replace(temporary_path, os.path.join(registered_directory, dataset_fingerprint + ".csv"))
+        complete = True
+        fingerprint_cache.put(dataset_path, dataset_fingerprint, signature)
+        return validation_result, dataset_fingerprint
+    finally:
+        # A dataset that is not valid, or whose registration failed, leaves no partial copy.
+        if not complete and os.path.exists(temporary_path):
+            os.remove(temporary_path)
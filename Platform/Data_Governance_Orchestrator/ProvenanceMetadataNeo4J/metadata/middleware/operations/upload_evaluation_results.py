@@ -7,9 +7,9 @@ from .middleware_operation import MiddlewareOperation
 
 class UploadEvaluationResultsOperation(MiddlewareOperation):
     """
-    UploadEvaluationResultsOperation
+    UploadEvaluationResultsOperation, for the frames uploaded one by one and for the bundle of all of them
     """
-    regex: str = '(POST@/results/evaluations/)(.+)'
+    regex: str = '(POST@/results/(?:evaluations|bundles)/)(.+)'
 
     def __init__(self, db: Neo4JConnection):
         """
@@ -22,6 +22,7 @@ VOTE_PRIORITY_ALREADY_EXISTS = (
 USER_NOT_FOUND = "The specified user was not found."
 ORGANISATION_NOT_FOUND = "The specified organisation was not found."
 FILE_NOT_EXISTS = "The evaluation results do not exist."
+RESULT_FRAME_NOT_FOUND = "The specified result frame does not exist."
 KEYCLOAK_CREATE_USER = "Keycloak user could not be created."
 KEYCLOAK_DELETE_USER = "Keycloak user could not be deleted."
 USER_ALREADY_IN_GROUP = "The user is already in the group"
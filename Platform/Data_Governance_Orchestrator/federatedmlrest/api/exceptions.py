@@ -174,4 +174,10 @@ class ExistingQualityRequirement(HTTPException):
 
 class TrainingConfigurationNotFoundException(HTTPException):
     def __init__(self):
-        super().__init__(status_code=422, detail=errors.TRAINING_CONFIGURATION_RESULTS_NOT_FOUND)
\ No newline at end of file
+        super().__init__(status_code=422, detail=errors.TRAINING_CONFIGURATION_RESULTS_NOT_FOUND)
+
+class ResultFrameNotFoundException(HTTPNotFoundException):
+    """Result frame not found exception."""
+
+    def __init__(self):
+        super().__init__(detail=errors.RESULT_FRAME_NOT_FOUND)
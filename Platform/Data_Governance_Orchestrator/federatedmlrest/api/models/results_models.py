@@ -9,7 +9,8 @@ class FileUploadResponse(BaseModel):
     message: str = Field(description="Success message")
     filename: str = Field(description="Name of the uploaded file")
     governance_id: str = Field(alias="_governance_id", description="Governance ID of the configuration")
-    file_type: Literal["evaluation_results", "trained_model"] = Field(description="Type of uploaded file")
+    file_type: Literal["evaluation_results", "results_bundle", "trained_model"] = Field(
+        description="Type of uploaded file")
 
     class Config:
         """Pydantic config."""
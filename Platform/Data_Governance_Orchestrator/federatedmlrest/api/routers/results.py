@@ -1,7 +1,8 @@
+from typing import List, Optional
 from uuid import UUID
 
 import fastapi
-from fastapi import File, UploadFile
+from fastapi import File, UploadFile, Query
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi import status as http_codes
 from fastapi.responses import PlainTextResponse, StreamingResponse
@@ -16,6 +17,7 @@ from federatedmlrest.api.models.result_models import AddTrainingConfigurationInf
 from federatedmlrest.api.tags import Tags
 from federatedmlrest.keycloak_auth import get_current_user, keycloak_user_in_group, require_user_in_group
 from federatedmlrest.lib import getters
+from federatedmlrest.lib.result_bundles import read_result_frame
 from federatedmlrest.api.DBConnection import get_minio_s3, get_db
 from federatedmlrest.mongo import Collections
 
@@ -122,14 +124,22 @@ async def get_training_information(
 async def get_result_dataframe(
     configuration_id: UUID,
     metric_name: str,
+    columns: Optional[List[str]] = Query(None),
+    rounds: Optional[List[int]] = Query(None),
     token: dict = Depends(get_current_user),
 ) -> PlainTextResponse:
-    """Get all datasets."""
+    """Get the evaluation results of a metric, optionally only some evaluators (columns) and rounds."""
     configuration = getters.find_config(dependencies.transform_to_pyuuid(str(configuration_id)))
     strategy = getters.find_strategy_governance(configuration.strategy_linked)
     require_user_in_group(str(strategy.belonging_group))
 
     minio = get_minio_s3()
+    bundle = minio.get_results_bundle(configuration_id)
+    if bundle is not None:
+        dataframe = read_result_frame(bundle, "Evaluation_" + metric_name, columns=columns, rounds=rounds)
+        return PlainTextResponse(dataframe.to_csv(), media_type="text/csv")
+
+    # Results uploaded file by file, before the bundles.
     try:
         dataframe = minio.get_dataframe(configuration_id, "Evaluation_" + metric_name + ".csv")
     except Exception as ex:
@@ -153,14 +163,26 @@ async def get_result_dataframe(
 async def get_sv_dataframe(
     configuration_id: UUID,
     metric_name: str,
+    columns: Optional[List[str]] = Query(None),
+    rounds: Optional[List[int]] = Query(None),
+    evaluators: Optional[List[str]] = Query(None),
     token: dict = Depends(get_current_user),
 ) -> PlainTextResponse:
-    """Get all datasets."""
+    """Get the Shapley values of a metric summed per evaluator, optionally only some evaluated clients (columns),
+    rounds and evaluators."""
     configuration = getters.find_config(dependencies.transform_to_pyuuid(str(configuration_id)))
     strategy = getters.find_strategy_governance(configuration.strategy_linked)
     require_user_in_group(str(strategy.belonging_group))
 
     minio = get_minio_s3()
+    bundle = minio.get_results_bundle(configuration_id)
+    if bundle is not None:
+        dataframe = read_result_frame(bundle, "SV_" + metric_name,
+                                      columns=columns, rounds=rounds, evaluators=evaluators)
+        summed_dataframe = dataframe.groupby(level="Evaluator").sum(numeric_only=True)
+        return PlainTextResponse(summed_dataframe.to_csv(), media_type="text/csv")
+
+    # Results uploaded file by file, before the bundles.
     try:
         dataframe = minio.get_dataframe(configuration_id, "SV_" + metric_name)
     except Exception as ex:
@@ -262,6 +284,37 @@ async def upload_results_dataframe(
     )
 
 
+@router.post(
+    '/bundles/{configuration_id}',
+    responses={
+        http_codes.HTTP_201_CREATED: {
+            'description': 'Returns an accept from the operation.',
+        },
+        http_codes.HTTP_404_NOT_FOUND: {
+            'description': 'The file was not found.',
+        },
+    },
+    response_model=results_models.FileUploadResponse,
+    response_model_exclude_none=True,
+)
+async def upload_results_bundle(
+    file: UploadFile,
+    configuration_id: UUID,
+    token: dict = Depends(get_current_user),
+) -> results_models.FileUploadResponse:
+    """Post the zip with all the evaluation and Shapley value frames of a configuration."""
+    contents = file.file.read()  # The file is received as bytes.
+    minio = get_minio_s3()
+    minio.save_results_bundle(configuration_id, contents)
+
+    return results_models.FileUploadResponse(
+        message="The file was successfully uploaded",
+        filename=file.filename,
+        _governance_id=str(configuration_id),
+        file_type="results_bundle"
+    )
+
+
 @router.post(
     '/models/{configuration_id}',
     responses={
@@ -0,0 +1,80 @@
+"""Read the result bundles uploaded by the Flower server.
+
+A bundle is a zip with one CSV per result frame, "<frame name>.csv" (e.g. "Evaluation_Accuracy.csv" or
+"SV_F1Score.csv"), and a "manifest.json" with the number of header rows and index columns of every frame.
+Only the requested columns are parsed, and the rows are filtered while the CSV is read in chunks.
+"""
+import csv
+import io
+import json
+import zipfile
+from typing import List, Optional
+
+import pandas as pd
+
+from federatedmlrest.api import exceptions
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 10000
+
+
+def read_result_frame(
+    bundle: bytes,
+    frame_name: str,
+    columns: Optional[List[str]] = None,
+    rounds: Optional[List[int]] = None,
+    evaluators: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Read a frame of a bundle, projected on the given columns and rows.
+
+    Args:
+        bundle: Content of the zip.
+        frame_name: Name of the frame, without extension.
+        columns: Columns to keep, by the name of their first header row: the evaluators of the evaluation
+            frames, the evaluated clients of the Shapley value frames. All of them if None.
+        rounds: Rounds to keep, the first index column. All of them if None.
+        evaluators: Evaluators to keep, the second index column of the Shapley value frames. All of them if None.
+
+    Returns:
+        The frame, indexed by its index columns.
+    """
+    with zipfile.ZipFile(io.BytesIO(bundle)) as archive:
+        layout = json.loads(archive.read(MANIFEST_NAME)).get(frame_name)
+        if layout is None:
+            raise exceptions.ResultFrameNotFoundException()
+        content = archive.read(frame_name + ".csv").decode()
+
+    header_rows = layout["header_rows"]
+    index_columns = layout["index_columns"]
+    reader = csv.reader(io.StringIO(content))
+    header = [next(reader) for _ in range(header_rows)]
+    used_columns = list(range(index_columns)) + [
+        position for position, name in enumerate(header[0])
+        if position >= index_columns and (columns is None or name in columns)
+    ]
+    # Pandas cannot combine usecols with a header of several rows, so the header is built from the rows above.
+    if header_rows > 1:
+        column_labels = pd.MultiIndex.from_arrays([[row[position] for position in used_columns[index_columns:]]
+                                                   for row in header])
+    else:
+        column_labels = pd.Index([header[0][position] for position in used_columns[index_columns:]])
+    index_names = [name if name else None for name in header[0][:index_columns]]
+    chunks = pd.read_csv(
+        io.StringIO(content),
+        header=None,
+        skiprows=header_rows,
+        usecols=used_columns,
+        index_col=list(range(index_columns)),
+        chunksize=CHUNK_SIZE,
+    )
+    selected = []
+    for chunk in chunks:
+        if rounds is not None:
+            chunk = chunk[chunk.index.get_level_values(0).isin(rounds)]
+        if evaluators is not None and index_columns > 1:
+            chunk = chunk[chunk.index.get_level_values(1).astype(str).isin(evaluators)]
+        selected.append(chunk)
+    frame = pd.concat(selected)
+    frame.columns = column_labels
+    frame.index.names = index_names
+    return frame
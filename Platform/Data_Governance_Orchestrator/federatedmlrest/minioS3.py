@@ -7,6 +7,10 @@ from uuid import UUID
 import yaml
 
 from minio import Minio
+from minio.error import S3Error
+
+# Zip with the CSVs of all the result frames of a configuration, see federatedmlrest.lib.result_bundles.
+RESULTS_BUNDLE_NAME = "results.zip"
 
 
 class MinioS3:
@@ -52,6 +56,26 @@ class MinioS3:
             content_type="application/csv",
         )
 
+    def get_results_bundle(self, configuration_id) -> Optional[bytes]:
+        """Returns None when the results of the configuration were uploaded file by file, before the bundles."""
+        try:
+            response = self._minio_connection.get_object(self._bucket_name,
+                                                         str(configuration_id) + "/dataframes/" + RESULTS_BUNDLE_NAME)
+        except S3Error as ex:
+            if ex.code == "NoSuchKey":
+                return None
+            raise
+        return response.data
+
+    def save_results_bundle(self, configuration_id: UUID, bundle: bytes):
+        self._minio_connection.put_object(
+            self._bucket_name,
+            str(configuration_id) + "/dataframes/" + RESULTS_BUNDLE_NAME,
+            io.BytesIO(bundle),
+            length=len(bundle),
+            content_type="application/zip",
+        )
+
     def get_model(self, configuration_id, type_of_model):
         if type_of_model == "XGBoost":
             final_string = "xgboost_model.json"
@@ -0,0 +1,58 @@
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from federatedmlrest.api import exceptions
+from federatedmlrest.lib.result_bundles import read_result_frame
+
+
+def make_bundle(frames):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as bundle:
+        for name, frame in frames.items():
+            bundle.writestr(name + ".csv", frame.to_csv())
+        bundle.writestr("manifest.json", json.dumps({
+            name: {"header_rows": frame.columns.nlevels, "index_columns": frame.index.nlevels}
+            for name, frame in frames.items()
+        }))
+    return buffer.getvalue()
+
+
+evaluation = pd.DataFrame(np.arange(6.0).reshape(2, 3), index=[1, 2], columns=["1", "2", "Aggregated"])
+per_class_evaluation = pd.DataFrame(np.arange(8.0).reshape(2, 4), index=[1, 2],
+                                    columns=pd.MultiIndex.from_product([["1", "Aggregated"], ["yes", "no"]]))
+shapley_values = pd.DataFrame(
+    np.arange(12.0).reshape(6, 2),
+    index=pd.MultiIndex.from_product([[0, 1, 2], ["1", "Aggregated"]], names=["Round", "Evaluator"]),
+    columns=["1", "2"],
+)
+bundle = make_bundle({"Evaluation_Accuracy": evaluation,
+                      "Evaluation_F1Score": per_class_evaluation,
+                      "SV_Accuracy": shapley_values})
+
+
+def test_read_evaluation_frame_with_projection():
+    frame = read_result_frame(bundle, "Evaluation_Accuracy", columns=["Aggregated"], rounds=[2])
+    assert list(frame.columns) == ["Aggregated"]
+    assert frame.loc[2, "Aggregated"] == 5.0
+
+
+def test_read_per_class_frame_keeps_both_header_rows():
+    frame = read_result_frame(bundle, "Evaluation_F1Score", columns=["Aggregated"])
+    assert list(frame.columns) == [("Aggregated", "yes"), ("Aggregated", "no")]
+    assert list(frame.loc[1]) == [2.0, 3.0]
+
+
+def test_read_shapley_values_filtered_by_round_and_evaluator():
+    frame = read_result_frame(bundle, "SV_Accuracy", columns=["2"], rounds=[1, 2], evaluators=["Aggregated"])
+    assert frame.index.names == ["Round", "Evaluator"]
+    assert list(frame["2"]) == [7.0, 11.0]
+
+
+def test_unknown_frame():
+    with pytest.raises(exceptions.ResultFrameNotFoundException):
+        read_result_frame(bundle, "SV_MCC")
@@ -9,33 +9,8 @@ from experiment_parameters.TrainerFactory import strategies_dictionary
 from experiment_parameters.model_builder.Model import XGBoostModel
 from experiment_parameters.model_builder.ModelBuilder import get_training_configuration, Director
 from util import OptunaConnection
+from util.UploadResults import wait_for_result_uploads
 
-connection_port = argv[1]
-strategy_selected = argv[2]
-possible_outputs = ast.literal_eval(argv[3])
-model_selected = argv[4]
-hyperparameter_space = ast.literal_eval(argv[5])
-input_dim = int(argv[6])
-output_dim = int(argv[7])
-number_of_clients = int(argv[8])
-log(INFO, f"Min number of clients: {number_of_clients}")
-number_of_rounds = int(argv[9])
-metric_list = argv[10].split("-")
-model_final_name = argv[11]
-load_best_trial = int(argv[12])
-compute_shapley_values = int(argv[13])
-configuration_id = argv[14]
-
-study = OptunaConnection.load_study(model_final_name)
-
-if load_best_trial == 0:
-    trial = study.ask()
-    parameters_dict = get_training_configuration(trial, model_selected, hyperparameter_space)
-
-elif load_best_trial == 1:
-    trial = None  # Quickfix. Not so nicely programmed.
-    trial_with_highest_accuracy = study.best_trial
-    parameters_dict = get_training_configuration(trial_with_highest_accuracy, model_selected, hyperparameter_space)
 # Dataset factory. In this case, because the dataset is not used directly in this file,
 # it is not instantiated. This factory is used by the strategy, to pass the data for
 # evaluation.
@@ -58,12 +33,21 @@ def get_fit_config_func(parameters_dict):
 
 
 # Try to use the config for sending the parameters.
-def get_evaluate_config_func(compute_shapley_values, num_rounds):
+def get_evaluate_config_func(compute_shapley_values, num_rounds, shapley_configuration=None):
+    if shapley_configuration is None:
+        shapley_configuration = {}
+
     def evaluate_config_func(server_round):
         config = {
             "server_round": server_round,
             "compute_shapley_values": compute_shapley_values,
-            "num_rounds": num_rounds
+            "num_rounds": num_rounds,
+            # Estimator of the Shapley values used by the clients: "Exact" or "GTG" (with its sampling budget,
+            # convergence tolerance and seed). Flower configs cannot hold None, so 0 and -1 mean "default".
+            "shapley_method": shapley_configuration.get("method", "Exact"),
+            "shapley_max_permutations": int(shapley_configuration.get("max_permutations", 0)),
+            "shapley_tolerance": float(shapley_configuration.get("tolerance", 0.05)),
+            "shapley_seed": int(shapley_configuration.get("seed", -1))
         }
 
         return config
@@ -71,44 +55,6 @@ def get_evaluate_config_func(compute_shapley_values, num_rounds):
     return evaluate_config_func
 
 
-# This is just to get the model prepared for KD.
-logits = False
-if strategy_selected in ["FedKD", "FedDKD"]:
-    logits = True
-
-# log(INFO, "Logits: {}".format(logits))
-# This is the model. For retrieving the model class (type of instance TFModel)
-# from the file Model.py.
-
-
-director = Director()
-if model_selected != "xgboost":
-    # model = factory_return_model(dataset_factory, model_selected, parameters_dict)
-    model = director.create_mlp(input_dim, output_dim, parameters_dict)
-
-    # Flower work with NDArrays, which is what you get when you use get_weights op.
-    weights = model.get_model().get_weights()
-
-    parameters = fl.common.ndarrays_to_parameters(weights)
-
-    # shapley_values = ShapleyValuesNN(X_test, y_test, number_of_rounds, metric_list)
-    # gradient_rewards = GradientRewards(number_of_clients)
-
-else:
-    model = XGBoostModel()
-    parameters = None
-
-    xgboost_training_params = director.create_xgboost(input_dim, output_dim, parameters_dict)
-    #
-    # model.fit(xgboost_training_params,
-    #           x_train=X_train,
-    #           x_test=X_test,
-    #           y_train=y_train,
-    #           y_test=y_test,
-    #           num_local_rounds=1)
-    #
-    # shapley_values = ShapleyValuesDT(X_test, y_test, number_of_rounds, metric_list)
-
 #
 # # The `evaluate` function will be called after every round
 # # It needs to be positioned here, as it needs to have the model defined before.
@@ -165,35 +111,110 @@ else:
 #     metric_list.append("Accuracy")
 
 
-strategy_type = strategies_dictionary[strategy_selected]().create_strategy()
-strategy = strategy_type(
-    # ... other fedavg arguments
-    max_round=number_of_rounds,
-    possible_outputs=possible_outputs,
-    model=model,
-    final_training=load_best_trial,
-    compute_shapley_values=compute_shapley_values,
-    # shapley_values=shapley_values,
-    # gradient_rewards=gradient_rewards,
-    metric_list=metric_list,
-    tracked_study=study,
-    tracked_trial=trial,
-    min_fit_clients=number_of_clients,
-    min_eval_clients=number_of_clients,
-    fraction_eval=0.2,
-    min_available_clients=number_of_clients,
-    initial_parameters=parameters,
-    # eval_fn=get_evaluate_function(dataset_factory, model, model_selected, metric_list,
-    #                               study, trial, load_best_trial),
-    on_fit_config_fn=get_fit_config_func(parameters_dict),
-    on_evaluate_config_fn=get_evaluate_config_func(compute_shapley_values, number_of_rounds),
-    model_final_name=model_final_name,
-    result_path="results/" + configuration_id
-)
-
-# Start Flower server
-fl.server.start_server(
-    server_address="0.0.0.0:" + connection_port,
-    config=fl.server.ServerConfig(num_rounds=number_of_rounds),
-    strategy=strategy
-)
+def run_server(connection_port: str,
+               strategy_selected: str,
+               possible_outputs: list,
+               model_selected: str,
+               hyperparameter_space: dict,
+               input_dim: int,
+               output_dim: int,
+               number_of_clients: int,
+               number_of_rounds: int,
+               metric_list: list,
+               model_final_name: str,
+               load_best_trial: int,
+               compute_shapley_values: int,
+               configuration_id: str,
+               shapley_configuration: dict = None,
+               checkpoint_configuration: dict = None,
+               transport_configuration: dict = None):
+    """
+    Builds the model and the strategy of one training run and blocks until the Flower server finishes.
+
+    It is called once per process when Server.py is started as a script, and once per job by the
+    workers of the FlowerServerPool, which keep the heavy imports of this module loaded between runs.
+    """
+    log(INFO, f"Min number of clients: {number_of_clients}")
+    study = OptunaConnection.load_study(model_final_name)
+
+    if load_best_trial == 0:
+        trial = study.ask()
+        parameters_dict = get_training_configuration(trial, model_selected, hyperparameter_space)
+
+    elif load_best_trial == 1:
+        trial = None  # Quickfix. Not so nicely programmed.
+        trial_with_highest_accuracy = study.best_trial
+        parameters_dict = get_training_configuration(trial_with_highest_accuracy, model_selected, hyperparameter_space)
+
+    # This is the model. For retrieving the model class (type of instance TFModel)
+    # from the file Model.py.
+    director = Director()
+    if model_selected != "xgboost":
+        model = director.create_mlp(input_dim, output_dim, parameters_dict)
+
+        # Flower work with NDArrays, which is what you get when you use get_weights op.
+        weights = model.get_model().get_weights()
+
+        parameters = fl.common.ndarrays_to_parameters(weights)
+
+    else:
+        model = XGBoostModel()
+        parameters = None
+
+        xgboost_training_params = director.create_xgboost(input_dim, output_dim, parameters_dict)
+
+    strategy_type = strategies_dictionary[strategy_selected]().create_strategy()
+    strategy = strategy_type(
+        # ... other fedavg arguments
+        max_round=number_of_rounds,
+        possible_outputs=possible_outputs,
+        model=model,
+        final_training=load_best_trial,
+        compute_shapley_values=compute_shapley_values,
+        metric_list=metric_list,
+        tracked_study=study,
+        tracked_trial=trial,
+        min_fit_clients=number_of_clients,
+        min_eval_clients=number_of_clients,
+        fraction_eval=0.2,
+        min_available_clients=number_of_clients,
+        initial_parameters=parameters,
+        on_fit_config_fn=get_fit_config_func(parameters_dict),
+        on_evaluate_config_fn=get_evaluate_config_func(compute_shapley_values, number_of_rounds,
+                                                       shapley_configuration),
+        model_final_name=model_final_name,
+        result_path="results/" + configuration_id,
+        shapley_configuration=shapley_configuration,
+        checkpoint_configuration=checkpoint_configuration,
+        transport_configuration=transport_configuration
+    )
+
+    # Start Flower server
+    history = fl.server.start_server(
+        server_address="0.0.0.0:" + connection_port,
+        config=fl.server.ServerConfig(num_rounds=number_of_rounds),
+        strategy=strategy
+    )
+    # The results of the final training are uploaded in the background, the run ends once they are sent.
+    wait_for_result_uploads()
+    return history
+
+
+if __name__ == "__main__":
+    run_server(connection_port=argv[1],
+               strategy_selected=argv[2],
+               possible_outputs=ast.literal_eval(argv[3]),
+               model_selected=argv[4],
+               hyperparameter_space=ast.literal_eval(argv[5]),
+               input_dim=int(argv[6]),
+               output_dim=int(argv[7]),
+               number_of_clients=int(argv[8]),
+               number_of_rounds=int(argv[9]),
+               metric_list=argv[10].split("-"),
+               model_final_name=argv[11],
+               load_best_trial=int(argv[12]),
+               compute_shapley_values=int(argv[13]),
+               configuration_id=argv[14],
+               shapley_configuration=ast.literal_eval(argv[15]) if len(argv) > 15 else None,
+               checkpoint_configuration=ast.literal_eval(argv[16]) if len(argv) > 16 else None,
+               transport_configuration=ast.literal_eval(argv[17]) if len(argv) > 17 else None)
@@ -1,6 +1,6 @@
 from abc import ABC
 from logging import INFO
-from typing import Dict
+from typing import Dict, List, Optional
 
 import numpy as np
 import pandas as pd
@@ -28,6 +28,37 @@ class Model(ABC):
     #     raise NotImplementedError()
 
 
+def _softmax(x: np.ndarray) -> np.ndarray:
+    exponentials = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return exponentials / np.sum(exponentials, axis=-1, keepdims=True)
+
+
+# Activations of the Dense layers that the NumPy forward pass of MLPModel can compute.
+numpy_activations = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+    "softmax": _softmax
+}
+
+
+def dense_forward(weights: List[np.ndarray], activations: List[str], x) -> np.ndarray:
+    """
+    Forward pass of a stack of Dense layers computed with NumPy, in float32 like Keras.
+
+    :param weights: Kernel and bias of every layer, as returned by get_weights. Kernels and biases stacked along a
+    leading axis compute several models at once, with shape (models, samples, classes).
+    """
+    outputs = np.asarray(x, dtype=np.float32)
+    for layer_index, activation in enumerate(activations):
+        kernel = np.asarray(weights[2 * layer_index], dtype=np.float32)
+        bias = np.asarray(weights[2 * layer_index + 1], dtype=np.float32)
+        # (samples, inputs) @ (models, inputs, units) broadcasts to (models, samples, units).
+        outputs = numpy_activations[activation](np.matmul(outputs, kernel) + np.expand_dims(bias, -2))
+    return outputs
+
+
 class KerasModel(Model):
     ml_model: keras.Sequential
 
@@ -54,9 +85,12 @@ class KerasModel(Model):
 
 
 class MLPModel(KerasModel):
+    # Whether the evaluation may compute the predictions with NumPy instead of Keras.
+    numpy_inference: bool
 
-    def __init__(self, model=None):
+    def __init__(self, model=None, numpy_inference: bool = True):
         super().__init__(model)
+        self.numpy_inference = numpy_inference
 
     def fit(self, x_train, y_train, epochs=100, batch_size=64, callbacks=None, config: Dict = None):
         self.ml_model.fit(x_train,
@@ -67,6 +101,52 @@ class MLPModel(KerasModel):
                           validation_split=0.2,
                           verbose=0)
 
+    def dense_activations(self) -> Optional[List[str]]:
+        """
+        Activations of the Dense layers if the model is a plain stack of Dense and Dropout layers, as built by
+        MLPBuilder, so that it can be computed with NumPy. None otherwise.
+        """
+        activations = []
+        for layer in self.ml_model.layers:
+            if isinstance(layer, keras.layers.Dropout):
+                # Dropout is only active during training.
+                continue
+            if not isinstance(layer, keras.layers.Dense) or not layer.use_bias:
+                return None
+            activation = layer.get_config()["activation"]
+            if not isinstance(activation, str) or activation not in numpy_activations:
+                return None
+            activations.append(activation)
+        return activations
+
+    def predict_proba_many(self, list_of_weights: List[List[np.ndarray]], x) -> np.ndarray:
+        """
+        Predictions of the model for several sets of weights at once, with shape (weight sets, samples, classes).
+        The kernels of every Dense layer are stacked and the forward passes run as one batched matmul, instead of
+        one set_weights and predict per set of weights.
+        """
+        activations = self.dense_activations() if self.numpy_inference else None
+        if activations is None or any(len(weights) != 2 * len(activations) for weights in list_of_weights):
+            predictions = []
+            for weights in list_of_weights:
+                self.set_model(weights)
+                predictions.append(self.predict_proba(x))
+            return np.stack(predictions)
+
+        return dense_forward([np.stack(layers) for layers in zip(*list_of_weights)], activations, x)
+
+    def predict_proba_numpy(self, x) -> Optional[np.ndarray]:
+        """
+        Predictions computed with NumPy from get_weights, without the tf.data and graph overhead of predict.
+        None if NumPy inference is disabled or the architecture is not supported.
+        """
+        if not self.numpy_inference:
+            return None
+        activations = self.dense_activations()
+        if activations is None:
+            return None
+        return dense_forward(self.ml_model.get_weights(), activations, x)
+
 
 class DeepModel(KerasModel):
 
@@ -106,6 +106,9 @@ class FedAvgEmbedding(FedAvg):
             on_evaluate_config_fn: Optional[Callable[[int], Dict[str, Scalar]]] = None,
             accept_failures: bool = True,
             initial_parameters: Optional[Parameters] = None,
+            shapley_configuration: Optional[dict] = None,
+            checkpoint_configuration: Optional[dict] = None,
+            transport_configuration: Optional[dict] = None,
     ) -> None:
 
         super().__init__()
@@ -139,6 +142,7 @@ class FedAvgEmbedding(FedAvg):
         # self._compute_shapley_values = compute_shapley_values
         self._model_final_name = model_final_name
         self._result_path = result_path
+        self._configuration_id = os.path.basename(result_path)
 
         # Information for evaluation purposes.
         self._total_test_samples = None
@@ -242,6 +246,7 @@ class FedAvgEmbedding(FedAvg):
 
             # x_test, y_test = self._evaluation_dataset.get_test_data()
             self._dataset_metrics = FlowerMetricManager(
+                configuration_id=self._configuration_id,
                 metric_list=self._metric_list,
                 client_list=list(self._id_and_client_number.values()),
                 number_of_rounds=self._max_round,
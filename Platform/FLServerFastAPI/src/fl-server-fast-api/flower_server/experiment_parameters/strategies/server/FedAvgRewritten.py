@@ -1,12 +1,12 @@
 import ast
 import json
 import os
-import pickle
 from functools import reduce
 from logging import WARNING, INFO
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import joblib
+import keras
 import numpy as np
 from flwr.common import Parameters, Scalar, FitRes, NDArray, parameters_to_ndarrays, \
     ndarrays_to_parameters, EvaluateIns, EvaluateRes, FitIns
@@ -17,15 +17,20 @@ from flwr.server.strategy import FedAvg
 from flwr.server.strategy.aggregate import weighted_loss_avg
 
 from Definitions import ROOT_DIR
-from experiment_parameters.aggregation_processes.aggregate import aggregate_nn
+from experiment_parameters.aggregation_processes.aggregate import WeightedAverageAggregator
 from experiment_parameters.model_builder.Model import Model
 from metrics.Evaluator import evaluator
 from metrics.GradientRewards import GradientRewards
+from metrics.MetricCodec import decode_metric_values
 from metrics.Metrics import return_default_dict_of_metrics
 from metrics.ResultManager import FlowerMetricManager, SVCompatibleFlowerMetricManager
-from metrics.Shapley_Values import ShapleyValuesNN
-from util.Util import save_data_on_pickle, from_string_to_dict, get_test_data
+from metrics.ShapleyGTG import create_shapley_values
+from metrics.Shapley_Values import ShapleyValues
+from util.CheckpointWriter import CheckpointWriter
+from util.TransportCodec import TransportCodec, decode_parameters
+from util.Util import save_data_on_pickle, get_test_data
 from util.UploadResults import send_results_to_governance_platform
+from util.WeightStore import WeightStore, HELD_WEIGHTS_KEY
 
 DEPRECATION_WARNING = """
 DEPRECATION WARNING: deprecated `eval_fn` return format
@@ -63,6 +68,12 @@ connected to the server. `min_available_clients` must be set to a value larger
 than or equal to the values of `min_fit_clients` and `min_eval_clients`.
 """
 
+# Where the Shapley values are computed. "Clients": every client computes them on its own test split, with the
+# updates of all the clients. "Centralized": the server computes them once per round on a validation split of its
+# own, so the clients neither receive the updates nor evaluate any coalition.
+SHAPLEY_MODE_CLIENTS = "Clients"
+SHAPLEY_MODE_CENTRALIZED = "Centralized"
+
 
 def save_data_on_joblib(path_file, data):
     # file = open(path_file, 'wb')
@@ -70,13 +81,17 @@ def save_data_on_joblib(path_file, data):
     # file.close()
 
 
-def save_model_with_tensorflow(path_file, model):
-    model.save(path_file + ".keras")
+def clone_compiled_model(model):
+    clone = keras.models.clone_model(model)
+    compile_config = model.get_compile_config()
+    if compile_config is not None:
+        clone.compile_from_config(compile_config)
+    return clone
 
 
 class FedAvgRewritten(FedAvg):
     """Configurable fedavg strategy implementation."""
-    _shapley_values: ShapleyValuesNN
+    _shapley_values: Optional[ShapleyValues]
     _gradient_rewards: GradientRewards
     _max_round: int
     _compute_shapley_values: bool
@@ -113,6 +128,9 @@ class FedAvgRewritten(FedAvg):
             on_evaluate_config_fn: Optional[Callable[[int], Dict[str, Scalar]]] = None,
             accept_failures: bool = True,
             initial_parameters: Optional[Parameters] = None,
+            shapley_configuration: Optional[dict] = None,
+            checkpoint_configuration: Optional[dict] = None,
+            transport_configuration: Optional[dict] = None,
     ) -> None:
 
         super().__init__()
@@ -140,16 +158,46 @@ class FedAvgRewritten(FedAvg):
         # self._shapley_values = shapley_values
         # self._gradient_rewards = gradient_rewards
         self._metric_list = metric_list
-        self._clients_weights = None
+        # Updates of the clients of the last round, served to the clients that compute the Shapley values.
+        self._weight_store = WeightStore()
+        # Running weighted sum of the client updates. Its buffers are reused from round to round.
+        self._aggregator = WeightedAverageAggregator()
         self._max_round = max_round
         self._compute_shapley_values = compute_shapley_values
+        if shapley_configuration is None:
+            shapley_configuration = {}
+        shapley_mode = shapley_configuration.get("mode", SHAPLEY_MODE_CLIENTS)
+        if shapley_mode not in (SHAPLEY_MODE_CLIENTS, SHAPLEY_MODE_CENTRALIZED):
+            raise ValueError(f"Unknown Shapley value mode {shapley_mode}")
+        self._centralized_shapley_values = compute_shapley_values == 1 and shapley_mode == SHAPLEY_MODE_CENTRALIZED
+        self._clients_compute_shapley_values = compute_shapley_values == 1 and not self._centralized_shapley_values
+        self._shapley_values = None
         self._model_final_name = model_final_name
         self._result_path = result_path
+        self._configuration_id = os.path.basename(result_path)
+        # The global model of the final training is written in the background, see CheckpointWriter.
+        self._checkpoint_writer = None
+        self._checkpoint_model = None
+        if final_training == 1:
+            if checkpoint_configuration is None:
+                checkpoint_configuration = {}
+            self._checkpoint_writer = CheckpointWriter(self._write_checkpoint,
+                                                       last_round=max_round,
+                                                       every_n_rounds=checkpoint_configuration.get("every_n_rounds", 1),
+                                                       last_only=checkpoint_configuration.get("last_only", False))
+
+        # Encoding of the models on the wire, see TransportCodec. The clients send their update as a difference
+        # with the global model they received, which is added to the full precision global model of the server.
+        self._transport_codec = TransportCodec.from_configuration(transport_configuration)
+        self._global_weights = None
+        if self._transport_codec.enabled and initial_parameters is not None:
+            self._global_weights = parameters_to_ndarrays(initial_parameters)
 
         # Information for evaluation purposes.
         self._total_test_samples = None
         self._samples_per_class = None
-        # self.x_test, self.y_test = get_test_data(directory_of_data)
+        if self._centralized_shapley_values:
+            self.x_test, self.y_test = get_test_data(shapley_configuration["validation_data"])
         self.target_classes = possible_outputs
         self.clients_data_size_dict = None
 
@@ -172,7 +220,7 @@ class FedAvgRewritten(FedAvg):
             log(INFO, "No evaluation function provided")
             # No evaluation function provided
             return None
-        parameters_ndarrays = parameters_to_ndarrays(parameters)
+        parameters_ndarrays = decode_parameters(parameters_to_ndarrays(parameters))
         if server_round != 0:
             eval_res = self.evaluate_fn(server_round, parameters_ndarrays, {})
         else:
@@ -201,10 +249,12 @@ class FedAvgRewritten(FedAvg):
             config = self.on_fit_config_fn(server_round)
         fit_ins = FitIns(parameters, config)
 
-        if self._compute_shapley_values:
+        if self._clients_compute_shapley_values:
             config["compute_shapley_values"] = 1
         else:
             config["compute_shapley_values"] = 0
+        if self._transport_codec.enabled:
+            config.update(self._transport_codec.fit_config())
 
         # Sample clients
         sample_size, min_num_clients = self.num_fit_clients(
@@ -241,7 +291,6 @@ class FedAvgRewritten(FedAvg):
             return None, {}
 
         # Convert results
-        client_weights = dict()
         self._id_and_client_number: dict = {client.cid: fit_res.metrics.pop("client_number")
                                             for client, fit_res in results}
         log(INFO, f"Client id number: {self._id_and_client_number}")
@@ -253,22 +302,41 @@ class FedAvgRewritten(FedAvg):
              for client, fit_res in results}
         # log(INFO, f"Clients data sizes: {self.clients_data_size_dict}")
         clients_list: list = sorted(list(self.clients_data_size_dict.keys()))
+        # Every update is deserialized once and folded into the running sum. The serialized update of every
+        # client is only kept when the clients need it to compute the Shapley values, the deserialized one when
+        # the server computes them.
+        client_updates = dict()
+        client_weights = dict()
+        self._aggregator.reset()
         for client, fit_res in results:
-            client_weights[client.cid] = (parameters_to_ndarrays(fit_res.parameters), fit_res.num_examples)
+            weights = decode_parameters(parameters_to_ndarrays(fit_res.parameters), self._global_weights)
+            self._aggregator.add(weights, fit_res.num_examples)
+            if self._clients_compute_shapley_values and self._transport_codec.enabled:
+                # The updates are forwarded to the other clients as full weights.
+                client_updates[client.cid] = (ndarrays_to_parameters(weights).tensors, fit_res.num_examples)
+            elif self._clients_compute_shapley_values:
+                client_updates[client.cid] = (fit_res.parameters.tensors, fit_res.num_examples)
+            elif self._centralized_shapley_values:
+                client_weights[client.cid] = (weights, fit_res.num_examples)
 
         if server_round == 1 and self._final_training == 1:
             # for client, number_assigned in self._id_and_client_number.items():
             #     log(INFO, "Clients_id: {} and number assigned: {}".format(client, number_assigned))
 
             if self._compute_shapley_values == 1:
+                client_list = list(self._id_and_client_number.values())
                 self._dataset_metrics = SVCompatibleFlowerMetricManager(
+                    configuration_id=self._configuration_id,
                     metric_list=self._metric_list,
-                    client_list=list(self._id_and_client_number.values()),
+                    client_list=client_list,
                     number_of_rounds=self._max_round,
-                    classes=self.target_classes
+                    classes=self.target_classes,
+                    evaluating_clients=[SHAPLEY_MODE_CENTRALIZED, "Aggregated"]
+                    if self._centralized_shapley_values else client_list + ["Aggregated"]
                 )
             else:
                 self._dataset_metrics = FlowerMetricManager(
+                    configuration_id=self._configuration_id,
                     metric_list=self._metric_list,
                     client_list=list(self._id_and_client_number.values()),
                     number_of_rounds=self._max_round,
@@ -291,12 +359,11 @@ class FedAvgRewritten(FedAvg):
             # log(INFO, "Testing labels: {}".format(testing_labels))
 
         # We store here the weights, to then pass them to the clients.
-        self._clients_weights = client_weights
-        weights_results = [
-            (parameters_to_ndarrays(fit_res.parameters), fit_res.num_examples)
-            for client, fit_res in results
-        ]
-        new_model = aggregate_nn(weights_results)
+        if self._clients_compute_shapley_values:
+            self._weight_store.publish(client_updates, senders_hold=not self._transport_codec.enabled)
+        new_model = self._aggregator.result()
+        if self._centralized_shapley_values:
+            self._centralized_shapley_values_calculation(server_round, clients_list, client_weights, new_model)
         self._model.set_model(new_model)
         # list_of_metrics = evaluator(self.x_test, self.y_test, self._model, self._metric_list)
 
@@ -418,17 +485,65 @@ class FedAvgRewritten(FedAvg):
         #         log(INFO, "=" * 50)
 
         if self._final_training == 1:
-            # Saving model in pickle.
-            model_dir = "results/model/" + self._model_final_name
-            os.makedirs(model_dir, exist_ok=True)
             self._model.set_model(new_model)
-            model_to_save = self._model
-            save_model_with_tensorflow(model_dir, model_to_save.get_model())
+            if self._checkpoint_writer.should_checkpoint(server_round):
+                if self._checkpoint_model is None:
+                    self._checkpoint_model = clone_compiled_model(self._model.get_model())
+                # The result of the aggregator is fresh arrays that no later round writes to, so the writer can
+                # keep them without a copy.
+                self._checkpoint_writer.submit("results/model/" + self._model_final_name + ".keras", new_model)
+
+        if self._transport_codec.enabled:
+            # The reference of the next updates, fresh arrays as well.
+            self._global_weights = new_model
+            # The model of the last round is evaluated by the clients, is the baseline of their Shapley values and
+            # is the one checkpointed and uploaded, so it is sent without quantization: the reported metrics describe
+            # the delivered model. The checkpoints of earlier rounds are the full precision model of the server.
+            codec = self._transport_codec.lossless() if server_round == self._max_round else self._transport_codec
+            return ndarrays_to_parameters(codec.encode(new_model)), {}
 
         new_model_to_parameters = ndarrays_to_parameters(new_model)
 
         return new_model_to_parameters, {}
 
+    def _write_checkpoint(self, path, weights):
+        # Runs in the thread of the checkpoint writer, on a copy of the model that the rounds do not touch.
+        self._checkpoint_model.set_weights(weights)
+        self._checkpoint_model.save(path)
+
+    def _centralized_shapley_values_calculation(self, server_round, clients_list, client_weights, new_model):
+        """
+        Shapley values of the round on the validation split of the server. Every coalition is aggregated and
+        evaluated once for all the clients, and the global model of the round is the baseline of the next one.
+        """
+        if self._shapley_values is None:
+            config = {"num_rounds": self._max_round}
+            if self.on_evaluate_config_fn is not None:
+                config.update(self.on_evaluate_config_fn(server_round))
+            self._shapley_values = create_shapley_values(config, self.x_test, self.y_test, self._metric_list)
+            self._model.set_model(parameters_to_ndarrays(self.initial_parameters))
+            self._shapley_values.set_last_round_results(evaluator(self.x_test,
+                                                                  self.y_test,
+                                                                  self._model,
+                                                                  self._metric_list))
+            self._shapley_values.set_client_index_dictionary(self._id_and_client_number)
+
+        self._shapley_values.shapley_values_calculation(self._model, clients_list, client_weights, server_round)
+        self._model.set_model(new_model)
+        self._shapley_values.set_last_round_results(evaluator(self.x_test, self.y_test, self._model, self._metric_list))
+
+        if self._final_training == 1:
+            for evaluated_client_cid, sv in self._shapley_values.get_round_shapley_values(server_round).items():
+                evaluated_client = self._id_and_client_number[evaluated_client_cid]
+                for metric, value in sv.return_flower_dict().items():
+                    # There is a single evaluator, so the aggregated Shapley values are the centralized ones.
+                    for evaluating_client in (SHAPLEY_MODE_CENTRALIZED, "Aggregated"):
+                        self._dataset_metrics.add_shapley_value(metric,
+                                                                evaluating_client,
+                                                                evaluated_client,
+                                                                server_round,
+                                                                value)
+
     def configure_evaluate(
             self, server_round: int, parameters: Parameters, client_manager: ClientManager
     ) -> List[Tuple[ClientProxy, EvaluateIns]]:
@@ -444,13 +559,11 @@ class FedAvgRewritten(FedAvg):
             # Custom evaluation config function provided
             # config = self.on_evaluate_config_fn(server_round, self._clients_weights)
             config = self.on_evaluate_config_fn(server_round)
-            if self._compute_shapley_values:
+            if self._clients_compute_shapley_values:
                 config["compute_shapley_values"] = 1
                 config["client_cid_number"] = str(self._id_and_client_number)
                 # _, total_dataset_y = get_test_data()
                 config["total_num_of_classes"] = len(self.target_classes)
-                # TODO: Change from pickle to data for configurations.
-                config["pickled_client_weights"] = pickle.dumps(self._clients_weights)
                 # log(INFO, f"Serializing: {str(self._clients_weights)}")
                 # config["all_models_from_clients"] = str(self._clients_weights)
             else:
@@ -461,7 +574,6 @@ class FedAvgRewritten(FedAvg):
             else:
                 config["last_round"] = 0
         # log(INFO, "EvaluateIns")
-        evaluate_ins = EvaluateIns(parameters, config)
 
         # Sample clients
         sample_size, min_num_clients = self.num_evaluation_clients(
@@ -472,6 +584,11 @@ class FedAvgRewritten(FedAvg):
         )
         # log(INFO, "Ending configure evaluate")
         # Return client/config pairs
+        if config.get("compute_shapley_values") == 1:
+            # Each client only receives the updates it does not hold yet.
+            return [(client, EvaluateIns(parameters, config | self._weight_store.config_for(client.cid)))
+                    for client in clients]
+        evaluate_ins = EvaluateIns(parameters, config)
         return [(client, evaluate_ins) for client in clients]
 
     def normalize_metric(self, value, client_samples, total_samples):
@@ -525,6 +642,10 @@ class FedAvgRewritten(FedAvg):
         #                 for client, res in results}
         # log(INFO, f"Res metrics: {[res.metrics for client, res in results]}")
 
+        for client, res in results:
+            if HELD_WEIGHTS_KEY in res.metrics:
+                self._weight_store.acknowledge(client.cid, res.metrics[HELD_WEIGHTS_KEY])
+
         eval_metrics = {client.cid: dict(
             (k, ast.literal_eval(v))
             for k, v in res.metrics.items()
@@ -532,7 +653,7 @@ class FedAvgRewritten(FedAvg):
         ) for client, res in results}
         # log(INFO, f"Eval metrics: {eval_metrics}")
         sv_metrics = {client.cid: dict(
-            (evaluating_client.split('_')[1], from_string_to_dict(v))
+            (evaluating_client.split('_')[1], decode_metric_values(v))
             for evaluating_client, v in res.metrics.items()
             if "SV" in evaluating_client
         ) for client, res in results}
@@ -570,19 +691,13 @@ class FedAvgRewritten(FedAvg):
                                                            len(self.target_classes)).return_flower_dict()
              for client_number in self._id_and_client_number.values()}
 
-        if self._compute_shapley_values == 1:
+        if self._clients_compute_shapley_values:
             log(INFO, "")
             for evaluating_client_cid, sv_evaluating_client in sv_metrics.items():
                 evaluating_client_number = self._id_and_client_number[evaluating_client_cid]
                 for client_evaluated_cid, sv_evaluated_client in sv_evaluating_client.items():
                     evaluated_client_number = self._id_and_client_number[client_evaluated_cid]
                     for metric, value in sv_evaluated_client.items():
-                        if '[' in value:
-                            value = [float(evaluated_value)
-                                     for evaluated_value
-                                     in ast.literal_eval(value)]
-                        else:
-                            value = float(value)
                         self._dataset_metrics.add_shapley_value(metric,
                                                                 evaluating_client_number,
                                                                 evaluated_client_number,
@@ -606,6 +721,8 @@ class FedAvgRewritten(FedAvg):
 
         if self._final_training == 1 and server_round == self._max_round:
             self._dataset_metrics.save_dataframes_as_csv(self._result_path)
-            send_results_to_governance_platform(self._result_path.split("/")[-1], "mlp")
+            # The model of the last round is uploaded with the results.
+            self._checkpoint_writer.close()
+            send_results_to_governance_platform(self._configuration_id, "mlp")
 
         return loss_aggregated, metrics_aggregated
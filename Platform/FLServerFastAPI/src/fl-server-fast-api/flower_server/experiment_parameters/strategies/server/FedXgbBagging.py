@@ -1,7 +1,6 @@
 import ast
 import json
 import os
-import pickle
 from functools import partial, reduce
 from logging import WARNING, INFO
 from typing import Callable, Dict, List, Optional, Tuple, Union, cast
@@ -16,14 +15,16 @@ from flwr.server.strategy import FedAvg
 from flwr.server.strategy.aggregate import weighted_loss_avg
 
 from Definitions import ROOT_DIR
-from experiment_parameters.aggregation_processes.aggregate import aggregate_xgboost
+from experiment_parameters.aggregation_processes.aggregate import XGBoostBaggingAggregator
 from experiment_parameters.model_builder.Model import XGBoostModel
 from metrics.Evaluator import evaluator
+from metrics.MetricCodec import decode_metric_values
 from metrics.Metrics import return_default_dict_of_metrics
 from metrics.ResultManager import FlowerMetricManager, SVCompatibleFlowerMetricManager
 from metrics.Shapley_Values import ShapleyValuesDT
-from util.Util import save_data_on_pickle, load_data_from_pickle_file, from_string_to_dict
+from util.Util import save_data_on_pickle, load_data_from_pickle_file
 from util.UploadResults import send_results_to_governance_platform
+from util.WeightStore import WeightStore, HELD_WEIGHTS_KEY
 
 
 class FedXgbBagging(FedAvg):
@@ -62,6 +63,9 @@ class FedXgbBagging(FedAvg):
             on_evaluate_config_fn: Optional[Callable[[int], Dict[str, Scalar]]] = None,
             accept_failures: bool = True,
             initial_parameters: Optional[Parameters] = None,
+            shapley_configuration: Optional[dict] = None,
+            checkpoint_configuration: Optional[dict] = None,
+            transport_configuration: Optional[dict] = None,
     ):
         super().__init__()
         self.fraction_fit = fraction_fit
@@ -83,12 +87,20 @@ class FedXgbBagging(FedAvg):
         # self._gradient_rewards = gradient_rewards
         self._metric_list = metric_list
         self._dict_of_trees = None
+        # Trees of the clients of the last round, served to the clients that compute the Shapley values.
+        self._weight_store = WeightStore()
         self._max_round = max_round
         self._compute_shapley_values = compute_shapley_values
+        if shapley_configuration is not None and shapley_configuration.get("mode", "Clients") != "Clients":
+            # The baseline of the first round is the local model of each client, the server has none.
+            log(WARNING, "The Shapley values of XGBoost are only computed by the clients")
         self._model_final_name = model_final_name
         self.evaluate_function = None
         self.global_model: Optional[bytes] = None
+        # Parsed global model, the trees of every round are appended to it.
+        self._bagging_aggregator = XGBoostBaggingAggregator()
         self._result_path = result_path
+        self._configuration_id = os.path.basename(result_path)
         # self.x_test, self.y_test = self._evaluation_dataset.get_test_data()
         self.target_classes = possible_outputs
         self.clients_data_size_dict = None
@@ -165,17 +177,20 @@ class FedXgbBagging(FedAvg):
 
         self._dict_of_trees: Dict[str, Optional[list[bytes]]] = {client.cid: fit_res.parameters.tensors
                                                                  for client, fit_res in results}
+        if self._compute_shapley_values:
+            self._weight_store.publish({client.cid: (fit_res.parameters.tensors, fit_res.num_examples)
+                                        for client, fit_res in results})
         # dict_of_trees["former_global_model"] = self.global_model
 
         # Aggregate all the client trees
         log(INFO, f"Aggregating")
-        global_model = self.global_model
         bsts = [[bst for bst in fit_res.parameters.tensors] for client, fit_res in results]
         # for client, fit_res in results:
         #     log(INFO, f"Updating with client {client.cid}")
         #     update = fit_res.parameters.tensors
         #     bsts = [bst for bst in update]
-        global_model = aggregate_xgboost(bsts, global_model)
+        self._bagging_aggregator.add_all(bsts)
+        global_model = self._bagging_aggregator.to_bytes()
 
         log(INFO, f"Storing model")
         self.global_model = global_model
@@ -187,6 +202,7 @@ class FedXgbBagging(FedAvg):
         if self._final_training == 1 and server_round == 1:
             if self._compute_shapley_values == 1:
                 self._dataset_metrics = SVCompatibleFlowerMetricManager(
+                    configuration_id=self._configuration_id,
                     metric_list=self._metric_list,
                     client_list=list(self._id_and_client_number.values()),
                     number_of_rounds=self._max_round,
@@ -194,6 +210,7 @@ class FedXgbBagging(FedAvg):
                 )
             else:
                 self._dataset_metrics = FlowerMetricManager(
+                    configuration_id=self._configuration_id,
                     metric_list=self._metric_list,
                     client_list=list(self._id_and_client_number.values()),
                     number_of_rounds=self._max_round,
@@ -312,8 +329,6 @@ class FedXgbBagging(FedAvg):
                 config["client_cid_number"] = str(self._id_and_client_number)
                 # _, total_dataset_y = self._evaluation_dataset.get_test_data()
                 config["total_num_of_classes"] = len(self.target_classes)
-                # TODO: Change from pickle to data for configurations.
-                config["pickled_client_weights"] = pickle.dumps(self._dict_of_trees)
                 # log(INFO, f"Serializing: {str(self._clients_weights)}")
                 # config["all_models_from_clients"] = str(self._clients_weights)
             else:
@@ -324,7 +339,6 @@ class FedXgbBagging(FedAvg):
             else:
                 config["last_round"] = 0
         log(INFO, "EvaluateIns")
-        evaluate_ins = EvaluateIns(parameters, config)
 
         # Sample clients
         sample_size, min_num_clients = self.num_evaluation_clients(
@@ -334,6 +348,11 @@ class FedXgbBagging(FedAvg):
             num_clients=sample_size, min_num_clients=min_num_clients
         )
         log(INFO, "Ending configure evaluate")
+        if config.get("compute_shapley_values") == 1:
+            # Each client only receives the trees it does not hold yet.
+            return [(client, EvaluateIns(parameters, config | self._weight_store.config_for(client.cid)))
+                    for client in clients]
+        evaluate_ins = EvaluateIns(parameters, config)
         return [(client, evaluate_ins) for client in clients]
 
     def normalize_metric(self, value, client_samples, total_samples):
@@ -383,6 +402,10 @@ class FedXgbBagging(FedAvg):
 
         log(INFO, f"Res metrics: {[res.metrics for client, res in results]}")
 
+        for client, res in results:
+            if HELD_WEIGHTS_KEY in res.metrics:
+                self._weight_store.acknowledge(client.cid, res.metrics[HELD_WEIGHTS_KEY])
+
         eval_metrics = {client.cid: dict(
             (k, ast.literal_eval(v))
             for k, v in res.metrics.items()
@@ -390,7 +413,7 @@ class FedXgbBagging(FedAvg):
         ) for client, res in results}
         log(INFO, f"Eval metrics: {eval_metrics}")
         sv_metrics = {client.cid: dict(
-            (evaluating_client.split('_')[1], from_string_to_dict(v))
+            (evaluating_client.split('_')[1], decode_metric_values(v))
             for evaluating_client, v in res.metrics.items()
             if "SV" in evaluating_client
         ) for client, res in results}
@@ -434,12 +457,6 @@ class FedXgbBagging(FedAvg):
                 for client_evaluated_cid, sv_evaluated_client in sv_evaluating_client.items():
                     evaluated_client_number = self._id_and_client_number[client_evaluated_cid]
                     for metric, value in sv_evaluated_client.items():
-                        if '[' in value:
-                            value = [float(evaluated_value)
-                                     for evaluated_value
-                                     in ast.literal_eval(value)]
-                        else:
-                            value = float(value)
                         self._dataset_metrics.add_shapley_value(metric,
                                                                 evaluating_client_number,
                                                                 evaluated_client_number,
@@ -463,7 +480,7 @@ class FedXgbBagging(FedAvg):
 
         if self._final_training == 1 and server_round == self._max_round:
             self._dataset_metrics.save_dataframes_as_csv(self._result_path)
-            send_results_to_governance_platform(self._result_path.split("/")[-1], "mlp")
+            send_results_to_governance_platform(self._configuration_id, "mlp")
 
         return loss_aggregated, metrics_aggregated
 
@@ -1,7 +1,11 @@
 import ast
+import json
 import os
+import zipfile
 from logging import INFO
+from typing import Dict, List
 
+import numpy as np
 import pandas as pd
 from flwr.common import log
 
@@ -30,14 +34,54 @@ def get_aggregated_sv_clients(dataframe_sv):
     return dataframe_sv
 
 
+# Archive with every result frame of a configuration, uploaded to the governance platform in one request. Its
+# members are the CSVs of the frames, "<frame name>.csv", and a manifest with the layout of each one.
+RESULT_BUNDLE_NAME = "results.zip"
+RESULT_BUNDLE_MANIFEST = "manifest.json"
+
+
+def _number_of_values(metric, classes) -> int:
+    if type_of_metric.get(metric) == "Single":
+        return 1
+    elif type_of_metric.get(metric) == "Multiple":
+        return len(classes)
+    raise Exception(f"Metric {metric} is not supported. Please, add it into the dictionary"
+                    f"of file ResultManager.")
+
+
+def _label_position(labels: List, label_index: Dict, label, arrays: Dict[str, np.ndarray], axis: int) -> int:
+    """
+    Position of the label on the given axis of the arrays. Unknown labels are appended, and the arrays grow
+    with an empty (NaN) slot, like a DataFrame does when .loc assigns a new row or column.
+    """
+    if label not in label_index:
+        label_index[label] = len(labels)
+        labels.append(label)
+        for key, values in arrays.items():
+            pad_width = [(0, 0)] * values.ndim
+            pad_width[axis] = (0, 1)
+            arrays[key] = np.pad(values, pad_width, constant_values=np.nan)
+    return label_index[label]
+
+
 class FlowerMetricManager:
+    """
+    Evaluation results of every round of one training configuration. The results are kept in dense float arrays
+    of shape (rounds, evaluators, values of the metric) and only turned into DataFrames to be returned or saved.
+
+    Every instance owns its results, so a process can run the strategies of several configurations, one after the
+    other or at the same time, without sharing or keeping the results of another one.
+    """
+    configuration_id: str
     metric_list: list[str]
     client_list: list[str]
     number_of_rounds: int
     list_classes: list[str]
-    evaluation_results = {}
+    _evaluators: list
+    _evaluation_values: Dict[str, np.ndarray]
 
-    def __init__(self, metric_list, client_list, number_of_rounds, classes):
+    def __init__(self, configuration_id, metric_list, client_list, number_of_rounds, classes):
+        self.configuration_id = configuration_id
         self.metric_list = metric_list
         # if metric_list is None:
         #     self.metric_list = ["CrossEntropyLoss", "Accuracy", "AUC"]
@@ -46,104 +90,103 @@ class FlowerMetricManager:
         self.client_list = client_list
         self.number_of_rounds = number_of_rounds
         self.list_classes = classes
-        log(INFO, f"Classes: {self.list_classes}")
+        log(INFO, f"Classes of configuration {self.configuration_id}: {self.list_classes}")
 
-        for metric in self.metric_list:  # FML is used to separate evaluation results from the SV results.
-            if type_of_metric[metric] == "Single":
-                self.evaluation_results["Evaluation_" + metric] = (
-                    pd.DataFrame(index=[i for i in range(1, number_of_rounds + 1)],
-                                 columns=self.client_list + ["Aggregated"]))
-                                 # columns=self.client_list + ["Global", "Aggregated"]))
-                self.evaluation_results["Evaluation_" + metric].sort_index(inplace=True)
-            elif type_of_metric[metric] == "Multiple":
-                # evaluating_clients = self.client_list + ["Global", "Aggregated"]
-                evaluating_clients = self.client_list + ["Aggregated"]
-                multiIndex_Columns = pd.MultiIndex.from_product([evaluating_clients,
-                                                                 self.list_classes])
-                self.evaluation_results["Evaluation_" + metric] = (
-                    pd.DataFrame(index=[i for i in range(1, number_of_rounds + 1)],
-                                 columns=multiIndex_Columns))
-                self.evaluation_results["Evaluation_" + metric].sort_index(inplace=True)
-            else:
-                raise Exception(f"Metric {metric} is not supported. Please, add it into the dictionary"
-                                f"of file ResultManager.")
+        # self._evaluators = self.client_list + ["Global", "Aggregated"]
+        self._evaluators = self.client_list + ["Aggregated"]
+        self._evaluator_index = {evaluator: position for position, evaluator in enumerate(self._evaluators)}
+        # FML is used to separate evaluation results from the SV results.
+        self._evaluation_values = {
+            metric: np.full((number_of_rounds, len(self._evaluators), _number_of_values(metric, classes)), np.nan)
+            for metric in self.metric_list
+        }
 
     def add_result(self, metric, client, round, value):
         # log(INFO, f"Metric for round {round}.  Metric: {metric} \t Value: {value}")
-        # if type(value) is str:
-        #     evaluted_metric = ast.literal_eval(metric)
-        #     log(INFO, f"Type of metric after eval: {type(evaluted_metric)}")
-        if type(value) is list:
-            for label in range(len(value)):
-                self.evaluation_results["Evaluation_" + metric].loc[round, (client, self.list_classes[label])] = value[
-                    label]
-        else:
-            self.evaluation_results["Evaluation_" + metric].loc[round, client] = value
+        position = _label_position(self._evaluators, self._evaluator_index, client, self._evaluation_values, 1)
+        self._evaluation_values[metric][round - 1, position] = np.asarray(value, dtype=np.float64)
 
     def get_global_dataframes(self):
-        return self.evaluation_results
-
-    def save_dataframes_as_csv(self, path):
-        evaluation_dir_path = path + os.sep + "Evaluation"
-        os.makedirs(evaluation_dir_path, exist_ok=True)
-        for metric, dataframe in self.evaluation_results.items():
-            dataframe.to_csv(evaluation_dir_path + os.sep + metric, float_format='%.15f')
+        evaluation_results = {}
+        rounds = [i for i in range(1, self.number_of_rounds + 1)]
+        for metric, values in self._evaluation_values.items():
+            if type_of_metric[metric] == "Single":
+                columns = pd.Index(self._evaluators)
+            else:
+                columns = pd.MultiIndex.from_product([self._evaluators, self.list_classes])
+            evaluation_results["Evaluation_" + metric] = pd.DataFrame(values.reshape(len(rounds), -1),
+                                                                      index=rounds,
+                                                                      columns=columns)
+        return evaluation_results
+
+    def get_result_dataframes(self):
+        """Every frame of the manager, by the directory in which it is saved."""
+        return {"Evaluation": self.get_global_dataframes()}
+
+    def save_dataframes_as_csv(self, path=None):
+        """
+        Saves every frame as a CSV in its directory, and all of them in the result bundle of the configuration.
+        Each CSV is formatted once for both.
+        """
+        if path is None:
+            path = "results" + os.sep + self.configuration_id
+        os.makedirs(path, exist_ok=True)
+        manifest = {}
+        with zipfile.ZipFile(path + os.sep + RESULT_BUNDLE_NAME, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+            for directory, dataframes in self.get_result_dataframes().items():
+                os.makedirs(path + os.sep + directory, exist_ok=True)
+                for name, dataframe in dataframes.items():
+                    csv = dataframe.to_csv(float_format='%.15f')
+                    with open(path + os.sep + directory + os.sep + name, "w") as file:
+                        file.write(csv)
+                    bundle.writestr(name + ".csv", csv)
+                    manifest[name] = {"header_rows": dataframe.columns.nlevels,
+                                      "index_columns": dataframe.index.nlevels}
+            bundle.writestr(RESULT_BUNDLE_MANIFEST, json.dumps(manifest))
+        return path + os.sep + RESULT_BUNDLE_NAME
 
 
 class SVCompatibleFlowerMetricManager(FlowerMetricManager):
-    sv_results = {}
-
-    def __init__(self, metric_list, client_list, number_of_rounds, classes):
-        super().__init__(metric_list, client_list, number_of_rounds, classes)
+    """
+    Adds the Shapley values of every round, kept in arrays of shape
+    (rounds + 1, evaluating clients, evaluated clients, values of the metric).
+    """
+    _evaluating_clients: list
+    _evaluated_clients: list
+    _sv_values: Dict[str, np.ndarray]
+
+    def __init__(self, configuration_id, metric_list, client_list, number_of_rounds, classes, evaluating_clients=None):
+        """
+        :param evaluating_clients: Rows of the Shapley values of every round. By default, every client and the
+        aggregation of their Shapley values.
+        """
+        super().__init__(configuration_id, metric_list, client_list, number_of_rounds, classes)
+        if evaluating_clients is None:
+            # evaluating_clients = client_list + ["Centralized", "Aggregated"]
+            evaluating_clients = client_list + ["Aggregated"]
+        self._evaluating_clients = list(evaluating_clients)
+        self._evaluating_client_index = {client: position for position, client in enumerate(evaluating_clients)}
+        self._evaluated_clients = list(client_list)
+        self._evaluated_client_index = {client: position for position, client in enumerate(client_list)}
         metrics_and_sv_methods = self.metric_list + ["CosineSimilarity"]
-        for metric in metrics_and_sv_methods:  # FML is used to separate evaluation results from the SV results.
-            if type_of_metric[metric] == "Single":
-                multiple_index_one_class = pd.MultiIndex.from_product(
-                    [[i for i in range(number_of_rounds + 1)], client_list + ["Aggregated"]],
-                    # [[i for i in range(number_of_rounds + 1)], client_list + ["Centralized", "Aggregated"]],
-                    names=["Round", "Evaluator"],
-                )
-                self.sv_results["SV_" + metric] = (
-                    pd.DataFrame(index=multiple_index_one_class,
-                                 columns=client_list))
-                self.sv_results["SV_" + metric].sort_index(inplace=True)
-            elif type_of_metric[metric] == "Multiple":
-                multiple_index_multiple_classes = pd.MultiIndex.from_product(
-                    [[i for i in range(number_of_rounds + 1)],
-                     client_list + ["Aggregated"],
-                     # client_list + ["Centralized", "Aggregated"],
-                     self.list_classes],
-                    names=["Round", "Evaluator", "Classes"],
-                )
-                self.sv_results["SV_" + metric] = (
-                    pd.DataFrame(index=multiple_index_multiple_classes,
-                                 columns=client_list))
-                self.sv_results["SV_" + metric].sort_index(inplace=True)
-            else:
-                raise Exception(f"Metric {metric} is not supported. Please, add it into the dictionary"
-                                f"of file ResultManager.")
-            # self.evaluation_results["SV_Centralized_" + metric] = (
-            #     pd.DataFrame(index=[i for i in range(number_of_rounds + 1)],
-            #                  columns=["Global"]))
-            # self.evaluation_results["SV_Decentralized_" + metric] = (
-            #     pd.DataFrame(index=[i for i in range(number_of_rounds + 1)],
-            #                  columns=["Global"]))
+        self._sv_values = {
+            metric: np.full((number_of_rounds + 1,
+                             len(self._evaluating_clients),
+                             len(self._evaluated_clients),
+                             _number_of_values(metric, classes)), np.nan)
+            for metric in metrics_and_sv_methods
+        }
 
     def add_shapley_value(self, metric, evaluating_client, evaluated_client, round, value):
         # log(INFO, f"Shapley Values for round {round},"
         #           f" from evaluating client {evaluating_client}"
         #           f" to evaluated client {evaluated_client}.  Metric: {metric} \t Value: {value}")
-        # log(INFO, f"Type of metric: {type(metric)}")
-        # log(INFO, f"Type of metric: {type(ast.literal_eval(metric))}")
-        if type(value) is list:
-            for label in range(len(value)):
-                self.sv_results["SV_" + metric].loc[
-                    (round, evaluating_client, self.list_classes[label]), evaluated_client
-                ] = value[label]
-        else:
-            self.sv_results["SV_" + metric].loc[
-                (round, evaluating_client), evaluated_client
-            ] = value
+        evaluating_position = _label_position(self._evaluating_clients, self._evaluating_client_index,
+                                              evaluating_client, self._sv_values, 1)
+        evaluated_position = _label_position(self._evaluated_clients, self._evaluated_client_index,
+                                             evaluated_client, self._sv_values, 2)
+        self._sv_values[metric][round, evaluating_position, evaluated_position] = np.asarray(value,
+                                                                                             dtype=np.float64)
 
     # def process_shapley_value_dict(self, dictionary, evaluating_client, round):
     #     for client, sv in dictionary.items():
@@ -152,14 +195,24 @@ class SVCompatibleFlowerMetricManager(FlowerMetricManager):
     #             self.add_shapley_value(metric, evaluating_client, client, round, value)
 
     def get_sv_dataframes(self):
-        return self.sv_results
-
-    def save_dataframes_as_csv(self, path):
-        super().save_dataframes_as_csv(path)
-        sv_dir_path = path + os.sep + "Shapley_Value"
-        os.makedirs(sv_dir_path, exist_ok=True)
-        for metric, dataframe in self.get_sv_dataframes().items():
-            dataframe.to_csv(sv_dir_path + os.sep + metric, float_format='%.15f')
+        sv_results = {}
+        rounds = [i for i in range(self.number_of_rounds + 1)]
+        for metric, values in self._sv_values.items():
+            if type_of_metric[metric] == "Single":
+                index = pd.MultiIndex.from_product([rounds, self._evaluating_clients],
+                                                   names=["Round", "Evaluator"])
+            else:
+                index = pd.MultiIndex.from_product([rounds, self._evaluating_clients, self.list_classes],
+                                                   names=["Round", "Evaluator", "Classes"])
+            # Rows: round, evaluating client and class. Columns: evaluated client.
+            rows = np.moveaxis(values, 2, 3).reshape(-1, len(self._evaluated_clients))
+            sv_results["SV_" + metric] = pd.DataFrame(rows,
+                                                      index=index,
+                                                      columns=self._evaluated_clients).sort_index()
+        return sv_results
+
+    def get_result_dataframes(self):
+        return super().get_result_dataframes() | {"Shapley_Value": self.get_sv_dataframes()}
 
 # class MetricManager(ABC):
 #     metric_list: List[str]
@@ -0,0 +1,95 @@
+"""
+Background writer of the model checkpoints of the final training.
+
+The queue of the writer holds a single pending checkpoint: a newer checkpoint replaces the one that is still
+waiting, so the rounds never wait for the disk and only the latest model is written. Every checkpoint is written
+to a temporary file in the same directory and renamed over the former one, so a reader never finds a half
+written file.
+"""
+import os
+import threading
+from logging import WARNING
+from typing import Callable, Optional, Tuple
+
+from flwr.common.logger import log
+
+TEMPORARY_PREFIX = "tmp-"
+
+
+class CheckpointWriter:
+    _pending: Optional[Tuple[str, object]]
+
+    def __init__(self,
+                 write_function: Callable[[str, object], None],
+                 last_round: int,
+                 every_n_rounds: int = 1,
+                 last_only: bool = False):
+        """
+        :param write_function: Writes a checkpoint to the given path. It runs in the thread of the writer.
+        :param last_round: Last round of the training, it is always written.
+        :param every_n_rounds: Rounds between two checkpoints.
+        :param last_only: Only the last round is written.
+        """
+        if every_n_rounds < 1:
+            raise ValueError(f"every_n_rounds must be at least 1, got {every_n_rounds}")
+        self._write_function = write_function
+        self._last_round = last_round
+        self._every_n_rounds = every_n_rounds
+        self._last_only = last_only
+        self._pending = None
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def should_checkpoint(self, server_round: int) -> bool:
+        if server_round == self._last_round:
+            return True
+        return not self._last_only and server_round % self._every_n_rounds == 0
+
+    def submit(self, path: str, checkpoint) -> bool:
+        """
+        Queues the checkpoint and returns at once. The checkpoint must not be modified afterwards.
+        Returns whether a pending checkpoint was replaced.
+        """
+        with self._condition:
+            replaced = self._pending is not None
+            self._pending = (path, checkpoint)
+            self._condition.notify_all()
+        return replaced
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the checkpoints submitted so far are written. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._writing, timeout)
+
+    def close(self):
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None:
+                    return
+                path, checkpoint = self._pending
+                self._pending = None
+                self._writing = True
+            try:
+                directory, name = os.path.split(path)
+                # The extension is kept, some writers (e.g. Keras) choose the format by it.
+                temporary_path = os.path.join(directory, TEMPORARY_PREFIX + name)
+                os.makedirs(directory or ".", exist_ok=True)
+                self._write_function(temporary_path, checkpoint)
+                os.replace(temporary_path, path)
+            except Exception as exception:
+                log(WARNING, f"Checkpoint {path} could not be written: {exception}")
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
@@ -1,48 +1,171 @@
+"""
+Upload of the results of a training configuration to the governance platform.
+
+The uploads run in a small thread pool, so the strategy that finishes the last round does not wait for the network.
+All of them share one pooled HTTP session and one Keycloak token, which is only requested again shortly before it
+expires or when the platform rejects it. Failed uploads are retried with exponential backoff, and every request of
+the same file carries the same idempotency key, so a retry of an upload that did arrive is not stored twice.
+"""
+import hashlib
 import os.path
-from os import listdir
-from os.path import isfile, join
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import List, Optional
 from uuid import UUID
 
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 import yaml
 
 from flwr.common.logger import log
 from logging import WARNING, INFO
 
-def get_token():
-    log(INFO, f"Current directory: {os.getcwd()}")
-    with open("src/fl-server-fast-api/flower_server/secrets.yaml", "r") as f:
-        secrets = yaml.safe_load(f)
+from metrics.ResultManager import RESULT_BUNDLE_NAME
+
+TOKEN_URL = "http://kc:8080/auth/realms/fml/protocol/openid-connect/token"
+RESULTS_URL = "http://rest-api:5100/api1/results/"
+SECRETS_PATH = "src/fl-server-fast-api/flower_server/secrets.yaml"
+
+MAX_PARALLEL_UPLOADS = 4
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 0.5
+REQUEST_TIMEOUT_SECONDS = 60
+# The token is requested again when it expires in less than this.
+TOKEN_EXPIRY_MARGIN_SECONDS = 30
+RETRIED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CachedToken:
+    """Client credentials token of the Flower server, shared by the threads of the uploader."""
+
+    def __init__(self, session, client_secret: Optional[str] = None):
+        self._session = session
+        self._client_secret = client_secret
+        self._access_token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        with self._lock:
+            if self._access_token is None or time.monotonic() >= self._expires_at - TOKEN_EXPIRY_MARGIN_SECONDS:
+                self._request_token()
+            return self._access_token
+
+    def invalidate(self):
+        with self._lock:
+            self._access_token = None
+
+    def _request_token(self):
+        if self._client_secret is None:
+            with open(SECRETS_PATH, "r") as f:
+                self._client_secret = yaml.safe_load(f)["keycloak_secret"]
+        response = self._session.post(TOKEN_URL,
+                                      data={
+                                          "grant_type": "client_credentials",
+                                          "client_id": "flower-server",
+                                          "client_secret": self._client_secret
+                                      },
+                                      timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        token = response.json()
+        self._access_token = token["access_token"]
+        self._expires_at = time.monotonic() + token.get("expires_in", 60)
+
 
-    response: Response = requests.post("http://kc:8080/auth/realms/fml/protocol/openid-connect/token",
-                                 data={
-                                     "grant_type": "client_credentials",
-                                     "client_id": "flower-server",
-                                     "client_secret": secrets["keycloak_secret"]
-                                 })
-    access_token = response.json()['access_token']
-    return access_token
+class ResultsUploader:
+    """Uploads files to the results endpoints of the governance platform, off the thread that submits them."""
 
+    def __init__(self,
+                 session=None,
+                 token: Optional[CachedToken] = None,
+                 max_parallel_uploads: int = MAX_PARALLEL_UPLOADS,
+                 max_retries: int = MAX_RETRIES,
+                 backoff_seconds: float = BACKOFF_SECONDS):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_parallel_uploads)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self._session = session
+        self._token = token if token is not None else CachedToken(session)
+        self._max_retries = max_retries
+        self._backoff_seconds = backoff_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel_uploads, thread_name_prefix="results-upload")
+        self._pending: List[Future] = []
+        self._pending_lock = threading.Lock()
 
-def send_results_to_governance_platform(training_configuration, type_of_model: str = "mlp"):
-    token = get_token()
+    def submit(self, endpoint: str, file_path: str, filename: str, content_type: str) -> Future:
+        future = self._executor.submit(self.upload, endpoint, file_path, filename, content_type)
+        with self._pending_lock:
+            self._pending = [pending for pending in self._pending if not pending.done()] + [future]
+        return future
+
+    def upload(self, endpoint: str, file_path: str, filename: str, content_type: str) -> Optional[Response]:
+        """Uploads the file, retrying failed attempts. Returns the last response, None if none was received."""
+        with open(file_path, "rb") as f:
+            content = f.read()
+        idempotency_key = hashlib.sha256(endpoint.encode() + b"\0" + content).hexdigest()
+        response = None
+        for attempt in range(self._max_retries + 1):
+            if attempt > 0:
+                time.sleep(self._backoff_seconds * 2 ** (attempt - 1))
+            try:
+                response = self._session.post(RESULTS_URL + endpoint,
+                                              headers={"Authorization": "Bearer " + self._token.get(),
+                                                       "Idempotency-Key": idempotency_key},
+                                              files={"file": (filename, content, content_type)},
+                                              timeout=REQUEST_TIMEOUT_SECONDS)
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                log(WARNING, f"Upload of {filename} failed (attempt {attempt + 1}): {exception}")
+                continue
+            if response.status_code == 401:
+                self._token.invalidate()
+            elif response.status_code not in RETRIED_STATUS_CODES:
+                break
+            log(WARNING, f"Upload of {filename} failed (attempt {attempt + 1}): HTTP {response.status_code}")
+
+        if response is None or response.status_code >= 400:
+            log(WARNING, f"Upload of {filename} to {endpoint} did not succeed")
+        return response
+
+    def wait(self, timeout: Optional[float] = None):
+        """Blocks until the uploads submitted so far are finished."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        done, not_done = wait(pending, timeout=timeout)
+        for future in done:
+            if future.exception() is not None:
+                log(WARNING, f"Upload of results failed: {future.exception()}")
+        if not_done:
+            log(WARNING, f"{len(not_done)} uploads of results did not finish in time")
+
+
+_uploader: Optional[ResultsUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_results_uploader() -> ResultsUploader:
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = ResultsUploader()
+        return _uploader
+
+
+def send_results_to_governance_platform(training_configuration, type_of_model: str = "mlp") -> List[Future]:
+    """
+    Submits the upload of the result bundle and of the final model, and returns without waiting for them.
+    wait_for_result_uploads blocks until they are finished.
+    """
+    uploader = get_results_uploader()
     directory = "results" + os.sep + training_configuration
-    list_of_files = [{f: os.path.join(directory + '/Evaluation', f)}
-                     for f in listdir(directory + '/Evaluation')
-                     if isfile(join(directory + '/Evaluation', f))]
-    list_of_sv_files = []
-    if os.path.isdir(directory + '/Shapley_Value'):
-        list_of_sv_files = [{f: os.path.join(directory + '/Shapley_Value', f)}
-                            for f in listdir(directory + '/Shapley_Value')
-                            if isfile(join(directory + '/Shapley_Value', f))]
-    list_of_files = list_of_files + list_of_sv_files
-    for evaluation_file in list_of_files:
-        for filename, file in evaluation_file.items():
-            with open(file, "rb") as f:
-                requests.post('http://rest-api:5100/api1/results/evaluations/' + training_configuration,
-                              headers={'Authorization': 'Bearer ' + token},
-                              files={"file": (filename, f, "application/csv")})
+    # All the evaluation and Shapley value frames go in one request, as the bundle saved by the metric manager.
+    futures = [uploader.submit("bundles/" + training_configuration,
+                               directory + os.sep + RESULT_BUNDLE_NAME,
+                               RESULT_BUNDLE_NAME,
+                               "application/zip")]
 
     if type_of_model == "xgboost":
         model_name = training_configuration + ".json"
@@ -50,10 +173,7 @@ def send_results_to_governance_platform(training_configuration, type_of_model: s
         model_name = training_configuration + ".keras"
 
     model_file = "results/model/" + model_name
-    with open(model_file, "rb") as f:
-        requests.post('http://rest-api:5100/api1/results/models/' + training_configuration,
-                      headers={'Authorization': 'Bearer ' + token},
-                      files={"file": (model_name, f, "application/file")})
+    futures.append(uploader.submit("models/" + training_configuration, model_file, model_name, "application/file"))
 
     # with open("configuration.yaml", "r") as f:
     #     configuration = yaml.safe_load(f)
@@ -65,6 +185,12 @@ def send_results_to_governance_platform(training_configuration, type_of_model: s
     #                   "metric_used": configuration["metric_name"],
     #                   "shapley_values": True if configuration["compute_shapley_values"] == 1 else False
     #               })
+    return futures
+
+
+def wait_for_result_uploads(timeout: Optional[float] = None):
+    if _uploader is not None:
+        _uploader.wait(timeout)
 
 
 if __name__ == "__main__":
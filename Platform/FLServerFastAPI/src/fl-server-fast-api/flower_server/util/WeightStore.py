@@ -0,0 +1,129 @@
+"""
+Content-addressed exchange of the client updates that the clients need to compute the Shapley values.
+
+Every update is stored once as a blob (its serialized tensors) under the SHA-256 of its content. The evaluate
+config of each client carries a manifest (client id -> digest and number of examples) and only the blobs that
+the client does not hold yet: its own update, which it keeps since the fit, and the blobs it reported in its last
+evaluation are not sent again. No pickle is involved, the tensors are the ones Flower already sends.
+"""
+import hashlib
+import json
+import struct
+from typing import Dict, List, Optional, Set, Tuple
+
+MANIFEST_KEY = "weight_manifest"
+BLOB_KEY_PREFIX = "weight_blob_"
+# Key of the evaluate metrics in which the clients report the digests they hold.
+HELD_WEIGHTS_KEY = "held_weights"
+
+_LENGTH = struct.Struct("<Q")
+
+
+def encode_blob(tensors: List[bytes]) -> bytes:
+    return b"".join(_LENGTH.pack(len(tensor)) + tensor for tensor in tensors)
+
+
+def decode_blob(blob: bytes) -> List[bytes]:
+    tensors = []
+    offset = 0
+    while offset < len(blob):
+        (length,) = _LENGTH.unpack_from(blob, offset)
+        offset += _LENGTH.size
+        tensors.append(blob[offset:offset + length])
+        offset += length
+    return tensors
+
+
+def blob_digest(blob: bytes) -> str:
+    return hashlib.sha256(blob).hexdigest()
+
+
+class WeightStore:
+    """Server side: the blobs of the current round and the digests that every client holds."""
+    _blobs: Dict[str, bytes]
+    _manifest: Dict[str, Tuple[str, int]]
+    _held: Dict[str, Set[str]]
+
+    def __init__(self):
+        self._blobs = {}
+        self._manifest = {}
+        self._held = {}
+
+    def publish(self, updates: Dict[str, Tuple[List[bytes], int]], senders_hold: bool = True):
+        """
+        Replaces the blobs of the former round with the updates of this one.
+
+        :param updates: Key: client id, Value: tensors of the update and number of examples.
+        :param senders_hold: Whether the tensors are the ones the clients sent, which they keep until their
+                             evaluation. Updates reconstructed by the server (see TransportCodec) differ from what
+                             their sender holds, so they are sent back to it too.
+        """
+        self._blobs = {}
+        self._manifest = {}
+        for cid, (tensors, num_examples) in updates.items():
+            blob = encode_blob(tensors)
+            digest = blob_digest(blob)
+            self._blobs[digest] = blob
+            self._manifest[cid] = (digest, num_examples)
+            if senders_hold:
+                self._held.setdefault(cid, set()).add(digest)
+
+    def config_for(self, cid: str) -> Dict[str, object]:
+        held = self._held.get(cid, set())
+        config = {MANIFEST_KEY: json.dumps(self._manifest)}
+        for digest, blob in self._blobs.items():
+            if digest not in held:
+                config[BLOB_KEY_PREFIX + digest] = blob
+        return config
+
+    def acknowledge(self, cid: str, held_weights: Optional[str]):
+        """Records the digests that the client reported in its evaluate metrics."""
+        self._held[cid] = set(held_weights.split(",")) if held_weights else set()
+
+    def get_blob(self, digest: str) -> bytes:
+        return self._blobs[digest]
+
+    def get_manifest(self) -> Dict[str, Tuple[str, int]]:
+        return self._manifest
+
+
+class WeightCache:
+    """Client side: the blobs of the last manifest and the own update of the last fit."""
+    _blobs: Dict[str, bytes]
+    _own_blob: Optional[Tuple[str, bytes]]
+
+    def __init__(self):
+        self._blobs = {}
+        self._own_blob = None
+
+    def put_own(self, tensors: List[bytes]) -> str:
+        blob = encode_blob(tensors)
+        digest = blob_digest(blob)
+        self._own_blob = (digest, blob)
+        return digest
+
+    def resolve(self, config) -> Dict[str, Tuple[List[bytes], int]]:
+        """
+        Returns the tensors and number of examples of every client of the manifest in the config, with the blobs
+        of the config and of the cache. Only the blobs of this manifest are kept afterwards.
+        """
+        manifest = json.loads(config[MANIFEST_KEY])
+        available = dict(self._blobs)
+        if self._own_blob is not None:
+            available[self._own_blob[0]] = self._own_blob[1]
+        for key, blob in config.items():
+            if key.startswith(BLOB_KEY_PREFIX):
+                digest = key[len(BLOB_KEY_PREFIX):]
+                if blob_digest(blob) != digest:
+                    raise ValueError(f"Blob {digest} does not match its content")
+                available[digest] = blob
+
+        missing = [cid for cid, (digest, _) in manifest.items() if digest not in available]
+        if missing:
+            raise KeyError(f"Updates of clients {missing} were neither sent nor cached")
+        self._blobs = {digest: available[digest] for digest, _ in manifest.values()}
+        return {cid: (decode_blob(self._blobs[digest]), num_examples)
+                for cid, (digest, num_examples) in manifest.items()}
+
+    def held_weights(self) -> str:
+        return ",".join(self._blobs)
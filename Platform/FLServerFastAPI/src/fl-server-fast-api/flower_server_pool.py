@@ -0,0 +1,296 @@
+import asyncio
+import gc
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import uuid
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+FLOWER_SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flower_server")
+
+# Messages exchanged between the pool and its workers through the event queue.
+WORKER_READY = "WorkerReady"
+JOB_STARTED = "JobStarted"
+JOB_FINISHED = "JobFinished"
+JOB_FAILED = "JobFailed"
+
+
+def _worker_main(worker_id: int, job_queue, event_queue, run_job: Optional[Callable] = None):
+    """
+    Entry point of a pool worker. The heavy imports (TensorFlow, Keras, XGBoost, Optuna, Flower) happen
+    once here, then the worker keeps running one Flower server per job until it receives None.
+
+    :param run_job: Function called with the arguments of every job, Server.run_server by default.
+    """
+    if run_job is None:
+        # Server.py and its imports expect the flower_server directory to be the root of the imports.
+        if FLOWER_SERVER_DIR not in sys.path:
+            sys.path.insert(0, FLOWER_SERVER_DIR)
+        import Server
+        run_job = Server.run_server
+
+    event_queue.put((WORKER_READY, worker_id, None, None))
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, server_arguments = job
+        event_queue.put((JOB_STARTED, worker_id, job_id, None))
+        try:
+            run_job(**server_arguments)
+            event_queue.put((JOB_FINISHED, worker_id, job_id, None))
+        except BaseException:
+            event_queue.put((JOB_FAILED, worker_id, job_id, traceback.format_exc()))
+        finally:
+            # Models of former trials must not pile up in the Keras graph of a long-lived worker.
+            if "keras" in sys.modules:
+                sys.modules["keras"].backend.clear_session()
+            gc.collect()
+
+
+class FlowerServerPool:
+    """
+    Pool of long-lived processes that run the Flower servers of the training sessions.
+
+    Every worker imports the Flower server code once and then takes jobs (one hyperparameter trial or
+    the final training) from a shared queue. A job is considered started once its worker reports it
+    and the Flower server accepts connections on its port, so no fixed waiting time is needed.
+    """
+    number_of_workers: int
+    readiness_timeout: float
+
+    def __init__(self, number_of_workers: int = 1, readiness_timeout: float = 120,
+                 run_job: Optional[Callable] = None):
+        """
+        :param run_job: Function run by the workers for every job, Server.run_server by default. It must be
+                        importable by the spawned workers.
+        """
+        self.number_of_workers = number_of_workers
+        self.readiness_timeout = readiness_timeout
+        self._run_job = run_job
+        # Spawn instead of fork: the FastAPI process runs an event loop and threads that must not be copied.
+        self._context = multiprocessing.get_context("spawn")
+        self._job_queue = None
+        self._event_queue = None
+        self._workers: Dict[int, Any] = {}
+        self._ready_workers: set = set()
+        self._started_jobs: Dict[str, asyncio.Future] = {}
+        self._finished_jobs: Dict[str, asyncio.Future] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        # Key: Worker id, Value: Id of the job it runs.
+        self._running_jobs: Dict[int, str] = {}
+        # Jobs that start_server gave up on before a worker took them.
+        self._abandoned_jobs: set = set()
+        self._jobs_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._job_queue = self._context.Queue()
+        self._event_queue = self._context.Queue()
+        self._running = True
+        for worker_id in range(self.number_of_workers):
+            self._spawn_worker(worker_id)
+        self._listener = threading.Thread(target=self._listen_events, name="flower-server-pool", daemon=True)
+        self._listener.start()
+
+    def _spawn_worker(self, worker_id: int):
+        worker = self._context.Process(target=_worker_main,
+                                       args=(worker_id, self._job_queue, self._event_queue, self._run_job),
+                                       name=f"flower-server-worker-{worker_id}",
+                                       daemon=True)
+        worker.start()
+        self._workers[worker_id] = worker
+        logger.info(f"Flower server worker {worker_id} spawned with pid {worker.pid}")
+
+    def _listen_events(self):
+        while self._running:
+            try:
+                event, worker_id, job_id, details = self._event_queue.get(timeout=1)
+            except queue.Empty:
+                self._respawn_dead_workers()
+                continue
+            except (EOFError, OSError):
+                break
+
+            if event == WORKER_READY:
+                self._ready_workers.add(worker_id)
+                logger.info(f"Flower server worker {worker_id} is ready")
+            elif event == JOB_STARTED:
+                with self._jobs_lock:
+                    abandoned = job_id in self._abandoned_jobs
+                    self._abandoned_jobs.discard(job_id)
+                    if not abandoned:
+                        self._running_jobs[worker_id] = job_id
+                if abandoned:
+                    # Nobody waits for its Flower server anymore, the worker is replaced.
+                    logger.warning(f"Flower server job {job_id} was given up, stopping worker {worker_id}")
+                    self._workers[worker_id].terminate()
+                else:
+                    self._resolve(self._started_jobs, job_id, worker_id)
+            elif event == JOB_FINISHED:
+                self._resolve(self._finished_jobs, job_id, None)
+                self._forget_job(job_id)
+            elif event == JOB_FAILED:
+                logger.error(f"Flower server job {job_id} failed in worker {worker_id}:\n{details}")
+                self._fail_job(job_id, RuntimeError(f"Flower server job {job_id} failed"))
+
+    def _respawn_dead_workers(self):
+        for worker_id, worker in list(self._workers.items()):
+            if not worker.is_alive() and self._running:
+                logger.warning(f"Flower server worker {worker_id} exited with code {worker.exitcode}. Respawning.")
+                self._ready_workers.discard(worker_id)
+                # The job it was running is lost with it.
+                with self._jobs_lock:
+                    job_id = self._running_jobs.get(worker_id)
+                if job_id is not None:
+                    self._fail_job(job_id, RuntimeError(f"Flower server worker {worker_id} died during job {job_id}"))
+                self._spawn_worker(worker_id)
+
+    def _fail_job(self, job_id: str, error: BaseException):
+        self._resolve(self._started_jobs, job_id, error)
+        self._resolve(self._finished_jobs, job_id, error)
+        self._forget_job(job_id)
+
+    def _resolve(self, futures: Dict[str, asyncio.Future], job_id: str, result):
+        with self._jobs_lock:
+            future = futures.get(job_id)
+            loop = self._loops.get(job_id)
+        if future is None or loop is None:
+            return
+
+        def set_result():
+            if future.done():
+                return
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        loop.call_soon_threadsafe(set_result)
+
+    def _forget_job(self, job_id: str):
+        with self._jobs_lock:
+            self._started_jobs.pop(job_id, None)
+            self._finished_jobs.pop(job_id, None)
+            self._loops.pop(job_id, None)
+            for worker_id, running_job_id in list(self._running_jobs.items()):
+                if running_job_id == job_id:
+                    del self._running_jobs[worker_id]
+
+    async def start_server(self, server_arguments: Dict[str, Any]) -> str:
+        """
+        Queues a Flower server run and returns its job id once the server accepts connections.
+
+        :param server_arguments: Keyword arguments of Server.run_server.
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+        finished = loop.create_future()
+        with self._jobs_lock:
+            self._started_jobs[job_id] = started
+            self._finished_jobs[job_id] = finished
+            self._loops[job_id] = loop
+        # Failures are already logged by the listener, nobody has to await the end of the run.
+        finished.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self._job_queue.put((job_id, server_arguments))
+
+        worker_id = await self._wait_for_worker(job_id, started)
+        logger.info(f"Flower server job {job_id} running in worker {worker_id}")
+        try:
+            await self._wait_for_port(int(server_arguments["connection_port"]), finished)
+        except TimeoutError:
+            # A Flower server that never became reachable would otherwise hold its worker until it gives up on
+            # its clients, which takes a day with the defaults of Flower.
+            self.cancel(job_id)
+            raise
+        return job_id
+
+    async def _wait_for_worker(self, job_id: str, started: asyncio.Future) -> int:
+        """
+        Waits until a worker took the job. The job may wait in the queue while every worker runs another one,
+        but if a worker was free during a whole readiness_timeout (e.g. the workers die before they are ready),
+        the job is given up.
+        """
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(started), self.readiness_timeout)
+            except asyncio.TimeoutError:
+                with self._jobs_lock:
+                    # A job taken meanwhile is reported to started by the event loop right after.
+                    keep_waiting = (job_id in self._running_jobs.values()
+                                    or len(self._running_jobs) >= self.number_of_workers)
+                    if not keep_waiting:
+                        self._abandoned_jobs.add(job_id)
+                if keep_waiting:
+                    logger.info(f"Flower server job {job_id} waits for a free worker")
+                    continue
+                self._forget_job(job_id)
+                raise TimeoutError(f"No Flower server worker took job {job_id} after {self.readiness_timeout}s")
+
+    async def _wait_for_port(self, port: int, finished: asyncio.Future):
+        deadline = time.monotonic() + self.readiness_timeout
+        while time.monotonic() < deadline:
+            if finished.done():
+                # Raises the error of the job if it failed before the server was reachable.
+                finished.result()
+                return
+            try:
+                _, writer = await asyncio.open_connection("localhost", port)
+                writer.close()
+                await writer.wait_closed()
+                return
+            except OSError:
+                await asyncio.sleep(0.1)
+        raise TimeoutError(f"Flower server on port {port} was not reachable after {self.readiness_timeout}s")
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Stops a job that did not finish: the worker running it is terminated, and respawned by the listener, and
+        the futures of the job fail. A job still in the queue is given up and stopped as soon as a worker takes it.
+
+        :return: False if the job already finished (or is unknown).
+        """
+        with self._jobs_lock:
+            if job_id not in self._finished_jobs:
+                return False
+            worker_ids = [worker_id for worker_id, running_job_id in self._running_jobs.items()
+                          if running_job_id == job_id]
+            if not worker_ids:
+                self._abandoned_jobs.add(job_id)
+        self._fail_job(job_id, RuntimeError(f"Flower server job {job_id} was cancelled"))
+        for worker_id in worker_ids:
+            logger.warning(f"Flower server job {job_id} was cancelled, stopping worker {worker_id}")
+            self._workers[worker_id].terminate()
+        return True
+
+    async def wait_until_finished(self, job_id: str):
+        with self._jobs_lock:
+            finished = self._finished_jobs.get(job_id)
+        if finished is not None:
+            await finished
+
+    def shutdown(self):
+        if not self._running:
+            return
+        self._running = False
+        for _ in self._workers:
+            self._job_queue.put(None)
+        for worker in self._workers.values():
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = {}
+        self._ready_workers = set()
+        self._running_jobs = {}
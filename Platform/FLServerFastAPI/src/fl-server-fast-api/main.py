@@ -7,13 +7,18 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, APIRouter,
 from fastapi import status as http_codes
 from keycloak_auth import get_current_user, verify_token
 from common import PyUUID
-from training_session import TrainingSession, TrainingManager
+from training_session import TrainingSession, TrainingManager, TrainingSessionFailedError
 
 logger = logging.getLogger("uvicorn.error")
 
 app = FastAPI()
 
 training_manager = TrainingManager()
+
+
+@app.on_event("shutdown")
+async def stop_flower_servers():
+    training_manager.server_pool.shutdown()
 #
 # @app.websocket("/ws-test")
 # async def ws_test(websocket: WebSocket):
@@ -48,7 +53,7 @@ training_manager = TrainingManager()
     },
     response_model=None)
 async def load_training_session(configuration_file: Dict[Any, Any]):
-    training_manager.current_trainings[configuration_file["configuration_id"]] = TrainingSession(configuration_file)
+    training_manager.create_training_session(configuration_file)
 
 
 @app.get(
@@ -70,6 +75,21 @@ async def get_available_training_sessions(
     return training_sessions_ids
 
 
+@app.get(
+    "/training_sessions/resources",
+    responses={
+        http_codes.HTTP_200_OK: {
+            'description': 'Returns the running training sessions with their ports and the waiting ones in order.',
+        },
+    },
+    response_model=None
+)
+async def get_training_sessions_resources(
+    _ = Depends(get_current_user)
+) -> Dict[str, Any]:
+    return training_manager.get_resource_usage()
+
+
 @app.websocket("/register_dataset/{configuration_id}")
 async def register_dataset(
         websocket: WebSocket,
@@ -156,6 +176,7 @@ async def websocket_endpoint(
     print(f"Active connections: {len(manager.active_connections)}")
     await training_session.subscription_into_training.wait()
     await training_session.update_barrier(len(manager.active_connections))
+    await training_manager.wait_for_slot(training_session)
     try:
         while True:
             print("Requesting client input")
@@ -193,11 +214,22 @@ async def websocket_endpoint(
                     await websocket.receive_text()
                     manager.disconnect(websocket)
                     finished_stage = "TrainingFinished"
-                    training_manager.current_trainings.pop(str(configuration_id))
+                    training_manager.close_training_session(str(configuration_id), completed=True)
                     print("Closing session")
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        print(f"Participant {user_id} disconnected")
+    except TrainingSessionFailedError as error:
+        # The participants were disconnected by the session.
+        print(error)
+    finally:
+        if websocket in manager.active_connections:
+            manager.disconnect(websocket)
         print(manager.active_connections)
-        await training_session.update_barrier(len(manager.active_connections))
+        if manager.active_connections:
+            await training_session.update_barrier(len(manager.active_connections))
+        else:
+            # Once every participant left, after a disconnection or a failed run too, the slot and the port of the
+            # session go to the next waiting session and the Flower server of an unfinished run is stopped.
+            training_manager.close_training_session(str(configuration_id))
         # await manager.broadcast_text(f"User disconnected")
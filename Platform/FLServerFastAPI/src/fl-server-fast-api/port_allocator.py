@@ -0,0 +1,75 @@
+import logging
+import socket
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NoFreePortError(RuntimeError):
+    pass
+
+
+class PortAllocator:
+    """
+    Lease table for the ports of the Flower servers. Every training session leases one port of the configured
+    range while it is active and gives it back when it ends, so several sessions can run on the same host.
+    """
+    first_port: int
+    last_port: int
+    leases: Dict[int, str]  # Key: Port, Value: Configuration_id
+
+    def __init__(self, first_port: int, last_port: int):
+        if first_port > last_port:
+            raise ValueError(f"Invalid port range {first_port}-{last_port}")
+        self.first_port = first_port
+        self.last_port = last_port
+        self.leases = {}
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.last_port - self.first_port + 1
+
+    def lease(self, owner: str) -> int:
+        """
+        Returns the port leased by the owner, leasing a new one if it does not have one yet.
+
+        :raises NoFreePortError: If every port of the range is leased or in use by another process.
+        """
+        with self._lock:
+            current_port = self.port_of(owner)
+            if current_port is not None:
+                return current_port
+            for port in range(self.first_port, self.last_port + 1):
+                if port in self.leases:
+                    continue
+                if not self._is_bindable(port):
+                    logger.warning(f"Port {port} is used outside the training sessions, skipping it")
+                    continue
+                self.leases[port] = owner
+                return port
+        raise NoFreePortError(f"No free port in range {self.first_port}-{self.last_port}")
+
+    def release(self, owner: str) -> Optional[int]:
+        with self._lock:
+            port = self.port_of(owner)
+            if port is not None:
+                del self.leases[port]
+            return port
+
+    def port_of(self, owner: str) -> Optional[int]:
+        for port, port_owner in self.leases.items():
+            if port_owner == owner:
+                return port
+        return None
+
+    @staticmethod
+    def _is_bindable(port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                probe.bind(("0.0.0.0", port))
+            except OSError:
+                return False
+        return True
@@ -1,10 +1,13 @@
 import asyncio
+import heapq
+import itertools
 import logging
+import os
 import random
-import subprocess
-import sys
-from functools import reduce
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
+
+import yaml
 
 import fastapi
 from fastapi import FastAPI, WebSocket, Depends, APIRouter
@@ -12,9 +15,24 @@ from tensorflow.python.ops.gen_data_flow_ops import barrier
 
 from common import Tags, PyUUID, MongoID
 from flower_server.util import OptunaConnection
+from flower_server_pool import FlowerServerPool
+from port_allocator import PortAllocator, NoFreePortError
 
 logger = logging.getLogger(__name__)
 
+config_path = os.path.dirname(__file__) + "/config.yml"
+with open(config_path, "r") as file:
+    config = yaml.safe_load(file)
+    FLOWER_SERVER_WORKERS = config["flower_server_pool"]["number_of_workers"]
+    FLOWER_SERVER_READINESS_TIMEOUT = config["flower_server_pool"]["readiness_timeout"]
+    FLOWER_SERVER_FIRST_PORT = config["training_sessions"]["first_port"]
+    FLOWER_SERVER_LAST_PORT = config["training_sessions"]["last_port"]
+    MAX_CONCURRENT_SESSIONS = config["training_sessions"]["max_concurrent_sessions"]
+
+class TrainingSessionFailedError(Exception):
+    """The Flower server of the session could not be started. The session does not try again."""
+
+
 class ConnectionManager:
     def __init__(self):
         # self.active_connections: dict[PyUUID, list[WebSocket]] = {}
@@ -41,6 +59,14 @@ class ConnectionManager:
         for connection in self.active_connections:
             await connection.send_json(message)
 
+    async def close_all(self, reason: str):
+        for connection in list(self.active_connections):
+            try:
+                await connection.close(code=1011, reason=reason)
+            except RuntimeError:
+                # Already closed by its participant.
+                pass
+
 
 class TrainingSession:
     configuration_id: PyUUID
@@ -70,9 +96,17 @@ class TrainingSession:
     current_hyperparameters_rounds_run: int
 
     process_running: bool
-    lock: asyncio.Lock = asyncio.Lock()
+    lock: asyncio.Lock
+    # Job of the FlowerServerPool that runs the Flower server of the current run.
+    server_job_id: Optional[str]
+    # Why the Flower server could not be started, None while the session did not fail.
+    failure: Optional[str]
+
+    priority: int
+    admitted: asyncio.Event
+    connection_port: Optional[str]
 
-    def __init__(self, configuration_dict):
+    def __init__(self, configuration_dict, server_pool: FlowerServerPool):
         self.configuration_id = configuration_dict["configuration_id"]
         self.possible_group_members = configuration_dict["group_members"]
         self.number_clients = configuration_dict["number_clients"]
@@ -109,21 +143,42 @@ class TrainingSession:
 
         self.load_best_trial = 0
         self.compute_shapley_values = configuration_dict["compute_shapley_values"]
+        # Optional. {"method": "Exact" | "GTG", "max_permutations": int, "tolerance": float, "seed": int,
+        #            "mode": "Clients" | "Centralized", "validation_data": directory of the server validation split}
+        self.shapley_configuration = configuration_dict.get("shapley_configuration", {"method": "Exact"})
+        # Optional. Checkpoints of the global model during the final training:
+        # {"every_n_rounds": int, "last_only": bool}. The last round is always saved.
+        self.checkpoint_configuration = configuration_dict.get("checkpoint_configuration", {})
+        # Optional. Encoding of the models exchanged by FedAvg: {"quantization": "none" | "float16" | "int8",
+        #           "top_k": fraction of the update sent, "compression": "none" | "zstd", "compression_level": int}
+        self.transport_configuration = configuration_dict.get("transport_configuration", {})
 
         if self.hyperparameter_search:
             _ = OptunaConnection.optuna_create_study(self.model_final_name, ["minimize"])
         else:
             self.hyperparameter_search_rounds = 0
 
+        self.server_pool = server_pool
+        # Per session, the sessions run concurrently.
+        self.lock = asyncio.Lock()
         self.process_running = False
+        self.server_job_id = None
+        self.failure = None
         self.last_round_check: bool = False
         # self.subscription_into_training = asyncio.Barrier(len(self.possible_group_members))
         self.subscription_into_training = asyncio.Barrier(self.number_clients)
         self.participants_barrier = asyncio.Barrier(1)
 
         self.connection_manager = ConnectionManager()
-        # self.connection_port = str(int(2000 * random.random()) + 54000)
-        self.connection_port = "54000"
+        # Sessions with a higher priority leave the waiting queue first. Equal priorities are served FIFO.
+        self.priority = configuration_dict.get("priority", 0)
+        # Set by the TrainingManager once the session got a free slot and a port for its Flower server.
+        self.admitted = asyncio.Event()
+        self.connection_port = None
+        self.connection_ip = None
+
+    def assign_port(self, port: int):
+        self.connection_port = str(port)
         self.connection_ip = "localhost:" + self.connection_port
 
     async def update_barrier(self, number_of_active_participants: int):
@@ -145,6 +200,9 @@ class TrainingSession:
     async def get_flower_server(self):
         await self.participants_barrier.wait()
         async with self.lock:
+            if self.failure is not None:
+                # The participants that waited for the lock do not queue another server for the same port.
+                raise TrainingSessionFailedError(self.failure)
             if not self.process_running:
                 self.last_round_check = self.current_hyperparameters_rounds_run == self.hyperparameter_search_rounds
                 if self.last_round_check:
@@ -154,30 +212,36 @@ class TrainingSession:
                     load_best_trial = 0
                     shapley_values = 0
 
-                subprocess.Popen(['python',
-                                  'src/fl-server-fast-api/flower_server/Server.py',
-                                  self.connection_port,
-                                  self.strategy,
-                                  str(self.dataset_schema_validation_info["dataset_features"][-1]["valid_values"]),
-                                  self.model,
-                                  str(self.hyperparameter_space),
-                                  str(self.dataset_input_size),
-                                  str(self.dataset_output_size),
-                                  str(self.number_clients),
-                                #   str(self.number_clients),
-                                  str(self.rounds),
-                                  reduce(lambda metric1, metric2: metric1 + "-" + metric2, self.metric_names),
-                                  self.model_final_name,
-                                  str(load_best_trial),
-                                  str(shapley_values),
-                                  str(self.configuration_id)],
-                                 shell=False,
-                                 stdout=sys.stdout)
+                try:
+                    self.server_job_id = await self.server_pool.start_server({
+                        "connection_port": self.connection_port,
+                        "strategy_selected": self.strategy,
+                        "possible_outputs": self.dataset_schema_validation_info["dataset_features"][-1]["valid_values"],
+                        "model_selected": self.model,
+                        "hyperparameter_space": self.hyperparameter_space,
+                        "input_dim": int(self.dataset_input_size),
+                        "output_dim": int(self.dataset_output_size),
+                        "number_of_clients": int(self.number_clients),
+                        "number_of_rounds": int(self.rounds),
+                        "metric_list": self.metric_names,
+                        "model_final_name": self.model_final_name,
+                        "load_best_trial": load_best_trial,
+                        "compute_shapley_values": int(shapley_values),
+                        "configuration_id": str(self.configuration_id),
+                        "shapley_configuration": self.shapley_configuration,
+                        "checkpoint_configuration": self.checkpoint_configuration,
+                        "transport_configuration": self.transport_configuration
+                    })
+                except (TimeoutError, RuntimeError) as error:
+                    self.failure = f"The Flower server of training session {self.configuration_id} could not be " \
+                                   f"started: {error}"
+                    logger.error(self.failure)
+                    await self.connection_manager.close_all("TrainingFailed")
+                    raise TrainingSessionFailedError(self.failure) from error
                 self.process_running = True
-                print("Starting process")
+                print("Flower server ready")
                 self.current_hyperparameters_rounds_run += 1
                 print(f"Current round: {self.current_hyperparameters_rounds_run}")
-                await asyncio.sleep(3)
                 await self.participants_barrier.reset()
         return self.last_round_check
 
@@ -187,11 +251,109 @@ class TrainingSession:
     # number_clients: int
 
 
+class SessionResources:
+    """Resources held by an admitted training session."""
+    port: int
+    queued_at: float
+    admitted_at: float
+
+    def __init__(self, port: int, queued_at: float):
+        self.port = port
+        self.queued_at = queued_at
+        self.admitted_at = time.time()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "port": self.port,
+            "waiting_time": self.admitted_at - self.queued_at,
+            "running_time": time.time() - self.admitted_at
+        }
+
+
 class TrainingManager:
     current_trainings: Dict[str, TrainingSession]
+    server_pool: FlowerServerPool
+    port_allocator: PortAllocator
+    max_concurrent_sessions: int
+    active_sessions: Dict[str, SessionResources]  # Key: Configuration_id
 
     def __init__(self):
         self.current_trainings = {}
+        self.server_pool = FlowerServerPool(number_of_workers=FLOWER_SERVER_WORKERS,
+                                            readiness_timeout=FLOWER_SERVER_READINESS_TIMEOUT)
+        self.port_allocator = PortAllocator(FLOWER_SERVER_FIRST_PORT, FLOWER_SERVER_LAST_PORT)
+        self.max_concurrent_sessions = min(MAX_CONCURRENT_SESSIONS, self.port_allocator.capacity)
+        self.active_sessions = {}
+        # Heap of (-priority, arrival number, configuration_id, queued_at) of the sessions waiting for a slot.
+        self.waiting_sessions: list = []
+        self._arrivals = itertools.count()
+
+    def create_training_session(self, configuration_dict) -> TrainingSession:
+        training_session = TrainingSession(configuration_dict, self.server_pool)
+        self.current_trainings[configuration_dict["configuration_id"]] = training_session
+        return training_session
+
+    async def wait_for_slot(self, training_session: TrainingSession):
+        """
+        Queues the session the first time one of its participants asks for it and waits until it was admitted,
+        i.e. it is one of the max_concurrent_sessions running sessions and leases a port.
+        """
+        configuration_id = str(training_session.configuration_id)
+        if configuration_id not in self.active_sessions and not self._is_waiting(configuration_id):
+            heapq.heappush(self.waiting_sessions,
+                           (-training_session.priority, next(self._arrivals), configuration_id, time.time()))
+            self._admit_waiting_sessions()
+        await training_session.admitted.wait()
+
+    def close_training_session(self, configuration_id: str, completed: bool = False):
+        """
+        Removes the session and hands its slot and port to the next waiting session.
+
+        :param completed: Whether the session ended after its last training. Otherwise its participants left, and
+                          the Flower server of a run that did not finish is stopped so it does not hold its worker.
+        """
+        training_session = self.current_trainings.pop(configuration_id, None)
+        if training_session is not None and training_session.server_job_id is not None and not completed:
+            if self.server_pool.cancel(training_session.server_job_id):
+                logger.warning(f"Training session {configuration_id} was left, its Flower server was stopped")
+        resources = self.active_sessions.pop(configuration_id, None)
+        if resources is not None:
+            self.port_allocator.release(configuration_id)
+            logger.info(f"Training session {configuration_id} released port {resources.port} "
+                        f"after {resources.as_dict()['running_time']:.1f}s")
+        elif self._is_waiting(configuration_id):
+            self.waiting_sessions = [entry for entry in self.waiting_sessions if entry[2] != configuration_id]
+            heapq.heapify(self.waiting_sessions)
+        self._admit_waiting_sessions()
+
+    def get_resource_usage(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent_sessions": self.max_concurrent_sessions,
+            "active_sessions": {configuration_id: resources.as_dict()
+                                for configuration_id, resources in self.active_sessions.items()},
+            "waiting_sessions": [entry[2] for entry in sorted(self.waiting_sessions)]
+        }
+
+    def _is_waiting(self, configuration_id: str) -> bool:
+        return any(entry[2] == configuration_id for entry in self.waiting_sessions)
+
+    def _admit_waiting_sessions(self):
+        while self.waiting_sessions and len(self.active_sessions) < self.max_concurrent_sessions:
+            _, _, configuration_id, queued_at = self.waiting_sessions[0]
+            training_session = self.current_trainings.get(configuration_id)
+            if training_session is None:
+                heapq.heappop(self.waiting_sessions)
+                continue
+            try:
+                port = self.port_allocator.lease(configuration_id)
+            except NoFreePortError:
+                logger.warning(f"No free port for training session {configuration_id}, it keeps waiting")
+                return
+            heapq.heappop(self.waiting_sessions)
+            self.active_sessions[configuration_id] = SessionResources(port, queued_at)
+            training_session.assign_port(port)
+            training_session.admitted.set()
+            logger.info(f"Training session {configuration_id} admitted on port {port}")
 
 #
 # router = APIRouter(prefix="/training_sessions", tags=[Tags.TRAINING_SESSIONS])
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark of the FedAvg aggregation: Flower's generic aggregate against WeightedAverageAggregator,
+over the number of clients and the size of the model.
+
+Run it from the FLServerFastAPI directory:
+    python tests/benchmarks/bench_aggregate_nn.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "fl-server-fast-api", "flower_server"))
+
+from flwr.server.strategy.aggregate import aggregate as aggregate_flwr  # noqa: E402
+
+from experiment_parameters.aggregation_processes.aggregate import aggregate_nn  # noqa: E402
+
+CLIENT_COUNTS = [5, 20, 50]
+# Hidden layer sizes of an MLP with 100 inputs and 10 outputs, from ~0.1 MB to ~8 MB of float32 weights.
+MODEL_SIZES = [[128, 64], [512, 256], [1024, 1024, 512]]
+REPETITIONS = 3
+
+
+def build_results(number_of_clients, hidden_layers, input_dim=100, output_dim=10):
+    rng = np.random.default_rng(0)
+    dimensions = [input_dim] + hidden_layers + [output_dim]
+    results = []
+    for _ in range(number_of_clients):
+        weights = []
+        for fan_in, fan_out in zip(dimensions[:-1], dimensions[1:]):
+            weights.append(rng.standard_normal((fan_in, fan_out), dtype=np.float32))
+            weights.append(rng.standard_normal(fan_out, dtype=np.float32))
+        results.append((weights, int(rng.integers(100, 1000))))
+    return results
+
+
+def measure(function, results):
+    best_time = float("inf")
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        function(results)
+        best_time = min(best_time, time.perf_counter() - start)
+    tracemalloc.start()
+    function(results)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best_time, peak
+
+
+def main():
+    print(f"{'clients':>8} {'model MB':>9} {'flwr s':>8} {'engine s':>9} {'flwr peak MB':>13} {'engine peak MB':>15}")
+    for hidden_layers in MODEL_SIZES:
+        for number_of_clients in CLIENT_COUNTS:
+            results = build_results(number_of_clients, hidden_layers)
+            model_size = sum(layer.nbytes for layer in results[0][0]) / 2 ** 20
+            flwr_time, flwr_peak = measure(aggregate_flwr, results)
+            engine_time, engine_peak = measure(aggregate_nn, results)
+            print(f"{number_of_clients:>8} {model_size:>9.2f} {flwr_time:>8.3f} {engine_time:>9.3f} "
+                  f"{flwr_peak / 2 ** 20:>13.1f} {engine_peak / 2 ** 20:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the XGBoost bagging aggregation over many rounds: the former aggregation, which parses and
+serializes the whole global model for every client, against XGBoostBaggingAggregator, which keeps it parsed.
+
+The client models are synthetic JSON models with the layout written by xgboost's save_raw("json"), so xgboost is
+not needed. Run it from the FLServerFastAPI directory:
+    python tests/benchmarks/bench_aggregate_xgboost.py
+"""
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "fl-server-fast-api", "flower_server"))
+
+from experiment_parameters.aggregation_processes.aggregate import XGBoostBaggingAggregator  # noqa: E402
+
+NUMBER_OF_CLIENTS = 10
+ROUNDS = [25, 50, 100, 150]
+NODES_PER_TREE = 63
+
+
+def build_client_model(parallel_trees: int = 1) -> bytes:
+    tree = {
+        "id": 0,
+        "left_children": list(range(1, NODES_PER_TREE + 1)),
+        "right_children": list(range(2, NODES_PER_TREE + 2)),
+        "split_conditions": [0.5] * NODES_PER_TREE,
+        "split_indices": [3] * NODES_PER_TREE,
+        "base_weights": [0.1] * NODES_PER_TREE,
+    }
+    model = {
+        "learner": {
+            "gradient_booster": {
+                "model": {
+                    "gbtree_model_param": {"num_trees": str(parallel_trees),
+                                           "num_parallel_tree": str(parallel_trees)},
+                    "iteration_indptr": [0, parallel_trees],
+                    "tree_info": [0] * parallel_trees,
+                    "trees": [dict(tree, id=tree_id) for tree_id in range(parallel_trees)],
+                }
+            }
+        }
+    }
+    return bytes(json.dumps(model), "utf-8")
+
+
+def former_aggregate_trees(bst_prev_org: Optional[bytes], bst_curr_org: bytes) -> bytes:
+    """The aggregation as it was before XGBoostBaggingAggregator: two parses and one dump per client model."""
+    if not bst_prev_org:
+        return bst_curr_org
+    bst_prev = json.loads(bytearray(bst_prev_org))
+    bst_curr = json.loads(bytearray(bst_curr_org))
+    model_prev = bst_prev["learner"]["gradient_booster"]["model"]
+    model_curr = bst_curr["learner"]["gradient_booster"]["model"]
+    tree_num_prev = int(model_prev["gbtree_model_param"]["num_trees"])
+    paral_tree_num_curr = int(model_curr["gbtree_model_param"]["num_parallel_tree"])
+    model_prev["gbtree_model_param"]["num_trees"] = str(tree_num_prev + paral_tree_num_curr)
+    model_prev["iteration_indptr"].append(model_prev["iteration_indptr"][-1] + paral_tree_num_curr)
+    for tree_count in range(paral_tree_num_curr):
+        model_curr["trees"][tree_count]["id"] = tree_num_prev + tree_count
+        model_prev["trees"].append(model_curr["trees"][tree_count])
+        model_prev["tree_info"].append(0)
+    return bytes(json.dumps(bst_prev), "utf-8")
+
+
+def run_former(rounds: int, client_model: bytes) -> bytes:
+    global_model = None
+    for _ in range(rounds):
+        for _ in range(NUMBER_OF_CLIENTS):
+            global_model = former_aggregate_trees(global_model, client_model)
+    return global_model
+
+
+def run_aggregator(rounds: int, client_model: bytes) -> bytes:
+    aggregator = XGBoostBaggingAggregator()
+    global_model = None
+    for _ in range(rounds):
+        aggregator.add_all([[client_model]] * NUMBER_OF_CLIENTS)
+        # The strategy serializes the global model once per round to send it to the clients.
+        global_model = aggregator.to_bytes()
+    return global_model
+
+
+def main():
+    client_model = build_client_model()
+    assert run_former(3, client_model) == run_aggregator(3, client_model)
+    print(f"{'rounds':>7} {'trees':>6} {'former s':>9} {'aggregator s':>13}")
+    for rounds in ROUNDS:
+        start = time.perf_counter()
+        run_former(rounds, client_model)
+        former_time = time.perf_counter() - start
+        start = time.perf_counter()
+        run_aggregator(rounds, client_model)
+        aggregator_time = time.perf_counter() - start
+        print(f"{rounds:>7} {rounds * NUMBER_OF_CLIENTS:>6} {former_time:>9.2f} {aggregator_time:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The Flower server code imports its modules from the flower_server directory.
+FLOWER_SERVER_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "src", "fl-server-fast-api", "flower_server")
+if FLOWER_SERVER_DIR not in sys.path:
+    sys.path.insert(0, os.path.abspath(FLOWER_SERVER_DIR))
+# The FastAPI application (training sessions, Flower server pool) imports its modules from its own directory.
+FAST_API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src", "fl-server-fast-api"))
+if FAST_API_DIR not in sys.path:
+    sys.path.append(FAST_API_DIR)
+
+# Same import order as Server.py: TrainerFactory and metrics.Evaluator import each other.
+import experiment_parameters.TrainerFactory  # noqa: E402, F401
+from metrics.Metrics import MetricVector, metric_schema  # noqa: E402
+
+METRIC_LIST = ["CrossEntropyLoss", "Accuracy"]
+
+
+def metric_vector(accuracy: float, loss: float) -> MetricVector:
+    vector = MetricVector(metric_schema(METRIC_LIST, 2))
+    vector.set_value_of_metric("CrossEntropyLoss", loss)
+    vector.set_value_of_metric("Accuracy", accuracy)
+    return vector
+
+
+@pytest.fixture
+def y_test():
+    return pd.DataFrame([[1, 0], [0, 1]], columns=["yes", "no"])
@@ -0,0 +1,102 @@
+import json
+from typing import Optional
+
+import numpy as np
+import pytest
+from flwr.server.strategy.aggregate import aggregate
+
+from experiment_parameters.aggregation_processes.aggregate import WeightedAverageAggregator, \
+    XGBoostBaggingAggregator, aggregate_nn, aggregate_xgboost
+
+
+def weights(seed):
+    generator = np.random.default_rng(seed)
+    return [generator.normal(size=(20, 8)).astype(np.float32), generator.normal(size=8).astype(np.float32)]
+
+
+def xgboost_model(parallel_trees, split_condition):
+    trees = [{"id": tree_id, "left_children": [1, -1, -1], "right_children": [2, -1, -1],
+              "split_conditions": [split_condition, 0.1, -0.1], "split_indices": [tree_id, 0, 0]}
+             for tree_id in range(parallel_trees)]
+    model = {"learner": {"gradient_booster": {"model": {
+        "gbtree_model_param": {"num_trees": str(parallel_trees), "num_parallel_tree": str(parallel_trees)},
+        "iteration_indptr": [0, parallel_trees],
+        "tree_info": [0] * parallel_trees,
+        "trees": trees}}}}
+    return bytes(json.dumps(model), "utf-8")
+
+
+def former_aggregate_trees(bst_prev_org: Optional[bytes], bst_curr_org: bytes) -> bytes:
+    """The aggregation as it was before XGBoostBaggingAggregator."""
+    if not bst_prev_org:
+        return bst_curr_org
+    bst_prev = json.loads(bytearray(bst_prev_org))
+    bst_curr = json.loads(bytearray(bst_curr_org))
+    model_prev = bst_prev["learner"]["gradient_booster"]["model"]
+    model_curr = bst_curr["learner"]["gradient_booster"]["model"]
+    tree_num_prev = int(model_prev["gbtree_model_param"]["num_trees"])
+    paral_tree_num_curr = int(model_curr["gbtree_model_param"]["num_parallel_tree"])
+    model_prev["gbtree_model_param"]["num_trees"] = str(tree_num_prev + paral_tree_num_curr)
+    model_prev["iteration_indptr"].append(model_prev["iteration_indptr"][-1] + paral_tree_num_curr)
+    trees_curr = model_curr["trees"]
+    for tree_count in range(paral_tree_num_curr):
+        trees_curr[tree_count]["id"] = tree_num_prev + tree_count
+        model_prev["trees"].append(trees_curr[tree_count])
+        model_prev["tree_info"].append(0)
+    return bytes(json.dumps(bst_prev), "utf-8")
+
+
+def test_weighted_average_matches_flower():
+    results = [(weights(seed), num_examples) for seed, num_examples in [(0, 10), (1, 35), (2, 1)]]
+
+    aggregated = aggregate_nn(results)
+
+    for layer, expected in zip(aggregated, aggregate(results)):
+        assert layer.dtype == np.float32
+        np.testing.assert_allclose(layer, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_results_are_not_aliased_across_rounds():
+    aggregator = WeightedAverageAggregator()
+    aggregator.add(weights(0), 10)
+    aggregator.add(weights(1), 20)
+    first_round = aggregator.result()
+    expected_first_round = [np.copy(layer) for layer in first_round]
+
+    aggregator.reset()
+    aggregator.add(weights(2), 5)
+    second_round = aggregator.result()
+
+    for layer, expected in zip(first_round, expected_first_round):
+        np.testing.assert_array_equal(layer, expected)
+    for layer, expected in zip(second_round, weights(2)):
+        np.testing.assert_allclose(layer, expected, rtol=1e-6)
+    assert not any(np.shares_memory(first, second) for first, second in zip(first_round, second_round))
+    assert not any(np.shares_memory(layer, accumulator)
+                   for layer, accumulator in zip(second_round, aggregator.accumulators))
+
+
+def test_weighted_average_rejects_other_shapes_in_a_round():
+    aggregator = WeightedAverageAggregator()
+    aggregator.add(weights(0), 10)
+    with pytest.raises(ValueError):
+        aggregator.add([np.zeros((3, 3))], 10)
+
+
+@pytest.mark.parametrize("parallel_trees", [1, 3])
+def test_bagging_matches_the_former_aggregation(parallel_trees):
+    rounds = [[[xgboost_model(parallel_trees, client + 0.1 * server_round)] for client in range(4)]
+              for server_round in range(3)]
+    former_model = None
+    aggregator = XGBoostBaggingAggregator()
+
+    for local_models in rounds:
+        for model in local_models:
+            former_model = former_aggregate_trees(former_model, model[0])
+        aggregator.add_all(local_models)
+        assert json.loads(aggregator.to_bytes()) == json.loads(former_model)
+
+    # Restarting from the serialized global model, as a new round does.
+    next_round = [[xgboost_model(parallel_trees, 9.0)]]
+    assert json.loads(aggregate_xgboost(next_round, aggregator.to_bytes())) == \
+        json.loads(former_aggregate_trees(former_model, next_round[0][0]))
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from flwr.common import FitRes, Status, Code, ndarrays_to_parameters
+
+from experiment_parameters.model_builder.Model import Model, dense_forward
+from experiment_parameters.strategies.server.FedAvgRewritten import FedAvgRewritten, SHAPLEY_MODE_CENTRALIZED
+from metrics.Evaluator import evaluator
+from tests.unit.conftest import METRIC_LIST
+
+CLASSES = ["yes", "no"]
+
+
+class LinearModel(Model):
+    def __init__(self):
+        self._weights = None
+
+    def set_model(self, model):
+        self._weights = model
+
+    def predict_proba(self, x):
+        return dense_forward(self._weights, ["softmax"], np.asarray(x))
+
+
+class FakeClientManager:
+    def __init__(self, clients):
+        self._clients = clients
+
+    def num_available(self):
+        return len(self._clients)
+
+    def sample(self, num_clients, min_num_clients=None):
+        return self._clients
+
+
+def weights(seed):
+    generator = np.random.default_rng(seed)
+    return [generator.normal(size=(3, 2)).astype(np.float32), generator.normal(size=2).astype(np.float32)]
+
+
+@pytest.fixture
+def validation_data(tmp_path):
+    generator = np.random.default_rng(42)
+    x = pd.DataFrame(generator.normal(size=(40, 3)))
+    labels = generator.integers(0, 2, size=40)
+    y = pd.DataFrame(np.eye(2, dtype=int)[labels], columns=CLASSES)
+    x.to_csv(tmp_path / "server_X_test.csv")
+    y.to_csv(tmp_path / "server_y_test.csv")
+    return tmp_path
+
+
+def test_server_computes_the_shapley_values_and_clients_skip_them(validation_data):
+    initial_weights = weights(0)
+    strategy = FedAvgRewritten(max_round=1,
+                               possible_outputs=CLASSES,
+                               model=LinearModel(),
+                               final_training=0,
+                               metric_list=METRIC_LIST,
+                               tracked_study=None,
+                               tracked_trial=None,
+                               model_final_name="test",
+                               compute_shapley_values=1,
+                               result_path="",
+                               initial_parameters=ndarrays_to_parameters(initial_weights),
+                               on_evaluate_config_fn=lambda server_round: {"num_rounds": 1},
+                               shapley_configuration={"mode": SHAPLEY_MODE_CENTRALIZED,
+                                                      "validation_data": str(validation_data)})
+    clients = [SimpleNamespace(cid=cid) for cid in ["a", "b", "c"]]
+    results = [(client, FitRes(Status(Code.OK, ""),
+                               ndarrays_to_parameters(weights(seed)),
+                               10 * seed,
+                               {"client_number": str(seed), "Label yes": 5 * seed, "Label no": 5 * seed}))
+               for seed, client in enumerate(clients, start=1)]
+
+    parameters, _ = strategy.aggregate_fit(1, results, [])
+
+    # Efficiency: the Shapley values add up to the improvement of the global model over the initial one.
+    model = LinearModel()
+    model.set_model(initial_weights)
+    initial_result = evaluator(strategy.x_test, strategy.y_test, model, METRIC_LIST)
+    model.set_model([np.asarray(layer) for layer in strategy._aggregator.result()])
+    global_result = evaluator(strategy.x_test, strategy.y_test, model, METRIC_LIST)
+    shapley_values = strategy._shapley_values.get_round_shapley_values(1)
+    assert set(shapley_values) == {"a", "b", "c"}
+    total_accuracy = sum(sv.get_value_of_metric("Accuracy") for sv in shapley_values.values())
+    assert total_accuracy == pytest.approx(global_result.get_value_of_metric("Accuracy") -
+                                           initial_result.get_value_of_metric("Accuracy"))
+
+    for _, evaluate_ins in strategy.configure_evaluate(1, parameters, FakeClientManager(clients)):
+        assert evaluate_ins.config["compute_shapley_values"] == 0
+        assert not any(key.startswith("weight_") for key in evaluate_ins.config)
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from util.CheckpointWriter import CheckpointWriter
+
+
+def test_pending_checkpoints_are_coalesced_and_renamed_into_place(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+    writes = []
+
+    def write(path, checkpoint):
+        if checkpoint == 1:
+            # Holds the writer, the following checkpoints wait in its queue.
+            started.set()
+            release.wait()
+        writes.append((path, checkpoint))
+        with open(path, "w") as f:
+            f.write(str(checkpoint))
+
+    writer = CheckpointWriter(write, last_round=4)
+    path = str(tmp_path / "model" / "final.keras")
+    assert not writer.submit(path, 1)
+    started.wait()
+    writer.submit(path, 2)
+    assert writer.submit(path, 3)
+    release.set()
+    writer.close()
+
+    # The second checkpoint was replaced before it was written.
+    assert [checkpoint for _, checkpoint in writes] == [1, 3]
+    assert all(written.endswith("tmp-final.keras") for written, _ in writes)
+    assert (tmp_path / "model" / "final.keras").read_text() == "3"
+    assert not (tmp_path / "model" / "tmp-final.keras").exists()
+
+
+def test_checkpoint_policy():
+    every_two = CheckpointWriter(lambda path, checkpoint: None, last_round=5, every_n_rounds=2)
+    last_only = CheckpointWriter(lambda path, checkpoint: None, last_round=5, last_only=True)
+
+    assert [every_two.should_checkpoint(server_round) for server_round in range(1, 6)] == \
+           [False, True, False, True, True]
+    assert [last_only.should_checkpoint(server_round) for server_round in range(1, 6)] == \
+           [False, False, False, False, True]
+
+
+def test_failed_write_keeps_the_former_checkpoint(tmp_path):
+    def write(path, checkpoint):
+        with open(path, "w") as f:
+            f.write(str(checkpoint))
+        if checkpoint == 2:
+            raise OSError("disk full")
+
+    writer = CheckpointWriter(write, last_round=2)
+    path = str(tmp_path / "final.keras")
+    writer.submit(path, 1)
+    assert writer.flush(timeout=5)
+    writer.submit(path, 2)
+    writer.close()
+
+    assert (tmp_path / "final.keras").read_text() == "1"
+
+
+@pytest.mark.parametrize("every_n_rounds", [0, -2])
+def test_checkpoint_intervals_below_one_round_are_rejected(every_n_rounds):
+    with pytest.raises(ValueError):
+        CheckpointWriter(lambda path, checkpoint: None, last_round=5, every_n_rounds=every_n_rounds)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import f1_score
+
+from metrics.Evaluator import ConfusionMatrixScores, metric_function_dict, metrics_from_predictions
+
+LABELS = ["a", "b", "c", "d"]
+
+
+def random_predictions(seed, number_of_samples=200, missing_class=None):
+    generator = np.random.default_rng(seed)
+    classes = generator.integers(0, len(LABELS), number_of_samples)
+    if missing_class is not None:
+        classes[classes == missing_class] = (missing_class + 1) % len(LABELS)
+    y_test = pd.DataFrame(np.eye(len(LABELS), dtype=int)[classes], columns=LABELS)
+    logits = generator.normal(size=(number_of_samples, len(LABELS))) + 2 * np.eye(len(LABELS))[classes]
+    y_pred_proba = np.exp(logits) / np.sum(np.exp(logits), axis=1, keepdims=True)
+    return y_test, y_pred_proba
+
+
+@pytest.mark.parametrize("seed, missing_class", [(0, None), (1, None), (2, 3)])
+def test_single_pass_metrics_match_sklearn(seed, missing_class):
+    y_test, y_pred_proba = random_predictions(seed, missing_class=missing_class)
+    metric_list = list(metric_function_dict.keys())
+    metrics = metrics_from_predictions(y_test, y_pred_proba, metric_list)
+    for metric in metric_list:
+        expected = metric_function_dict[metric](y_test, y_pred_proba, labels=LABELS)
+        assert metrics.get_value_of_metric(metric) == pytest.approx(expected.get_value(), abs=1e-12)
+
+
+def test_per_class_f1_matches_sklearn():
+    y_test, y_pred_proba = random_predictions(3, missing_class=0)
+    y_true = np.argmax(np.asarray(y_test), axis=1)
+    scores = ConfusionMatrixScores(y_true, y_pred_proba, len(LABELS))
+    expected = f1_score(y_true, np.argmax(y_pred_proba, axis=1), labels=range(len(LABELS)), average=None,
+                        zero_division=0)
+    np.testing.assert_allclose(scores.f1_score_per_class(), expected)
+
+
+def test_mcc_of_a_constant_prediction_is_zero():
+    y_test, y_pred_proba = random_predictions(4)
+    y_pred_proba = np.tile([0.1, 0.6, 0.2, 0.1], (len(y_test), 1))
+    scores = ConfusionMatrixScores(np.argmax(np.asarray(y_test), axis=1), y_pred_proba, len(LABELS))
+    assert scores.mcc() == 0
+    assert scores.confusion_matrix.sum() == len(y_test)
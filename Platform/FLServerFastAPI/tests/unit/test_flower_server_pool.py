@@ -0,0 +1,110 @@
+import asyncio
+import os
+import socket
+import time
+
+import pytest
+
+import tests.unit.test_flower_server_pool as this_module
+from flower_server_pool import FlowerServerPool
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+# Jobs of the workers, in place of Server.run_server.
+def serve(connection_port, outcome="finish"):
+    if outcome == "fail":
+        raise ValueError("The Flower server failed before it was reachable")
+    if outcome == "hang":
+        # Waits for its clients without accepting connections.
+        time.sleep(600)
+        return
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("localhost", int(connection_port)))
+        server.listen()
+        # "hold" waits for clients that never come.
+        time.sleep(600 if outcome == "hold" else 0.5)
+    if outcome == "die":
+        os._exit(1)
+
+
+def test_jobs_finish_fail_and_survive_the_death_of_their_worker():
+    async def scenario():
+        pool = FlowerServerPool(number_of_workers=1, readiness_timeout=30, run_job=serve)
+        try:
+            job_id = await pool.start_server({"connection_port": free_port()})
+            await pool.wait_until_finished(job_id)
+
+            with pytest.raises(RuntimeError, match="failed"):
+                await pool.start_server({"connection_port": free_port(), "outcome": "fail"})
+
+            # The server is reachable, then its worker dies before the end of the run.
+            job_id = await pool.start_server({"connection_port": free_port(), "outcome": "die"})
+            with pytest.raises(RuntimeError, match="died"):
+                await pool.wait_until_finished(job_id)
+
+            # The worker was respawned.
+            job_id = await pool.start_server({"connection_port": free_port()})
+            await pool.wait_until_finished(job_id)
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_jobs_that_no_worker_takes_time_out(monkeypatch):
+    # The workers cannot load this job, they die before they are ready.
+    def missing_job(connection_port):
+        pass
+    missing_job.__qualname__ = "missing_job"
+    monkeypatch.setattr(this_module, "missing_job", missing_job, raising=False)
+
+    async def scenario():
+        pool = FlowerServerPool(number_of_workers=1, readiness_timeout=2, run_job=missing_job)
+        try:
+            with pytest.raises(TimeoutError):
+                await pool.start_server({"connection_port": free_port()})
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_servers_that_never_become_reachable_are_cancelled():
+    async def scenario():
+        pool = FlowerServerPool(number_of_workers=1, readiness_timeout=5, run_job=serve)
+        try:
+            with pytest.raises(TimeoutError):
+                await pool.start_server({"connection_port": free_port(), "outcome": "hang"})
+
+            # The only worker was freed for the next job.
+            job_id = await pool.start_server({"connection_port": free_port()})
+            await pool.wait_until_finished(job_id)
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_jobs_fail_and_free_their_worker():
+    async def scenario():
+        pool = FlowerServerPool(number_of_workers=1, readiness_timeout=30, run_job=serve)
+        try:
+            job_id = await pool.start_server({"connection_port": free_port(), "outcome": "hold"})
+            finished = pool._finished_jobs[job_id]
+            assert pool.cancel(job_id)
+            with pytest.raises(RuntimeError, match="cancelled"):
+                await finished
+            assert not pool.cancel(job_id)
+
+            job_id = await pool.start_server({"connection_port": free_port()})
+            await pool.wait_until_finished(job_id)
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from metrics.MetricCodec import encode_metric_vector, decode_metric_vector, decode_metric_values
+from metrics.Metrics import return_default_metric_vector
+
+
+@pytest.fixture
+def shapley_value():
+    metric_vector = return_default_metric_vector(["F1Score", "MCC", "F1ScoreMacro"], 3)
+    metric_vector.set_value_of_metric("CrossEntropyLoss", -0.0123)
+    metric_vector.set_value_of_metric("Accuracy", 1 / 3)
+    metric_vector.set_value_of_metric("F1Score", [0.25, -1e-7, 0.5])
+    metric_vector.set_value_of_metric("MCC", 0.2)
+    return metric_vector
+
+
+def test_round_trip(shapley_value):
+    decoded = decode_metric_vector(encode_metric_vector(shapley_value))
+    assert decoded.schema is shapley_value.schema
+    np.testing.assert_array_equal(decoded.values, shapley_value.values)
+    # The decoded vector owns its values, so it can be accumulated in place.
+    decoded += shapley_value
+    assert decoded.get_value_of_metric("MCC") == pytest.approx(0.4)
+
+
+def test_binary_and_legacy_string_values_match(shapley_value):
+    binary_values = decode_metric_values(encode_metric_vector(shapley_value))
+    assert binary_values == decode_metric_values(str(shapley_value))
+    assert binary_values["F1Score"] == [0.25, -1e-7, 0.5]
+    assert type(binary_values["Accuracy"]) is float
+
+
+def test_unknown_encodings_are_rejected(shapley_value):
+    encoded = bytearray(encode_metric_vector(shapley_value))
+    encoded[2] = 99
+    with pytest.raises(ValueError):
+        decode_metric_vector(bytes(encoded))
@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from metrics.Metrics import DictOfMetrics, Accuracy, CrossEntropyLoss, SVCompatibleF1Score, \
+    SVCompatibleMatthewsCorrelationCoefficient, MetricVector, metric_schema, return_default_metric_vector
+from util.Util import from_string_to_dict
+
+METRICS = ["Accuracy", "F1Score", "CrossEntropyLoss", "MCC"]
+
+
+def dict_of_metrics(accuracy, f1_score, loss, mcc):
+    return DictOfMetrics({"Accuracy": Accuracy(accuracy),
+                          "F1Score": SVCompatibleF1Score(np.asarray(f1_score)),
+                          "CrossEntropyLoss": CrossEntropyLoss(loss),
+                          "MCC": SVCompatibleMatthewsCorrelationCoefficient(mcc)})
+
+
+FIRST = dict_of_metrics(0.8, [0.7, 0.9, 0.5], 0.4, 0.6)
+SECOND = dict_of_metrics(0.6, [0.2, 0.3, 0.1], 0.9, 0.1)
+
+
+def assert_same_metrics(metric_vector, expected):
+    for metric in METRICS:
+        assert metric_vector.get_value_of_metric(metric) == pytest.approx(expected.get_value_of_metric(metric))
+
+
+@pytest.mark.parametrize("operation", [
+    lambda first, second: first + second,
+    lambda first, second: first - second,
+    lambda first, second: second - first,
+    lambda first, second: first * 3,
+    lambda first, second: first / 4,
+    lambda first, second: abs(second - first),
+])
+def test_arithmetic_matches_dict_of_metrics(operation):
+    first, second = MetricVector.from_dict_of_metrics(FIRST), MetricVector.from_dict_of_metrics(SECOND)
+    assert_same_metrics(operation(first, second), operation(FIRST, SECOND))
+
+
+def test_in_place_operations_and_mixed_operands():
+    accumulated = return_default_metric_vector(METRICS, 3)
+    accumulated += MetricVector.from_dict_of_metrics(FIRST)
+    accumulated += SECOND
+    accumulated /= 2
+    assert_same_metrics(accumulated, (FIRST + SECOND) / 2)
+    # The loss of a difference is reversed, like CrossEntropyLoss.__sub__.
+    assert (accumulated - FIRST).get_value_of_metric("CrossEntropyLoss") == pytest.approx(0.4 - 0.65)
+
+
+def test_schema_is_shared_and_sorted():
+    assert metric_schema(["MCC", "Accuracy", "CrossEntropyLoss"], 3) is \
+        metric_schema(["CrossEntropyLoss", "Accuracy", "MCC"], 3)
+    assert return_default_metric_vector(["Accuracy"], 3).schema.metric_names == ("CrossEntropyLoss", "Accuracy")
+
+
+def test_compatibility_with_the_flower_dictionaries():
+    metric_vector = MetricVector.from_dict_of_metrics(FIRST)
+    flower_dict = metric_vector.return_flower_dict()
+    assert flower_dict["F1Score"] == [0.7, 0.9, 0.5]
+    assert flower_dict["Accuracy"] == 0.8
+    assert metric_vector.return_flower_dict_as_str()["F1Score"] == "[0.7, 0.9, 0.5]"
+    assert metric_vector.get_value()["MCC"].get_value() == 0.6
+    parsed = from_string_to_dict(str(metric_vector))
+    assert parsed == {"CrossEntropyLoss": "0.4", "Accuracy": "0.8", "F1Score": "[0.7, 0.9, 0.5]", "MCC": "0.6"}
+    assert_same_metrics(metric_vector.to_dict_of_metrics(), FIRST)
+
+
+def test_pickled_vectors_keep_working_with_the_shared_schema():
+    metric_vector = pickle.loads(pickle.dumps(MetricVector.from_dict_of_metrics(FIRST)))
+    assert_same_metrics(metric_vector + MetricVector.from_dict_of_metrics(SECOND), FIRST + SECOND)
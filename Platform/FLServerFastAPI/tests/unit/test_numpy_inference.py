@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from experiment_parameters.model_builder.Model import dense_forward
+
+ACTIVATIONS = ["relu", "tanh", "softmax"]
+LAYER_SIZES = [6, 8, 5, 3]
+
+
+def random_weights(generator):
+    weights = []
+    for inputs, units in zip(LAYER_SIZES[:-1], LAYER_SIZES[1:]):
+        weights.append(generator.normal(size=(inputs, units)).astype(np.float32))
+        weights.append(generator.normal(size=units).astype(np.float32))
+    return weights
+
+
+def test_dense_forward_matches_a_manual_forward_pass():
+    generator = np.random.default_rng(0)
+    weights = random_weights(generator)
+    x = generator.normal(size=(10, LAYER_SIZES[0]))
+
+    hidden = np.maximum(x @ weights[0] + weights[1], 0)
+    hidden = np.tanh(hidden @ weights[2] + weights[3])
+    logits = hidden @ weights[4] + weights[5]
+    expected = np.exp(logits) / np.sum(np.exp(logits), axis=1, keepdims=True)
+
+    predictions = dense_forward(weights, ACTIVATIONS, x)
+    assert predictions.dtype == np.float32
+    np.testing.assert_allclose(predictions, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_stacked_dense_forward_matches_one_model_at_a_time():
+    generator = np.random.default_rng(1)
+    list_of_weights = [random_weights(generator) for _ in range(4)]
+    x = generator.normal(size=(10, LAYER_SIZES[0]))
+
+    stacked = dense_forward([np.stack(layers) for layers in zip(*list_of_weights)], ACTIVATIONS, x)
+    assert stacked.shape == (4, 10, LAYER_SIZES[-1])
+    for weights, predictions in zip(list_of_weights, stacked):
+        np.testing.assert_allclose(predictions, dense_forward(weights, ACTIVATIONS, x), rtol=1e-6)
+
+
+def test_numpy_inference_matches_keras():
+    keras = pytest.importorskip("keras", minversion="3")
+    from experiment_parameters.model_builder.Model import MLPModel
+
+    keras.utils.set_random_seed(0)
+    ml_model = keras.Sequential()
+    ml_model.add(keras.Input(shape=(LAYER_SIZES[0],)))
+    ml_model.add(keras.layers.Dense(LAYER_SIZES[1], activation="relu"))
+    ml_model.add(keras.layers.Dropout(0.3))
+    ml_model.add(keras.layers.Dense(LAYER_SIZES[2], activation="sigmoid"))
+    ml_model.add(keras.layers.Dropout(0.3))
+    ml_model.add(keras.layers.Dense(LAYER_SIZES[3], activation="softmax"))
+    model = MLPModel(ml_model)
+    x = np.random.default_rng(2).normal(size=(32, LAYER_SIZES[0]))
+
+    assert model.dense_activations() == ["relu", "sigmoid", "softmax"]
+    np.testing.assert_allclose(model.predict_proba_numpy(x), model.predict_proba(x), rtol=1e-5, atol=1e-6)
+
+    other_weights = [weights * 0.5 for weights in ml_model.get_weights()]
+    many = model.predict_proba_many([ml_model.get_weights(), other_weights], x)
+    model.set_model(other_weights)
+    np.testing.assert_allclose(many[1], model.predict_proba(x), rtol=1e-5, atol=1e-6)
+
+
+def test_numpy_inference_can_be_disabled():
+    pytest.importorskip("keras", minversion="3")
+    from experiment_parameters.model_builder.Model import MLPModel
+
+    assert MLPModel(None, numpy_inference=False).predict_proba_numpy(np.zeros((1, 1))) is None
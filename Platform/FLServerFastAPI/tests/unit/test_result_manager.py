@@ -0,0 +1,88 @@
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics.ResultManager import FlowerMetricManager, SVCompatibleFlowerMetricManager, RESULT_BUNDLE_MANIFEST
+
+METRICS = ["Accuracy", "F1Score"]
+CLIENTS = ["1", "2"]
+CLASSES = ["yes", "no", "maybe"]
+
+
+def test_evaluation_results_are_materialized_as_dataframes():
+    manager = FlowerMetricManager("configuration", METRICS, CLIENTS, 3, CLASSES)
+    manager.add_result("Accuracy", "2", 1, 0.5)
+    manager.add_result("Accuracy", "Aggregated", 3, 0.75)
+    manager.add_result("F1Score", "1", 2, [0.1, 0.2, 0.3])
+    # Evaluators that were not declared are appended, as .loc would do.
+    manager.add_result("Accuracy", "Global", 2, 0.6)
+
+    dataframes = manager.get_global_dataframes()
+    accuracy = dataframes["Evaluation_Accuracy"]
+    assert list(accuracy.index) == [1, 2, 3]
+    assert list(accuracy.columns) == ["1", "2", "Aggregated", "Global"]
+    assert accuracy.loc[1, "2"] == 0.5 and accuracy.loc[3, "Aggregated"] == 0.75 and accuracy.loc[2, "Global"] == 0.6
+    assert accuracy.isna().to_numpy().sum() == 9
+
+    f1_score = dataframes["Evaluation_F1Score"]
+    assert list(f1_score.columns) == list(pd.MultiIndex.from_product([["1", "2", "Aggregated", "Global"], CLASSES]))
+    assert list(f1_score.loc[2, "1"]) == [0.1, 0.2, 0.3]
+
+
+def test_shapley_values_are_materialized_with_the_multiindex_layout(tmp_path):
+    manager = SVCompatibleFlowerMetricManager("configuration", METRICS, CLIENTS, 2, CLASSES)
+    manager.add_shapley_value("Accuracy", "1", "2", 2, 0.25)
+    manager.add_shapley_value("Accuracy", "Aggregated", "1", 0, -0.5)
+    manager.add_shapley_value("F1Score", "2", "1", 1, np.array([0.4, 0.5, 0.6]))
+    manager.add_shapley_value("CosineSimilarity", "1", "1", 1, 0.9)
+
+    dataframes = manager.get_sv_dataframes()
+    accuracy = dataframes["SV_Accuracy"]
+    assert accuracy.index.names == ["Round", "Evaluator"]
+    assert len(accuracy) == 3 * 3 and list(accuracy.columns) == CLIENTS
+    assert accuracy.loc[(2, "1"), "2"] == 0.25 and accuracy.loc[(0, "Aggregated"), "1"] == -0.5
+    f1_score = dataframes["SV_F1Score"]
+    assert f1_score.index.names == ["Round", "Evaluator", "Classes"]
+    assert [f1_score.loc[(1, "2", label), "1"] for label in CLASSES] == [0.4, 0.5, 0.6]
+    assert pd.isna(f1_score.loc[(1, "2", "yes"), "2"])
+    assert dataframes["SV_CosineSimilarity"].loc[(1, "1"), "1"] == 0.9
+
+    manager.save_dataframes_as_csv(str(tmp_path))
+    saved = pd.read_csv(tmp_path / "Shapley_Value" / "SV_Accuracy", index_col=[0, 1], dtype={"Evaluator": str})
+    assert saved.loc[(2, "1"), "2"] == pytest.approx(0.25)
+    assert (tmp_path / "Evaluation" / "Evaluation_F1Score").exists()
+
+
+def test_managers_of_different_configurations_do_not_share_results(tmp_path, monkeypatch):
+    first = SVCompatibleFlowerMetricManager("first", METRICS, CLIENTS, 2, CLASSES)
+    second = FlowerMetricManager("second", ["Accuracy"], ["1", "2", "3"], 1, CLASSES)
+    first.add_result("Accuracy", "1", 1, 0.5)
+    second.add_result("Accuracy", "3", 1, 0.9)
+
+    assert set(second.get_global_dataframes()) == {"Evaluation_Accuracy"}
+    assert first.get_global_dataframes()["Evaluation_Accuracy"].loc[1, "1"] == 0.5
+    assert "3" not in first.get_global_dataframes()["Evaluation_Accuracy"].columns
+
+    # Without a path, the results are saved in the directory of their configuration.
+    monkeypatch.chdir(tmp_path)
+    second.save_dataframes_as_csv()
+    assert (tmp_path / "results" / "second" / "Evaluation" / "Evaluation_Accuracy").exists()
+    assert not (tmp_path / "results" / "first").exists()
+
+
+def test_saved_results_are_bundled_with_their_layout(tmp_path):
+    manager = SVCompatibleFlowerMetricManager("configuration", METRICS, CLIENTS, 1, CLASSES)
+    manager.add_result("Accuracy", "1", 1, 0.5)
+    bundle_path = manager.save_dataframes_as_csv(str(tmp_path))
+
+    with zipfile.ZipFile(bundle_path) as bundle:
+        manifest = json.loads(bundle.read(RESULT_BUNDLE_MANIFEST))
+        assert set(bundle.namelist()) == {name + ".csv" for name in manifest} | {RESULT_BUNDLE_MANIFEST}
+        assert bundle.read("Evaluation_Accuracy.csv").decode() == \
+            (tmp_path / "Evaluation" / "Evaluation_Accuracy").read_text()
+    assert manifest["Evaluation_F1Score"] == {"header_rows": 2, "index_columns": 1}
+    assert manifest["SV_F1Score"] == {"header_rows": 1, "index_columns": 3}
+    assert "SV_CosineSimilarity" in manifest
@@ -0,0 +1,151 @@
+import random
+
+import pytest
+
+from metrics.ShapleyGTG import ShapleyGTG, create_shapley_values, ShapleyGTGNN, ShapleyGTGDT, PERMUTATIONS_PER_CLIENT
+from metrics.Shapley_Values import ShapleyValues, ShapleyValuesNN, ShapleyValuesDT, COALITION_BATCH_SIZE
+from tests.unit.conftest import METRIC_LIST, metric_vector
+
+CLIENTS = ["c1", "c2", "c3", "c4"]
+INITIAL_ACCURACY = 0.5
+CLIENT_GAINS = {"c1": 0.05, "c2": 0.1, "c3": 0.2, "c4": 0.0}
+
+
+def additive_game(coalition):
+    """Each client adds its own gain to the accuracy, so its Shapley value is exactly that gain."""
+    return metric_vector(INITIAL_ACCURACY + sum(CLIENT_GAINS[client] for client in coalition), 0.7)
+
+
+def synergy_game(coalition):
+    """c1 and c2 are only useful together."""
+    accuracy = INITIAL_ACCURACY + 0.1 * len(coalition)
+    if "c1" in coalition and "c2" in coalition:
+        accuracy += 0.2
+    return metric_vector(accuracy, 0.7)
+
+
+def counting(game, batches=None):
+    evaluated = []
+
+    def evaluate_coalitions(coalitions):
+        if batches is not None:
+            batches.append(len(coalitions))
+        evaluated.extend(frozenset(coalition) for coalition in coalitions)
+        return [game(coalition) for coalition in coalitions]
+    return evaluate_coalitions, evaluated
+
+
+def round_accuracies(estimator, local_round=1):
+    return {client: sv.get_value_of_metric("Accuracy")
+            for client, sv in estimator.get_round_shapley_values(local_round).items()}
+
+
+def exact_shapley_values(game, y_test, clients=CLIENTS, batches=None):
+    estimator = ShapleyValues(None, y_test, 1, METRIC_LIST)
+    estimator.set_last_round_results(metric_vector(INITIAL_ACCURACY, 0.7))
+    evaluate_coalitions, evaluated = counting(game, batches)
+    estimator._exact_shapley_values_calculation(clients, evaluate_coalitions, 1)
+    estimator.last_division(1)
+    return round_accuracies(estimator), evaluated
+
+
+def gtg_shapley_values(game, y_test, **parameters):
+    estimator = ShapleyGTG(None, y_test, 1, METRIC_LIST, **parameters)
+    estimator.set_last_round_results(metric_vector(INITIAL_ACCURACY, 0.7))
+    evaluate_coalitions, evaluated = counting(game)
+    estimator._gtg_shapley_values_calculation(CLIENTS, evaluate_coalitions, 1)
+    return round_accuracies(estimator), evaluated
+
+
+def test_exact_evaluates_each_coalition_once(y_test):
+    shapley_values, evaluated = exact_shapley_values(additive_game, y_test)
+    assert len(evaluated) == 2 ** len(CLIENTS) - 1
+    assert len(set(evaluated)) == len(evaluated)
+    assert shapley_values == pytest.approx(CLIENT_GAINS)
+
+
+def test_exact_evaluates_coalitions_in_bounded_batches(y_test):
+    clients = [f"c{index}" for index in range(6)]
+    batches = []
+    shapley_values, evaluated = exact_shapley_values(lambda coalition: metric_vector(0.5 + 0.01 * len(coalition), 0.7),
+                                                     y_test, clients, batches)
+    assert sum(batches) == len(evaluated) == 2 ** len(clients) - 1
+    assert len(batches) > 1 and max(batches) <= COALITION_BATCH_SIZE
+    assert shapley_values == pytest.approx({client: 0.01 for client in clients})
+
+
+def test_gtg_recovers_additive_contributions(y_test):
+    shapley_values, evaluated = gtg_shapley_values(additive_game, y_test, seed=0)
+    assert shapley_values == pytest.approx(CLIENT_GAINS)
+    assert len(set(evaluated)) == len(evaluated)
+
+
+def test_gtg_approximates_exact_values(y_test):
+    exact_values, _ = exact_shapley_values(synergy_game, y_test)
+    gtg_values, _ = gtg_shapley_values(synergy_game, y_test, seed=3, max_permutations=200, tolerance=0.01)
+    assert gtg_values == pytest.approx(exact_values, abs=0.02)
+    # Efficiency: the contributions add up to the improvement of the round.
+    assert sum(gtg_values.values()) == pytest.approx(synergy_game(CLIENTS).get_value_of_metric("Accuracy") -
+                                                     INITIAL_ACCURACY)
+
+
+def test_gtg_is_reproducible_with_a_seed(y_test):
+    first_values, _ = gtg_shapley_values(synergy_game, y_test, seed=7, max_permutations=8)
+    second_values, _ = gtg_shapley_values(synergy_game, y_test, seed=7, max_permutations=8)
+    assert first_values == second_values
+
+
+def test_gtg_respects_the_sampling_budget(y_test):
+    estimator = ShapleyGTG(None, y_test, 1, METRIC_LIST, seed=0, max_permutations=6)
+    estimator.set_last_round_results(metric_vector(INITIAL_ACCURACY, 0.7))
+    evaluate_coalitions, evaluated = counting(synergy_game)
+    estimator._gtg_shapley_values_calculation(CLIENTS, evaluate_coalitions, 1)
+    # Each permutation evaluates at most one coalition per client.
+    assert len(evaluated) <= 1 + 6 * len(CLIENTS)
+
+
+def test_gtg_default_budget_grows_linearly_with_the_clients(y_test):
+    clients = [f"c{index}" for index in range(20)]
+
+    def noisy_game(coalition):
+        """Every coalition has an unrelated accuracy, so the estimation does not converge."""
+        return metric_vector(INITIAL_ACCURACY + 0.3 * random.Random(str(sorted(coalition))).random(), 0.7)
+
+    estimator = ShapleyGTG(None, y_test, 1, METRIC_LIST, seed=0)
+    estimator.set_last_round_results(metric_vector(INITIAL_ACCURACY, 0.7))
+    evaluate_coalitions, evaluated = counting(noisy_game)
+    estimator._gtg_shapley_values_calculation(clients, evaluate_coalitions, 1)
+    assert len(evaluated) <= 1 + PERMUTATIONS_PER_CLIENT * len(clients) * len(clients)
+
+
+def test_gtg_truncates_rounds_without_improvement(y_test):
+    estimator = ShapleyGTG(None, y_test, 1, METRIC_LIST, seed=0)
+    estimator.set_last_round_results(metric_vector(INITIAL_ACCURACY, 0.7))
+    evaluate_coalitions, evaluated = counting(lambda coalition: metric_vector(INITIAL_ACCURACY, 0.7))
+    estimator._gtg_shapley_values_calculation(CLIENTS, evaluate_coalitions, 1)
+    # Only the coalition of all clients, i.e. the global model, is evaluated.
+    assert evaluated == [frozenset(CLIENTS)]
+    assert round_accuracies(estimator) == {client: 0 for client in CLIENTS}
+
+
+def test_gtg_needs_the_accuracy(y_test):
+    with pytest.raises(ValueError):
+        ShapleyGTG(None, y_test, 1, ["CrossEntropyLoss"])
+
+
+@pytest.mark.parametrize("config, decision_tree, expected_class", [
+    ({"num_rounds": 2}, False, ShapleyValuesNN),
+    ({"num_rounds": 2, "shapley_method": "Exact"}, True, ShapleyValuesDT),
+    ({"num_rounds": 2, "shapley_method": "GTG", "shapley_max_permutations": 0, "shapley_seed": -1}, False,
+     ShapleyGTGNN),
+    ({"num_rounds": 2, "shapley_method": "GTG", "shapley_max_permutations": 50, "shapley_seed": 1}, True,
+     ShapleyGTGDT),
+])
+def test_create_shapley_values(config, decision_tree, expected_class, y_test):
+    estimator = create_shapley_values(config, None, y_test, METRIC_LIST, decision_tree=decision_tree)
+    assert type(estimator) is expected_class
+
+
+def test_create_shapley_values_rejects_unknown_methods(y_test):
+    with pytest.raises(ValueError):
+        create_shapley_values({"num_rounds": 2, "shapley_method": "Banzhaf"}, None, y_test, METRIC_LIST)
@@ -0,0 +1,184 @@
+import asyncio
+import socket
+import uuid
+
+import pytest
+
+from port_allocator import PortAllocator, NoFreePortError
+from training_session import TrainingManager, TrainingSessionFailedError
+
+
+@pytest.fixture
+def bindable_ports(monkeypatch):
+    monkeypatch.setattr(PortAllocator, "_is_bindable", staticmethod(lambda port: True))
+
+
+class FakeServerPool:
+    """Records the jobs in place of the FlowerServerPool."""
+
+    def __init__(self):
+        self.started = []
+        self.cancelled = []
+
+    async def start_server(self, server_arguments):
+        self.started.append(server_arguments)
+        return f"job-{len(self.started)}"
+
+    def cancel(self, job_id):
+        self.cancelled.append(job_id)
+        return True
+
+
+def configuration(priority=0):
+    return {"configuration_id": uuid.uuid4().hex,
+            "group_members": [],
+            "number_clients": 1,
+            "compute_shapley_values": 0,
+            "strategy": "FedAvg",
+            "dataset": "dataset",
+            "validation_configuration": {"dataset_features": [{"valid_values": [0, 1]}]},
+            "dataset_input_size": 4,
+            "dataset_output_size": 2,
+            "model": "mlp",
+            "rounds": 1,
+            "hyperparameter_search": False,
+            "hyperparameter_space": {},
+            "hyperparameter_search_rounds": 0,
+            "priority": priority}
+
+
+def test_ports_are_leased_once_per_owner_and_released(bindable_ports):
+    allocator = PortAllocator(54000, 54001)
+    assert allocator.lease("a") == 54000
+    assert allocator.lease("a") == 54000
+    assert allocator.lease("b") == 54001
+    with pytest.raises(NoFreePortError):
+        allocator.lease("c")
+
+    assert allocator.release("a") == 54000
+    assert allocator.release("a") is None
+    assert allocator.lease("c") == 54000
+    assert allocator.leases == {54000: "c", 54001: "b"}
+
+
+def test_ports_used_by_other_processes_are_skipped():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as other_process:
+        other_process.bind(("0.0.0.0", 0))
+        other_process.listen()
+        port = other_process.getsockname()[1]
+        with pytest.raises(NoFreePortError):
+            PortAllocator(port, port).lease("a")
+
+
+def test_sessions_are_admitted_by_priority_then_in_arrival_order(bindable_ports):
+    async def scenario():
+        manager = TrainingManager()
+        manager.port_allocator = PortAllocator(54000, 54009)
+        manager.max_concurrent_sessions = 1
+        first, second, urgent, third = [manager.create_training_session(configuration(priority))
+                                        for priority in [0, 0, 5, 0]]
+        await manager.wait_for_slot(first)
+        assert first.connection_ip == "localhost:54000"
+        waiting = [asyncio.create_task(manager.wait_for_slot(session)) for session in [second, urgent, third]]
+        await asyncio.sleep(0)
+        assert manager.get_resource_usage()["waiting_sessions"] == [urgent.configuration_id,
+                                                                    second.configuration_id,
+                                                                    third.configuration_id]
+
+        admitted = []
+        for session in [first, urgent, second]:
+            manager.close_training_session(session.configuration_id)
+            await asyncio.sleep(0)
+            admitted.append([other.configuration_id for other in [second, urgent, third] if other.admitted.is_set()])
+        await asyncio.gather(*waiting)
+
+        assert admitted == [[urgent.configuration_id],
+                            [second.configuration_id, urgent.configuration_id],
+                            [second.configuration_id, urgent.configuration_id, third.configuration_id]]
+        # The port of every closed session is leased again.
+        assert third.connection_ip == "localhost:54000"
+        assert list(manager.active_sessions) == [third.configuration_id]
+        # The sessions do not share their lock.
+        assert first.lock is not second.lock
+
+    asyncio.run(scenario())
+
+
+def test_closing_a_waiting_session_removes_it_from_the_queue(bindable_ports):
+    async def scenario():
+        manager = TrainingManager()
+        manager.port_allocator = PortAllocator(54000, 54009)
+        manager.max_concurrent_sessions = 1
+        running, abandoned, next_session = [manager.create_training_session(configuration()) for _ in range(3)]
+        await manager.wait_for_slot(running)
+        waiting = [asyncio.create_task(manager.wait_for_slot(session)) for session in [abandoned, next_session]]
+        await asyncio.sleep(0)
+
+        manager.close_training_session(abandoned.configuration_id)
+        assert manager.get_resource_usage()["waiting_sessions"] == [next_session.configuration_id]
+        manager.close_training_session(running.configuration_id)
+        await waiting[1]
+        assert not abandoned.admitted.is_set()
+        waiting[0].cancel()
+
+    asyncio.run(scenario())
+
+
+def test_the_flower_server_of_a_session_left_mid_run_is_cancelled(bindable_ports):
+    async def scenario():
+        manager = TrainingManager()
+        manager.server_pool = FakeServerPool()
+        manager.port_allocator = PortAllocator(54000, 54009)
+        manager.max_concurrent_sessions = 2
+        left, completed = [manager.create_training_session(configuration()) for _ in range(2)]
+        for session in [left, completed]:
+            session.server_pool = manager.server_pool
+            await manager.wait_for_slot(session)
+            await session.get_flower_server()
+
+        manager.close_training_session(left.configuration_id)
+        manager.close_training_session(completed.configuration_id, completed=True)
+
+        assert left.server_job_id == "job-1" and completed.server_job_id == "job-2"
+        assert manager.server_pool.cancelled == ["job-1"]
+        assert manager.active_sessions == {}
+
+    asyncio.run(scenario())
+
+
+class FailingServerPool(FakeServerPool):
+    async def start_server(self, server_arguments):
+        self.started.append(server_arguments)
+        raise TimeoutError("Flower server on port 54000 was not reachable")
+
+
+class Participant:
+    """Websocket of a participant."""
+
+    def __init__(self):
+        self.close_code = None
+
+    async def close(self, code, reason):
+        self.close_code = code
+
+
+def test_a_session_whose_server_cannot_start_fails_once_for_all_its_participants(bindable_ports):
+    async def scenario():
+        manager = TrainingManager()
+        manager.server_pool = FailingServerPool()
+        manager.port_allocator = PortAllocator(54000, 54009)
+        session = manager.create_training_session(configuration())
+        session.server_pool = manager.server_pool
+        participants = [Participant() for _ in range(3)]
+        session.connection_manager.active_connections.extend(participants)
+        await session.update_barrier(len(participants))
+        await manager.wait_for_slot(session)
+
+        results = await asyncio.gather(*[session.get_flower_server() for _ in participants], return_exceptions=True)
+
+        assert all(isinstance(result, TrainingSessionFailedError) for result in results)
+        assert len(manager.server_pool.started) == 1
+        assert [participant.close_code for participant in participants] == [1011] * 3
+        assert not session.process_running
+
+    asyncio.run(scenario())
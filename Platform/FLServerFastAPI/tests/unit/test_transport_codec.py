@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from flwr.common import FitRes, Status, Code, bytes_to_ndarray, ndarrays_to_parameters, parameters_to_ndarrays
+
+from experiment_parameters.strategies.server.FedAvgRewritten import FedAvgRewritten
+from tests.unit.conftest import METRIC_LIST
+from util.TransportCodec import TransportCodec, decode_parameters, is_encoded
+from util.WeightStore import WeightCache
+
+
+def weights(seed):
+    generator = np.random.default_rng(seed)
+    return [generator.normal(size=(200, 50)).astype(np.float32), generator.normal(size=50).astype(np.float32)]
+
+
+@pytest.mark.parametrize("quantization, tolerance", [("none", 0), ("float16", 1e-2), ("int8", 5e-2)])
+def test_weights_round_trip(quantization, tolerance):
+    model = weights(0)
+    payload = TransportCodec(quantization).encode(model)
+
+    assert is_encoded(payload) and not is_encoded(model)
+    decoded = decode_parameters(payload)
+    assert [layer.dtype for layer in decoded] == [np.float32, np.float32]
+    assert all(np.allclose(layer, original, atol=tolerance) for layer, original in zip(decoded, model))
+    # Models that are not encoded pass through.
+    assert decode_parameters(model) is model
+
+
+def test_sparsified_differences_are_corrected_by_the_error_feedback():
+    reference = weights(0)
+    model = [layer + 0.01 * update for layer, update in zip(reference, weights(1))]
+    codec = TransportCodec("int8", top_k=0.1)
+
+    payload = codec.encode(model, reference)
+    assert payload[0].nbytes < sum(layer.nbytes for layer in model) / 5
+    with pytest.raises(ValueError):
+        decode_parameters(payload)
+
+    # The entries that were not sent are sent in the following rounds, the sum of the updates converges.
+    received = decode_parameters(payload, reference)[0] - reference[0]
+    for _ in range(29):
+        received += decode_parameters(codec.encode(model, reference), reference)[0] - reference[0]
+    assert np.abs(received / 30 - (model[0] - reference[0])).max() < 0.01
+
+
+def test_zstd_compression():
+    pytest.importorskip("zstandard")
+    model = [np.zeros((100, 100), dtype=np.float32)]
+    payload = TransportCodec(compression="zstd").encode(model)
+    assert payload[0].nbytes < 1000
+    assert np.array_equal(decode_parameters(payload)[0], model[0])
+
+
+def fedavg(initial_weights, compute_shapley_values=0, quantization="float16"):
+    return FedAvgRewritten(max_round=2,
+                           possible_outputs=["yes", "no"],
+                           model=SimpleNamespace(set_model=lambda model: None),
+                           final_training=0,
+                           metric_list=METRIC_LIST,
+                           tracked_study=None,
+                           tracked_trial=None,
+                           model_final_name="test",
+                           compute_shapley_values=compute_shapley_values,
+                           result_path="",
+                           initial_parameters=ndarrays_to_parameters(initial_weights),
+                           transport_configuration={"quantization": quantization})
+
+
+def fit_result(cid, strategy, initial_weights, local_weights):
+    client_codec = TransportCodec.from_fit_config(strategy._transport_codec.fit_config())
+    return (SimpleNamespace(cid=cid), FitRes(Status(Code.OK, ""),
+                                             ndarrays_to_parameters(client_codec.encode(local_weights,
+                                                                                        initial_weights)),
+                                             10,
+                                             {"client_number": cid}))
+
+
+def test_fedavg_adds_the_client_differences_to_the_global_model():
+    initial_weights = weights(0)
+    strategy = fedavg(initial_weights)
+    local_weights = [layer + 1 for layer in initial_weights]
+    results = [fit_result("a", strategy, initial_weights, local_weights)]
+
+    parameters, _ = strategy.aggregate_fit(1, results, [])
+
+    assert is_encoded(parameters_to_ndarrays(parameters))
+    sent = decode_parameters(parameters_to_ndarrays(parameters))
+    assert all(np.allclose(layer, local, atol=1e-2) for layer, local in zip(sent, local_weights))
+    # The global model of the server is kept in full precision, the next updates are added to it.
+    assert all(np.allclose(layer, local, atol=1e-6) for layer, local in zip(strategy._global_weights, local_weights))
+
+
+def test_the_global_model_is_quantized_until_the_last_round():
+    initial_weights = weights(0)
+    strategy = fedavg(initial_weights, quantization="int8")
+
+    first_local_weights = [layer + 0.5 for layer in initial_weights]
+    parameters, _ = strategy.aggregate_fit(1, [fit_result("a", strategy, initial_weights, first_local_weights)], [])
+    first_received = decode_parameters(parameters_to_ndarrays(parameters))
+    assert not all(np.array_equal(layer, local) for layer, local in zip(first_received, strategy._global_weights))
+    assert all(np.allclose(layer, local, atol=5e-2) for layer, local in zip(first_received, first_local_weights))
+
+    # The client computes its difference against the quantized model it received.
+    second_local_weights = [layer - 0.25 for layer in first_received]
+    parameters, _ = strategy.aggregate_fit(2, [fit_result("a", strategy, first_received, second_local_weights)], [])
+    second_received = decode_parameters(parameters_to_ndarrays(parameters))
+
+    # The model of the last round reaches the clients as the server holds it.
+    assert all(np.array_equal(layer, server_layer)
+               for layer, server_layer in zip(second_received, strategy._global_weights))
+    assert all(np.allclose(layer, local, atol=5e-2) for layer, local in zip(second_received, second_local_weights))
+
+
+def test_clients_receive_the_reconstructed_updates_for_the_shapley_values():
+    initial_weights = weights(0)
+    strategy = fedavg(initial_weights, compute_shapley_values=1)
+    local_weights = {cid: [layer + seed for layer in initial_weights] for seed, cid in enumerate(["a", "b"])}
+    results = [fit_result(cid, strategy, initial_weights, local) for cid, local in local_weights.items()]
+
+    strategy.aggregate_fit(1, results, [])
+
+    # The client "a" does not hold the update the server reconstructed from its payload, it is sent to it too.
+    client_weights = WeightCache().resolve(strategy._weight_store.config_for("a"))
+    assert set(client_weights) == {"a", "b"}
+    for cid, (tensors, num_examples) in client_weights.items():
+        received = [bytes_to_ndarray(tensor) for tensor in tensors]
+        assert num_examples == 10
+        assert all(np.allclose(layer, local, atol=1e-2) for layer, local in zip(received, local_weights[cid]))
@@ -0,0 +1,53 @@
+import threading
+from types import SimpleNamespace
+
+from util.UploadResults import ResultsUploader, CachedToken
+
+
+class FakeSession:
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.uploads = []
+        self.token_requests = 0
+
+    def post(self, url, headers=None, data=None, files=None, timeout=None):
+        if data is not None:
+            self.token_requests += 1
+            return SimpleNamespace(raise_for_status=lambda: None,
+                                   json=lambda: {"access_token": f"token{self.token_requests}", "expires_in": 300})
+        self.uploads.append((url, headers, threading.current_thread().name))
+        return SimpleNamespace(status_code=self.status_codes.pop(0))
+
+
+def uploader_with(session):
+    return ResultsUploader(session=session, token=CachedToken(session, client_secret="secret"), backoff_seconds=0)
+
+
+def test_failed_uploads_are_retried_with_the_same_idempotency_key(tmp_path):
+    (tmp_path / "results.zip").write_bytes(b"bundle")
+    session = FakeSession([503, 200])
+    uploader = uploader_with(session)
+
+    response = uploader.submit("bundles/configuration", str(tmp_path / "results.zip"), "results.zip",
+                               "application/zip").result()
+
+    assert response.status_code == 200
+    (first_url, first_headers, thread_name), (_, second_headers, _) = session.uploads
+    assert first_url.endswith("results/bundles/configuration")
+    assert first_headers["Idempotency-Key"] == second_headers["Idempotency-Key"]
+    assert thread_name != threading.current_thread().name
+    # The token is cached between the attempts.
+    assert session.token_requests == 1
+
+
+def test_rejected_token_is_requested_again(tmp_path):
+    (tmp_path / "model.keras").write_bytes(b"model")
+    session = FakeSession([401, 200, 200])
+    uploader = uploader_with(session)
+
+    uploader.submit("models/configuration", str(tmp_path / "model.keras"), "model.keras", "application/file").result()
+    uploader.submit("models/configuration", str(tmp_path / "model.keras"), "model.keras", "application/file")
+    uploader.wait()
+
+    assert [headers["Authorization"] for _, headers, _ in session.uploads] == \
+           ["Bearer token1", "Bearer token2", "Bearer token2"]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from flwr.common import ndarrays_to_parameters, bytes_to_ndarray
+
+from util.WeightStore import WeightStore, WeightCache, BLOB_KEY_PREFIX, MANIFEST_KEY
+
+CLIENTS = ["c1", "c2", "c3"]
+
+
+def update(seed):
+    generator = np.random.default_rng(seed)
+    return ndarrays_to_parameters([generator.normal(size=(4, 3)).astype(np.float32),
+                                   generator.normal(size=3).astype(np.float32)]).tensors
+
+
+def sent_blobs(config):
+    return {key[len(BLOB_KEY_PREFIX):] for key in config if key.startswith(BLOB_KEY_PREFIX)}
+
+
+def test_clients_receive_only_the_updates_they_do_not_hold():
+    store = WeightStore()
+    caches = {cid: WeightCache() for cid in CLIENTS}
+    updates = {cid: update(seed) for seed, cid in enumerate(CLIENTS)}
+    for cid in CLIENTS:
+        caches[cid].put_own(updates[cid])
+    store.publish({cid: (tensors, 10 * (index + 1)) for index, (cid, tensors) in enumerate(updates.items())})
+
+    config = store.config_for("c1")
+    own_digest = store.get_manifest()["c1"][0]
+    assert own_digest not in sent_blobs(config) and len(sent_blobs(config)) == 2
+    client_weights = caches["c1"].resolve(config)
+    assert {cid: num_examples for cid, (_, num_examples) in client_weights.items()} == {"c1": 10, "c2": 20, "c3": 30}
+    np.testing.assert_array_equal(bytes_to_ndarray(client_weights["c2"][0][0]), bytes_to_ndarray(updates["c2"][0]))
+
+    # Next round: c3 sends the same update again, so c1, which holds it, does not receive it again.
+    store.acknowledge("c1", caches["c1"].held_weights())
+    new_updates = {"c1": update(10), "c2": update(11), "c3": updates["c3"]}
+    caches["c1"].put_own(new_updates["c1"])
+    store.publish({cid: (tensors, 1) for cid, tensors in new_updates.items()})
+    config = store.config_for("c1")
+    assert sent_blobs(config) == {store.get_manifest()["c2"][0]}
+    assert set(caches["c1"].resolve(config)) == set(CLIENTS)
+
+
+def test_tampered_or_missing_blobs_are_rejected():
+    store = WeightStore()
+    store.publish({"c1": (update(0), 1), "c2": (update(1), 1)})
+    config = store.config_for("c3")
+    digest = store.get_manifest()["c1"][0]
+    with pytest.raises(ValueError):
+        WeightCache().resolve(config | {BLOB_KEY_PREFIX + digest: b"other content"})
+    with pytest.raises(KeyError):
+        WeightCache().resolve({MANIFEST_KEY: config[MANIFEST_KEY]})